@@ -471,319 +471,1333 @@ Mont-Vert ML Service - Flask API pour XGBoost
 Version Hybride : Modèle d'Habitudes (6 features) + Filtre Frigo (Règles)
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import pandas as pd
 import xgboost as xgb
 import numpy as np
 import pickle
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
+import uuid
+from collections import Counter
 from datetime import datetime
+# sklearn ne sert plus qu'à relire un ancien pickle (migration) : jamais importé pour servir
+
+from scoring import RecipeIndex, build_predictions, parse_options
+from score_profiles import ProfileStore
+from stock_features import RecipeIngredients, RecipeIngredientStore, StockSnapshot
+from meal_plan import LotStock, MealPlanner, parse_plan_request, parse_rollout_request, rollout
+from tree_compiler import CompiledForest, PARITY_TOLERANCE
+from prediction_cache import PredictionCache
+from prediction_table import PredictionTable, select_contexts, write_keys, write_probas
+import shared_arrays
+from training_jobs import TrainingJobStore
+from model_registry import ModelRegistry
+from training_data import from_records, read_csv, read_ndjson
+from training_config import (XGB_PARAMS, booster_params, fit_full, parse_training_config, train_booster,
+                             tuned_hyperparams)
+import feature_schema
+import log_config
+import metrics
+from tuning import parse_tune_options, plan_folds
+import tuning
+
+log_config.setup_logging()
+log = logging.getLogger('mlservice')
 
 app = Flask(__name__)
 CORS(app)
 
 # Chemins - Sauvegarde dans le dossier model/
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_DIR = os.path.join(BASE_DIR, 'model')
-MODEL_PATH = os.path.join(MODEL_DIR, 'recipe_model_hybrid.pkl') # Nouveau nom pour éviter les conflits
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(BASE_DIR, 'model'))
+MODEL_PATH = os.path.join(MODEL_DIR, 'recipe_model_hybrid.pkl') # Ancien pickle unique, migré dans le registre versionné
+JOBS_DIR = os.path.join(MODEL_DIR, 'jobs') # État des entraînements en arrière-plan
+CACHE_DIR = os.path.join(MODEL_DIR, 'cache') # DMatrix en mémoire externe (temporaire)
+BEST_PARAMS_PATH = os.path.join(MODEL_DIR, 'best_params.json') # Meilleure configuration trouvée par /tune
+RECIPE_INDEX_PATH = os.environ.get('RECIPE_INDEX_PATH',                  # Besoins recette x produit (CSR, poussés par Node)
+                                   os.path.join(MODEL_DIR, 'recipe_ingredients.npz'))
+
+# Moteur d'inférence : 'xgboost' (predict_proba) ou 'compiled' (arbres à plat parcourus en NumPy)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'xgboost')
+# Au-delà de ce nombre de lignes, XGBoost est plus rapide que le prédicteur compilé
+# (scripts/bench_compiled.py) : les lots passent par le booster (0 = toujours compilé)
+COMPILED_MAX_BATCH = int(os.environ.get('COMPILED_MAX_BATCH', 16))
+
+# Cache LRU des probabilités d'habitude par contexte (0 = désactivé)
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+
+# Table des probabilités précalculées après /train : nombre max de contextes (0 = désactivée)
+PREDICTION_TABLE_MAX_ROWS = int(os.environ.get('PREDICTION_TABLE_MAX_ROWS', 100000))
+
+# Intervalle (s) entre deux vérifications d'une nouvelle version publiée par un autre worker
+MODEL_CHECK_INTERVAL = float(os.environ.get('MODEL_CHECK_INTERVAL', 1.0))
+
+# /plan : largeur du faisceau et budget de latence par défaut (surchargeables par requête)
+PLAN_BEAM_WIDTH = int(os.environ.get('PLAN_BEAM_WIDTH', 4))
+PLAN_BUDGET_MS = float(os.environ.get('PLAN_BUDGET_MS', 250))
+# /rollout : nombre de séquences suivies par défaut
+ROLLOUT_BEAM_WIDTH = int(os.environ.get('ROLLOUT_BEAM_WIDTH', 8))
+
+# Profils de pondération du score hybride (relus à chaud quand le fichier change)
+SCORE_PROFILES_PATH = os.environ.get('SCORE_PROFILES_PATH', os.path.join(BASE_DIR, 'score_profiles.json'))
 
 # Créer le dossier model/ s'il n'existe pas
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# ### MODIFICATION : Définition stricte des features d'habitude (Contexte seul)
+HABIT_FEATURES = feature_schema.HABIT_FEATURES
+
+# ═══════════════════════════════════════════════════════════════════════════
+# MODÈLE ACTIF
+# ═══════════════════════════════════════════════════════════════════════════
+
+class ActiveModel:
+    """
+    Le modèle servi et tout ce qui en dépend (index des recettes, prédicteur compilé).
+    Il est construit entièrement AVANT d'être publié : le remplacement se fait
+    en une seule affectation, l'ancien modèle continue de servir jusque-là.
+    'version' est la version du registre dont il provient, 'watermark' la date
+    (AAAA-MM-JJ) du plus récent exemple vu à l'entraînement et 'watermark_rows'
+    les empreintes des exemples de ce jour-là déjà appris (voir row_fingerprints).
+    booster=None : le booster est lu à sa première utilisation (voir load_version).
+    """
+
+    def __init__(self, booster, feature_names, recipe_ids, version, watermark=None, compiled=None,
+                 importances=None, watermark_rows=None):
+        self._booster = booster  # xgboost.Booster (sans wrapper sklearn)
+        self._booster_lock = threading.Lock()
+        self.feature_names = list(feature_names)
+        # Classe i du booster <-> recipe_ids[i] (l'ancien LabelEncoder.classes_)
+        if isinstance(recipe_ids, RecipeIndex):
+            self.recipe_index = recipe_ids
+        else:
+            self.recipe_index = RecipeIndex(np.asarray(recipe_ids).astype(int))
+        self.importances = importances  # importance 'gain' enregistrée avec la version
+        self.compiled = compiled  # CompiledForest si INFERENCE_BACKEND=compiled
+        self.table = None  # PredictionTable des contextes d'entraînement, si construite
+        self.version = version
+        self.watermark = watermark
+        self.watermark_rows = watermark_rows
+        self.warmed = False  # prédiction à blanc faite (voir warm_up)
+
+    @property
+    def booster(self):
+        if self._booster is None:
+            with self._booster_lock:
+                if self._booster is None:
+                    self._booster = read_booster(self.version)
+        return self._booster
+
+    @property
+    def booster_loaded(self):
+        return self._booster is not None
+
+    @property
+    def inference_backend(self):
+        return 'compiled' if self.compiled is not None else 'xgboost'
+
+    def predict_proba(self, X):
+        """
+        Probabilités d'habitude (n x nb_classes) via le moteur d'inférence actif.
+        Prédicteur compilé : petits lots seulement (COMPILED_MAX_BATCH) ; un lot
+        plus grand lit le booster s'il n'est pas encore chargé.
+        """
+        if self.compiled is not None and (COMPILED_MAX_BATCH <= 0 or len(X) <= COMPILED_MAX_BATCH):
+            return self.compiled.predict_proba(X)
+        return booster_proba(self.booster, X)
+
+    def feature_importances(self):
+        """Importance 'gain' normalisée (somme = 1), comme XGBClassifier.feature_importances_"""
+        if self.importances is not None:
+            return np.asarray(self.importances, dtype=np.float64)
+        return gain_importances(self.booster, self.feature_names)
+
+def gain_importances(booster, feature_names):
+    scores = booster.get_score(importance_type='gain')
+    values = np.array([
+        scores.get(name, scores.get(f'f{i}', 0.0))
+        for i, name in enumerate(feature_names)
+    ], dtype=np.float64)
+    total = values.sum()
+    return values / total if total > 0 else values
+
+def booster_proba(booster, X):
+    """Équivalent de predict_proba directement sur le Booster (matrice float32 n x 6)"""
+    probas = booster.inplace_predict(np.ascontiguousarray(X, dtype=np.float32), validate_features=False)
+    if probas.ndim == 1:
+        # binary:logistic : seule la probabilité de la classe 1 est retournée
+        probas = np.column_stack([1.0 - probas, probas])
+    return probas
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CHARGEMENT / SAUVEGARDE DU MODÈLE (registre versionné)
+# ═══════════════════════════════════════════════════════════════════════════
+
+# Une version = booster XGBoost natif (.ubj) + sidecar JSON (.meta.json) :
+# aucun pickle, aucun import sklearn pour servir. Les tableaux servis
+# (classes, forêt compilée, table précalculée) sont dans des fichiers .arrays
+# ouverts en mmap : partagés par tous les workers, même après un rechargement.
+
+def write_version(version, booster, feature_names, recipe_ids, params=None, watermark=None, watermark_rows=None):
+    """Écrit les fichiers d'une version : booster UBJSON, correspondance des classes puis sidecar"""
+    model_registry.write_atomic(model_registry.path(version, '.ubj'),
+                                lambda f: f.write(booster.save_raw(raw_format='ubj')))
+    recipe_index = RecipeIndex(np.asarray(recipe_ids).astype(int))
+    model_registry.write_atomic(model_registry.path(version, '.classes.arrays'),
+                                lambda f: shared_arrays.save(f, recipe_index.arrays()))
+    meta = {
+        'version': version,
+        'feature_names': list(feature_names),
+        'recipe_ids': [int(r) for r in recipe_ids],
+        'feature_importance': gain_importances(booster, feature_names).tolist(),
+        'params': params or {},
+        'watermark': watermark,
+        'watermark_rows': watermark_rows,
+        'xgboost_version': xgb.__version__,
+        'created_at': datetime.now().isoformat(timespec='seconds')
+    }
+    model_registry.write_atomic(model_registry.path(version, '.meta.json'),
+                                lambda f: f.write(json.dumps(meta).encode('utf-8')))
+
+def read_booster(version):
+    booster = xgb.Booster()
+    with open(model_registry.path(version, '.ubj'), 'rb') as f:
+        booster.load_model(bytearray(f.read()))
+    return booster
+
+def read_recipe_index(version, meta):
+    """Classes de la version : fichier .classes.arrays en mmap, ou recalculées depuis le sidecar"""
+    path = model_registry.path(version, '.classes.arrays')
+    if os.path.exists(path):
+        return RecipeIndex.from_arrays(shared_arrays.load(path))
+    return RecipeIndex(np.asarray(meta['recipe_ids']).astype(int))
+
+def load_version(version, warm=True):
+    """
+    Charge une version publiée du registre (appelé par ModelRegistry).
+    warm=False : lecture des fichiers seulement, sans aucune inférence (master gunicorn).
+    Avec le prédicteur compilé déjà validé à l'export, le booster n'est pas lu :
+    seuls les tableaux mmap (partagés) servent les prédictions.
+    """
+    start = time.perf_counter()
+    meta_path = model_registry.path(version, '.meta.json')
+    if not os.path.exists(meta_path):
+        migrate_pickled_version(version)
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    compiled = validated_forest(version)
+    booster = None if compiled is not None else read_booster(version)
+    
+    loaded = ActiveModel(booster, meta['feature_names'], read_recipe_index(version, meta), version,
+                         meta.get('watermark'), compiled, meta.get('feature_importance'), meta.get('watermark_rows'))
+    loaded.table = load_prediction_table(loaded)
+    log.info("Modèle Hybride chargé", extra={'fields': {
+        'model_version': version, 'num_features': len(loaded.feature_names), 'num_recipes': len(loaded.recipe_index)}})
+    if warm:
+        warm_up(loaded)
+    metrics.MODEL_LOAD.observe(time.perf_counter() - start)
+    return loaded
+
+def save_model(booster, features, recipe_ids, params=None, watermark=None, contexts=None, watermark_rows=None):
+    """
+    Écrit une nouvelle version (fichiers temporaires + rename), puis la publie :
+    ce worker la sert immédiatement, les autres la rechargent d'eux-mêmes.
+    'contexts' (matrice d'entraînement) : contextes de la table précalculée.
+    Retourne la version.
+    """
+    version = model_registry.new_version()
+    new_model = ActiveModel(booster, features, recipe_ids, version, watermark, watermark_rows=watermark_rows)
+    
+    write_version(version, booster, features, recipe_ids, params, watermark, watermark_rows)
+    log.info("Modèle sauvegardé", extra={'fields': {
+        'model_version': version, 'num_features': len(features), 'num_classes': len(recipe_ids),
+        'path': model_registry.path(version, '.ubj')}})
+    
+    try:
+        forest = export_forest(new_model)
+        log.info(f"Arbres exportés : {forest.num_trees} arbres, profondeur {forest.depth}, écart {forest.parity:.2e}")
+    except Exception as e:
+        forest = None
+        log.warning(f"Export des arbres impossible : {e}")
+    new_model.compiled = prepare_compiled_model(new_model, forest)
+    warm_up(new_model)
+    if contexts is not None:
+        new_model.table = build_prediction_table(new_model, contexts)
+    
+    model_registry.publish(new_model, {'num_classes': len(recipe_ids)})
+    return version
+
+# ─── Migration de l'ancien format (XGBClassifier + LabelEncoder picklés) ───
+
+def read_pickled_model(path):
+    """Lit un ancien pickle (dépicklage = import de sklearn) : (booster, feature_names, recipe_ids)"""
+    with open(path, 'rb') as f:
+        saved_data = pickle.load(f)
+    return saved_data['model'].get_booster(), saved_data['feature_names'], saved_data['label_encoder'].classes_
+
+def migrate_pickled_version(version):
+    """Convertit une fois une version enregistrée en .pkl vers .ubj + .meta.json"""
+    pickle_path = model_registry.path(version, '.pkl')
+    try:
+        booster, feature_names, recipe_ids = read_pickled_model(pickle_path)
+    except FileNotFoundError:
+        return  # déjà convertie par un autre worker
+    log.info(f"Conversion de la version {version} (pickle -> UBJSON)")
+    write_version(version, booster, feature_names, recipe_ids)
+    try:
+        os.remove(pickle_path)
+    except OSError:
+        pass
+
+def migrate_legacy_model():
+    """Importe l'ancien MODEL_PATH (non versionné) comme première version du registre"""
+    migrated_path = MODEL_PATH + '.migrated'
+    try:
+        # rename atomique : un seul worker fait la migration
+        os.rename(MODEL_PATH, migrated_path)
+    except FileNotFoundError:
+        return
+    log.info(f"Migration de {MODEL_PATH} vers le registre versionné")
+    save_model(*read_pickled_model(migrated_path))
+
 # Variables globales
-model = None
-feature_names = None
-label_encoder = None
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+training_jobs = TrainingJobStore(JOBS_DIR)
+score_profiles = ProfileStore(SCORE_PROFILES_PATH, check_interval=MODEL_CHECK_INTERVAL)
+recipe_ingredients = RecipeIngredientStore(RECIPE_INDEX_PATH, check_interval=MODEL_CHECK_INTERVAL)
 
-# ### MODIFICATION : Définition stricte des features d'habitude (Contexte seul)
-HABIT_FEATURES = [
-    'day_of_week', 
-    'month', 
-    'week_of_year', 
-    'planned_portions',
-    'last_recipe_1', 
-    'last_recipe_2'
-]
+def on_model_change(loaded):
+    # Les probabilités en cache viennent de l'ancien modèle : vidées à chaque changement
+    prediction_cache.clear()
+    # Le master gunicorn (préchargement) ne sert aucune requête : seuls les workers prêts déclarent leur version
+    if service_ready:
+        metrics.set_model_version(loaded.version)
+
+model_registry = ModelRegistry(MODEL_DIR, load_version, on_change=on_model_change,
+                               check_interval=MODEL_CHECK_INTERVAL)
+
+def get_active_model():
+    """
+    Modèle servi par ce worker, ou None. Une version publiée par un autre
+    worker est détectée (os.stat du pointeur) et rechargée en arrière-plan.
+    """
+    current = model_registry.current()
+    if current is None and os.path.exists(MODEL_PATH):
+        migrate_legacy_model()
+        current = model_registry.current()
+    return current
 
 # ═══════════════════════════════════════════════════════════════════════════
-# CHARGEMENT / SAUVEGARDE DU MODÈLE
+# MOTEUR D'INFÉRENCE (XGBoost ou prédicteur compilé)
 # ═══════════════════════════════════════════════════════════════════════════
 
-def load_model():
-    """Charge le modèle depuis le disque"""
-    global model, feature_names, label_encoder
-    if os.path.exists(MODEL_PATH):
-        with open(MODEL_PATH, 'rb') as f:
-            saved_data = pickle.load(f)
-            model = saved_data['model']
-            feature_names = saved_data['feature_names']
-            label_encoder = saved_data.get('label_encoder') 
-        print(f" Modèle Hybride chargé : {len(feature_names)} features d'habitude, {len(label_encoder.classes_) if label_encoder else 0} recettes connues")
-        return True
-    return False
-
-def save_model(trained_model, features, encoder):
-    """Sauvegarde le modèle sur le disque"""
-    global model, feature_names, label_encoder
-    model = trained_model
-    feature_names = features
-    label_encoder = encoder
-    
-    with open(MODEL_PATH, 'wb') as f:
-        pickle.dump({
-            'model': model,
-            'feature_names': feature_names,
-            'label_encoder': label_encoder
-        }, f)
-    print(f" Modèle sauvegardé : {len(feature_names)} features, {len(label_encoder.classes_)} classes")
-    print(f"    Chemin : {MODEL_PATH}")
+def export_forest(target):
+    """
+    Exporte les arbres d'un modèle en tableaux plats (fichier .forest.arrays de sa
+    version), avec l'écart mesuré face à XGBoost, et retourne la forêt relue en mmap.
+    """
+    forest = CompiledForest.from_booster(target.booster)
+    X_check = parity_sample(target.recipe_index)
+    forest.parity = forest.max_abs_diff(X_check, booster_proba(target.booster, X_check))
+    path = model_registry.path(target.version, '.forest.arrays')
+    model_registry.write_atomic(path, forest.save)
+    return CompiledForest.load(path)
+
+def read_forest(version):
+    """Forêt exportée d'une version (.forest.arrays, ou .forest.npz plus ancien), None si absente"""
+    for suffix in ('.forest.arrays', '.forest.npz'):
+        path = model_registry.path(version, suffix)
+        if os.path.exists(path):
+            return CompiledForest.load(path)
+    return None
+
+def validated_forest(version):
+    """
+    Forêt servie sans booster ni inférence de contrôle : INFERENCE_BACKEND=compiled
+    et parité enregistrée à l'export dans la tolérance. None sinon.
+    """
+    if INFERENCE_BACKEND != 'compiled':
+        return None
+    try:
+        forest = read_forest(version)
+    except (OSError, ValueError) as e:
+        log.warning(f"Forêt exportée illisible : {e}")
+        return None
+    if forest is None or forest.parity is None or forest.parity > PARITY_TOLERANCE:
+        return None
+    return forest
+
+def parity_sample(recipe_index, n=64):
+    """Contextes plausibles pour comparer le prédicteur compilé à predict_proba"""
+    rng = np.random.default_rng(0)
+    known = recipe_index.recipe_ids if len(recipe_index) else np.zeros(1, dtype=np.int64)
+    return np.column_stack([
+        rng.integers(0, 7, n),
+        rng.integers(1, 13, n),
+        rng.integers(1, 54, n),
+        rng.integers(1, 200, n),
+        rng.choice(known, n),
+        rng.choice(known, n)
+    ]).astype(np.float32)
+
+def prepare_compiled_model(target, forest=None):
+    """
+    Prédicteur compilé pour 'target' si INFERENCE_BACKEND=compiled, sinon None.
+    Il n'est retenu que s'il reproduit predict_proba à PARITY_TOLERANCE près.
+    """
+    if INFERENCE_BACKEND != 'compiled':
+        return None
+    
+    try:
+        if forest is None:
+            forest = read_forest(target.version) or export_forest(target)
+        
+        diff = forest.parity
+        if diff is None:
+            # Ancien export (.forest.npz) : parité jamais mesurée
+            X_check = parity_sample(target.recipe_index)
+            diff = forest.max_abs_diff(X_check, booster_proba(target.booster, X_check))
+        if diff > PARITY_TOLERANCE:
+            log.warning(f"Prédicteur compilé écarté (écart {diff:.2e}), retour à XGBoost")
+            return None
+        
+        log.info(f"Prédicteur compilé actif : {forest.num_trees} arbres, écart max {diff:.2e}")
+        return forest
+    except Exception as e:
+        log.warning(f"Prédicteur compilé indisponible ({e}), retour à XGBoost")
+        return None
+
+def warm_up(target):
+    """
+    Termine la préparation d'un modèle chargé : prédicteur compilé (contrôle de
+    parité) puis prédiction à blanc, pour que le premier vrai /predict ne paie
+    pas l'initialisation d'XGBoost (threads OpenMP, buffers).
+    """
+    if target.compiled is None:
+        target.compiled = prepare_compiled_model(target)
+    X = parity_sample(target.recipe_index, n=8)
+    probas = target.predict_proba(X)
+    build_predictions(probas[0], target.recipe_index, validated_contexts(X[:1])[0], [])
+    target.warmed = True
+
+# ─── Table des prédictions précalculées (prediction_table.py) ───
+
+def build_prediction_table(target, X):
+    """
+    Calcule les probabilités des contextes distincts de X avec le booster de
+    'target' et les écrit avec sa version (avant publication : un worker qui
+    charge la version trouve la table complète). None si désactivée ou en échec.
+    """
+    if PREDICTION_TABLE_MAX_ROWS <= 0 or len(X) == 0:
+        return None
+    start = time.perf_counter()
+    try:
+        keys, vocab, contexts = select_contexts(X, PREDICTION_TABLE_MAX_ROWS)
+        num_class = len(target.recipe_index)
+        # Probabilités d'abord : la présence du .table.arrays signale une table complète
+        # Booster natif : les probabilités de la table sont exactement celles d'XGBoost, et le
+        # prédicteur compilé n'est pas fait pour des lots de milliers de contextes
+        model_registry.write_atomic(model_registry.path(target.version, '.table.npy'),
+                                    lambda f: write_probas(f, contexts, lambda X: booster_proba(target.booster, X),
+                                                           num_class))
+        model_registry.write_atomic(model_registry.path(target.version, '.table.arrays'),
+                                    lambda f: write_keys(f, keys, vocab))
+        table = load_prediction_table(target)
+    except Exception as e:
+        log.warning(f"Table des prédictions non construite : {e}")
+        return None
+    log.info("Table des prédictions construite", extra={'fields': {
+        'model_version': target.version, **table.info(), 'seconds': round(time.perf_counter() - start, 2)}})
+    return table
+
+def load_prediction_table(target):
+    """Table précalculée de la version de 'target' (mmap), None si absente ou invalide"""
+    keys_path = model_registry.path(target.version, '.table.arrays')
+    if not os.path.exists(keys_path):
+        return None
+    try:
+        table = PredictionTable.load(keys_path, model_registry.path(target.version, '.table.npy'))
+    except (OSError, ValueError) as e:
+        log.warning(f"Table des prédictions illisible : {e}")
+        return None
+    if table.num_class != len(target.recipe_index):
+        log.warning(f"Table des prédictions ignorée : {table.num_class} classes, modèle à {len(target.recipe_index)}")
+        return None
+    return table
+
+def context_matrix(contexts):
+    """
+    Matrice float32 (n x 6) des features d'habitude, dans l'ordre de HABIT_FEATURES.
+    Valeurs validées par le schéma (feature_schema.py) : ValueError si hors bornes.
+    """
+    return feature_schema.context_matrix(contexts, HABIT_FEATURES)
+
+def validated_contexts(X):
+    """
+    Contextes (dicts d'entiers) relus depuis la matrice validée : le scoring et
+    les features de stock ne voient jamais la valeur brute ("3", 3.0, null...).
+    """
+    return [dict(zip(HABIT_FEATURES, row)) for row in X.astype(int).tolist()]
+
+def habit_probas(current, X):
+    """
+    Probabilités d'habitude (n x nb_classes) du modèle 'current'.
+    Les contextes de la table précalculée y sont lus ; les autres passent
+    par le cache puis le moteur d'inférence (cached_probas).
+    """
+    table = current.table
+    if table is None:
+        return cached_probas(current, X)
+    
+    found, positions = table.lookup(X)
+    hits = int(found.sum())
+    metrics.record_table(hits, len(X) - hits)
+    if hits == len(X):
+        return table.rows(positions)
+    
+    probas = np.empty((len(X), table.num_class), dtype=np.float32)
+    probas[found] = table.rows(positions[found])
+    probas[~found] = cached_probas(current, X[~found])
+    return probas
+
+def cached_probas(current, X):
+    """
+    Probabilités calculées par le moteur d'inférence, avec cache : les contextes
+    déjà vus sont servis par le cache, les autres calculés en un seul appel.
+    """
+    if not prediction_cache.enabled:
+        return current.predict_proba(X)
+    
+    # La version fait partie de la clé : un calcul fait avec l'ancien modèle
+    # pendant un swap ne peut pas être servi pour le nouveau
+    keys = [(current.version,) + tuple(row) for row in X.tolist()]
+    rows = [prediction_cache.get(key) for key in keys]
+    missing = [i for i, probas in enumerate(rows) if probas is None]
+    
+    metrics.record_cache(len(keys) - len(missing), len(missing))
+    if missing:
+        computed = current.predict_proba(X[missing])
+        for i, probas in zip(missing, computed):
+            probas = np.array(probas)  # copie : ne pas retenir toute la matrice du lot
+            prediction_cache.put(keys[i], probas)
+            rows[i] = probas
+    
+    return np.vstack(rows)
 
 # ═══════════════════════════════════════════════════════════════════════════
 # ENTRAÎNEMENT
 # ═══════════════════════════════════════════════════════════════════════════
 
+class TrainingProgress(xgb.callback.TrainingCallback):
+    """Remonte l'avancement du boosting (arbre courant / n_estimators) dans le job"""
+
+    def __init__(self, job, n_estimators):
+        super().__init__()
+        self.job = job
+        self.n_estimators = n_estimators
+
+    def after_iteration(self, model, epoch, evals_log):
+        # 'epoch' repart de 0 à chaque appel de xgb.train, y compris en incrémental (xgb_model=...)
+        self.job.report_progress((epoch + 1) / self.n_estimators, stage='fitting')
+        return False  # ne jamais interrompre l'entraînement
+
+# Mode incrémental : arbres ajoutés par entraînement, et taille max du booster
+# au-delà de laquelle on repart d'un entraînement complet
+INCREMENTAL_ESTIMATORS = 10
+MAX_BOOSTED_ROUNDS = 300
+
+TRAINING_MODES = ('full', 'incremental')
+
+def load_best_params():
+    """Résultat du dernier /tune (dict) ou None s'il n'y en a pas"""
+    try:
+        with open(BEST_PARAMS_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def training_hyperparams():
+    """XGB_PARAMS, surchargés par les paramètres retenus par le dernier /tune"""
+    return tuned_hyperparams(load_best_params())
+
+# Corps NDJSON / CSV : lus en flux (request.stream), jamais chargés d'un bloc
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+CSV_MIMETYPES = ('text/csv',)
+
+def read_training_set():
+    """
+    Exemples envoyés à /train selon le Content-Type (JSON par défaut), et
+    réglages d'entraînement éventuels du corps JSON ("training_config").
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return read_ndjson(request.stream, HABIT_FEATURES), {}
+    if request.mimetype in CSV_MIMETYPES:
+        return read_csv(request.stream, HABIT_FEATURES), {}
+    data = request.json
+    return from_records(data.get('training_data', []), HABIT_FEATURES), data.get('training_config') or {}
+
 @app.route('/train', methods=['POST'])
 def train():
     """
     Entraîne le modèle XGBoost UNIQUEMENT sur les habitudes (contexte).
     On ignore volontairement les scores de stock (urgency, availability) ici.
+    Corps : {"training_data": [...]}, NDJSON (application/x-ndjson) ou CSV
+    (text/csv) au schéma de training_data.csv.
+    ?mode=incremental : continue le booster publié avec les seuls exemples
+    postérieurs à son watermark (repli sur un entraînement complet si besoin).
+    Réglages moteur (query string ou "training_config" du corps JSON) :
+    tree_method, nthread, max_bin, data (memory / quantile / external).
+    Les données sont validées dans la requête, puis le fit tourne en
+    arrière-plan : la réponse (202) contient le job_id à suivre sur /train/<job_id>.
     """
+    rss = RssSampler()  # lecture du corps : première partie du pic de RSS du job
     try:
-        data = request.json
-        training_data = data.get('training_data', [])
-        
-        if not training_data:
-            return jsonify({'success': False, 'error': 'Aucune donnée fournie'}), 400
+        mode = request.args.get('mode', 'full')
+        if mode not in TRAINING_MODES:
+            return jsonify({'success': False, 'error': f'mode doit être parmi {list(TRAINING_MODES)}'}), 400
         
-        print(f"\n Entraînement Hybride avec {len(training_data)} exemples...")
+        try:
+            training_set, body_config = read_training_set()
+            config = parse_training_config({**request.args.to_dict(), **body_config})
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Conversion en DataFrame
-        df = pd.DataFrame(training_data)
+        log.info(f"Entraînement Hybride avec {len(training_set)} exemples")
         
         # ### MODIFICATION : On ne garde que les recettes fréquentes (>1 occurrence)
         # pour éviter les erreurs de classes uniques dans le split
-        counts = df['recipe_id'].value_counts()
-        valid_recipes = counts[counts > 1].index
-        df_filtered = df[df['recipe_id'].isin(valid_recipes)].copy()
+        filtered = training_set.keep_recurring()
         
-        print(f"    Filtrage : {len(df)} -> {len(df_filtered)} lignes (recettes récurrentes uniquement)")
-
-        # Vérifier les colonnes
-        missing_cols = [col for col in HABIT_FEATURES if col not in df_filtered.columns]
-        if missing_cols:
-            return jsonify({'success': False, 'error': f'Colonnes manquantes : {missing_cols}'}), 400
-        
-        # Préparer X (Habitudes uniquement) et y (Target)
-        X = df_filtered[HABIT_FEATURES].fillna(0)
-        y_raw = df_filtered['recipe_id']
-        
-        # Encoder les labels
-        from sklearn.preprocessing import LabelEncoder
-        le = LabelEncoder()
-        y = le.fit_transform(y_raw)
+        log.info(f"Filtrage : {len(training_set)} -> {len(filtered)} lignes (recettes récurrentes uniquement)")
+        if len(filtered) == 0:
+            return jsonify({'success': False, 'error': 'Aucune recette récurrente dans les données'}), 400
         
-        print(f"    Matrice X (Habitudes) : {X.shape}")
+        log.info(f"Colonnes typées (Habitudes) : {len(filtered)} x {len(HABIT_FEATURES)}, {filtered.nbytes / 1e6:.1f} Mo")
         
-        # Entraîner XGBoost
-        # Note : On garde multi:softprob pour avoir les probabilités de chaque plat
-        xgb_model = xgb.XGBClassifier(
-            n_estimators=100,
-            max_depth=5,
-            learning_rate=0.05, # Learning rate plus doux pour généraliser
-            random_state=42,
-            objective='multi:softprob',
-            eval_metric='mlogloss'
-        )
+        ingest_rss, rss = rss.stop(), None
+        job = training_jobs.submit(metrics.timed_job('train', run_training), filtered, mode, config, ingest_rss,
+                                   params={'num_samples': len(filtered), 'mode': mode, **config})
         
-        xgb_model.fit(X, y)
+        return jsonify({
+            'success': True,
+            'job_id': job.job_id,
+            'status': job.state['status'],
+            'status_url': f'/train/{job.job_id}'
+        }), 202
         
-        # Sauvegarder
-        save_model(xgb_model, HABIT_FEATURES, le)
+    except Exception as e:
+        log.exception("Erreur d'entraînement")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if rss is not None:
+            rss.stop()
+
+def latest_date(dates):
+    """Plus récente date (AAAA-MM-JJ) d'une colonne datetime64, None si aucune"""
+    known = dates[~np.isnat(dates)]
+    return str(known.max()) if len(known) else None
+
+def row_fingerprints(X, recipe_ids):
+    """Empreinte de chaque exemple (features + recipe_id), pour reconnaître ceux déjà appris"""
+    return [hashlib.blake2b(x.tobytes() + int(r).to_bytes(8, 'little', signed=True), digest_size=8).hexdigest()
+            for x, r in zip(X, recipe_ids)]
+
+def day_fingerprints(training_set, day):
+    """Empreintes (multiensemble) des exemples datés du jour 'day' (AAAA-MM-JJ)"""
+    rows = np.flatnonzero(training_set.dates == np.datetime64(day))
+    return Counter(row_fingerprints(training_set.X[rows], training_set.recipe_ids[rows]))
+
+def incremental_rows(current, recipe_ids, training_set):
+    """
+    Masque des exemples à ajouter au booster publié, ou (None, raison) quand
+    seul un entraînement complet est possible.
+    Le watermark est un jour : les exemples de ce jour-là enregistrés après
+    l'entraînement précédent sont repris, ceux déjà appris (watermark_rows)
+    sont écartés.
+    """
+    if current is None:
+        return None, 'aucun modèle publié'
+    if current.watermark is None:
+        return None, 'modèle publié sans watermark'
+    if not np.array_equal(current.recipe_index.recipe_ids, recipe_ids):
+        # Les classes du booster sont figées : une recette apparue ou retirée impose de tout refaire
+        return None, 'ensemble des recettes modifié'
+    if current.booster.num_boosted_rounds() + INCREMENTAL_ESTIMATORS > MAX_BOOSTED_ROUNDS:
+        return None, f'booster à {MAX_BOOSTED_ROUNDS} itérations'
+    dates = training_set.dates
+    new_rows = dates > np.datetime64(current.watermark)
+    if current.watermark_rows is None:
+        return new_rows, None  # version publiée sans empreintes : seuls les jours suivants
+    
+    learned = Counter(current.watermark_rows)
+    same_day = np.flatnonzero(dates == np.datetime64(current.watermark))
+    fingerprints = row_fingerprints(training_set.X[same_day], training_set.recipe_ids[same_day])
+    for row, fingerprint in zip(same_day, fingerprints):
+        if learned[fingerprint]:
+            learned[fingerprint] -= 1  # doublons : chaque exemple appris n'en écarte qu'un
+        else:
+            new_rows[row] = True
+    return new_rows, None
+
+# Période d'échantillonnage de la RSS pendant un entraînement (secondes)
+RSS_SAMPLE_INTERVAL = 0.05
+
+def current_rss_mb():
+    """RSS actuelle du processus (VmRSS de /proc/self/status, Mo), None hors Linux"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024  # Ko
+    except OSError:
+        pass
+    return None
+
+class RssSampler:
+    """
+    Pic de RSS d'UN entraînement, de la lecture du corps à la fin du fit :
+    un thread relève VmRSS toutes les RSS_SAMPLE_INTERVAL secondes.
+    (ru_maxrss est le pic du processus depuis son démarrage : il ne redescend
+    jamais et ne dit rien d'un job en particulier.)
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.start_mb = current_rss_mb()
+        self.peak_mb = self.start_mb
+        self._stopped = threading.Event()
+        self._thread = None
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='rss-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            self.sample()
+
+    def sample(self):
+        rss = current_rss_mb()
+        if rss is not None and rss > self.peak_mb:
+            self.peak_mb = rss
+
+    def stop(self):
+        """Arrête le relevé ; {'start', 'peak'} en Mo (None hors Linux)"""
+        self._stopped.set()
+        if self._thread is None:
+            return {'start': None, 'peak': None}
+        self._thread.join()
+        self.sample()
+        return {'start': round(self.start_mb, 1), 'peak': round(self.peak_mb, 1)}
+
+def run_training(job, training_set, mode, config, ingest_rss=None):
+    """
+    Corps d'un job d'entraînement (voir fit_and_publish). metrics.rss_mb : RSS au
+    début de la lecture du corps et pic relevé pendant la lecture ('ingest_rss',
+    RssSampler.stop() de la requête) puis pendant le fit. Le relevé s'arrête
+    tant que le job attend son tour : le pic d'un autre job n'est pas compté.
+    """
+    rss = RssSampler()
+    try:
+        summary = fit_and_publish(job, training_set, mode, config)
+    finally:
+        usage = rss.stop()
+    if ingest_rss and ingest_rss['peak'] is not None:
+        usage = {'start': ingest_rss['start'], 'peak': max(ingest_rss['peak'], usage['peak'])}
+    return {**summary, 'rss_mb': usage}
+
+def fit_and_publish(job, training_set, mode, config):
+    """Fit (complet ou incrémental), sauvegarde puis swap du modèle servi"""
+    # Encoder les labels : classe i <-> recipe_ids[i] (même ordre que LabelEncoder)
+    # int32 suffit : il y a au plus quelques milliers de recettes
+    recipe_ids, y = np.unique(training_set.recipe_ids, return_inverse=True)
+    y = y.astype(np.int32)
+    X = training_set.X  # float32 C-contiguë : passée telle quelle à XGBoost
+    watermark = latest_date(training_set.dates)
+    hyperparams, source = training_hyperparams()
+    summary = {'mode': mode, 'data_mb': round((training_set.nbytes + X.nbytes) / 1e6, 2), 'hyperparams': source}
+    fit_start = time.perf_counter()
+
+    if mode == 'incremental':
+        current = get_active_model()
+        new_rows, reason = incremental_rows(current, recipe_ids, training_set)
+        if reason:
+            log.info(f"Incrémental impossible ({reason}) : entraînement complet")
+            summary.update(mode='full', fallback_reason=reason)
+        elif not new_rows.any():
+            # Rien de plus récent que le watermark : le modèle publié reste en place
+            return {**summary, 'num_new_samples': 0, 'model_version': current.version}
+        else:
+            booster = train_incremental(job, current, X[new_rows], y[new_rows], config, hyperparams)
+            summary['num_new_samples'] = int(new_rows.sum())
+            watermark = max(current.watermark, watermark)
+
+    # Exemples du jour du watermark désormais appris (avec ceux de la version continuée)
+    learned = day_fingerprints(training_set, watermark) if watermark else Counter()
+    if summary['mode'] == 'incremental' and watermark == current.watermark:
+        learned |= Counter(current.watermark_rows or ())
+
+    if summary['mode'] == 'full':
+        booster = train_full(job, X, y, config, hyperparams)
+    summary['fit_seconds'] = round(time.perf_counter() - fit_start, 3)
+
+    # Sauvegarder le booster natif (l'ancien modèle sert jusqu'au swap final)
+    job.update(stage='saving')
+    # X contient tout l'historique (même en incrémental) : la table couvre tous les contextes vus
+    version = save_model(booster, HABIT_FEATURES, recipe_ids, {**hyperparams, **config, 'mode': summary['mode']},
+                         watermark, contexts=X, watermark_rows=sorted(learned.elements()))
+
+    # Accuracy (Sur les habitudes seulement)
+    train_accuracy = float(np.mean(np.argmax(booster_proba(booster, X), axis=1) == y)) * 100
+
+    return {
+        **summary,
+        'accuracy_context': round(train_accuracy, 2), # Renommé pour clarté
+        'num_samples': len(X),
+        'num_classes': int(len(recipe_ids)),
+        'num_boosted_rounds': int(booster.num_boosted_rounds()),
+        'watermark': watermark,
+        'model_version': version
+    }
+
+def train_full(job, X, y, config, hyperparams):
+    """
+    Entraînement complet (training_config.fit_full, partagé avec scripts/evaluate.py).
+    La matrice peut être une QuantileDMatrix ou en mémoire externe (voir training_config).
+    """
+    job.update(stage='fitting')
+    return fit_full(X, y, list(HABIT_FEATURES), config, hyperparams, CACHE_DIR,
+                    callbacks=[TrainingProgress(job, hyperparams['n_estimators'])])
+
+def train_incremental(job, current, X_new, y_new, config, hyperparams):
+    """
+    Continue le booster publié (xgb_model=...) avec INCREMENTAL_ESTIMATORS
+    arbres appris sur les seuls nouveaux exemples. L'API native est utilisée :
+    contrairement à XGBClassifier.fit, elle accepte un lot où certaines
+    classes sont absentes (num_class reste celui du booster).
+    """
+    params = booster_params(config, hyperparams, num_class=len(current.recipe_index))
+
+    job.update(stage='fitting')
+    log.info(f"Incrémental : {len(X_new)} nouveaux exemples, +{INCREMENTAL_ESTIMATORS} arbres")
+    # xgb.train copie le booster de départ : le modèle servi n'est pas modifié
+    return train_booster(params, X_new, y_new, list(HABIT_FEATURES), config, CACHE_DIR,
+                         num_boost_round=INCREMENTAL_ESTIMATORS, xgb_model=current.booster,
+                         callbacks=[TrainingProgress(job, INCREMENTAL_ESTIMATORS)])
+
+@app.route('/train/<job_id>', methods=['GET'])
+@app.route('/tune/<job_id>', methods=['GET'])
+def train_status(job_id):
+    """Statut, progression et métriques d'un job lancé par POST /train ou POST /tune"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job inconnu'}), 404
+    return jsonify({'success': True, **job})
+
+# ═══════════════════════════════════════════════════════════════════════════
+# RECHERCHE D'HYPERPARAMÈTRES
+# ═══════════════════════════════════════════════════════════════════════════
+
+@app.route('/tune', methods=['POST'])
+def tune():
+    """
+    Recherche d'hyperparamètres par validation croisée chronologique (voir tuning.py).
+    Même corps que /train (chaque exemple doit avoir une date). Options (query
+    string ou "tune_config" du corps JSON) : n_splits, holdout, top_k,
+    max_rounds, early_stopping_rounds, search_space (JSON uniquement).
+    La meilleure configuration est écrite dans model/best_params.json et
+    reprise par les /train suivants, si elle fait au moins aussi bien que les
+    paramètres actuels en top-k sur le holdout. Job suivi sur /tune/<job_id>.
+    """
+    try:
+        try:
+            training_set, body_config = read_training_set()
+            config = parse_training_config({**request.args.to_dict(), **body_config})
+            tune_config = (request.json.get('tune_config') or {}) if request.mimetype == 'application/json' else {}
+            options = parse_tune_options({**request.args.to_dict(), **tune_config})
+            training_set = training_set.keep_recurring()
+            # Tri chronologique une fois pour toutes ; le découpage est validé ici (400 si impossible)
+            order = np.argsort(training_set.dates, kind='stable')
+            plan_folds(training_set.dates[order], options['n_splits'], options['holdout'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Accuracy (Sur les habitudes seulement)
-        train_accuracy = xgb_model.score(X, y) * 100
+        log.info(f"Recherche d'hyperparamètres sur {len(training_set)} exemples")
+        job = training_jobs.submit(metrics.timed_job('tune', run_tuning), training_set, order, config, options,
+                                   params={'kind': 'tune', 'num_samples': len(training_set), **config,
+                                           **{k: v for k, v in options.items() if k != 'search_space'}})
         
         return jsonify({
             'success': True,
-            'metrics': {
-                'accuracy_context': round(train_accuracy, 2), # Renommé pour clarté
-                'num_samples': len(df_filtered),
-                'num_classes': int(len(le.classes_))
-            }
-        })
+            'job_id': job.job_id,
+            'status': job.state['status'],
+            'status_url': f'/tune/{job.job_id}'
+        }), 202
         
     except Exception as e:
-        print(f" Erreur d'entraînement : {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Erreur tune")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/tune', methods=['GET'])
+def tune_result():
+    """Configuration retenue par le dernier /tune (utilisée par /train)"""
+    best = load_best_params()
+    if best is None:
+        return jsonify({'success': False, 'error': 'Aucune recherche effectuée', 'params': XGB_PARAMS}), 404
+    return jsonify({'success': True, **best})
+
+def run_tuning(job, training_set, order, config, options):
+    """
+    Corps d'un job /tune : recherche, puis publication atomique de best_params.json,
+    seulement si la configuration trouvée n'est pas moins bonne que les paramètres
+    actuels (taux de hit top-k sur le holdout).
+    """
+    _, y = np.unique(training_set.recipe_ids, return_inverse=True)
+    X = training_set.X[order]
+    y = y[order].astype(np.int32)
+    baseline, _ = training_hyperparams()
+    
+    job.update(stage='tuning')
+    start = time.perf_counter()
+    result = tuning.search(X, y, training_set.dates[order], baseline, config, options, CACHE_DIR,
+                           progress=lambda fraction: job.report_progress(fraction, stage='tuning'))
+    
+    metric = f"top{options['top_k']}"
+    scores = {'metric': metric, 'tuned': result['holdout']['tuned'][metric],
+              'baseline': result['holdout']['baseline'][metric]}
+    adopted = scores['tuned'] >= scores['baseline']
+    if adopted:
+        best = {
+            'params': result['best_params'],
+            'holdout': result['holdout'],
+            'top_k': options['top_k'],
+            'num_samples': len(y),
+            'job_id': job.job_id,
+            'created_at': datetime.now().isoformat(timespec='seconds')
+        }
+        ModelRegistry.write_atomic(BEST_PARAMS_PATH, lambda f: f.write(json.dumps(best, indent=2).encode('utf-8')))
+        log.info("Meilleure configuration", extra={'fields': {'best_params': result['best_params'], **scores}})
+    else:
+        # Les /train suivants gardent les paramètres actuels
+        log.warning("Configuration trouvée moins bonne que l'actuelle sur le holdout : non retenue",
+                    extra={'fields': {'best_params': result['best_params'], **scores}})
+    
+    return {**result, 'adopted': adopted, 'holdout_score': scores,
+            'tune_seconds': round(time.perf_counter() - start, 1)}
+
 # ═══════════════════════════════════════════════════════════════════════════
 # PRÉDICTION (ALGO HYBRIDE)
 # ═══════════════════════════════════════════════════════════════════════════
 
+# Taille max d'un lot pour /predict-batch (une semaine x plusieurs services tient large)
+MAX_BATCH_SIZE = 500
+
+class StockFeatures:
+    """
+    Features de stock d'une requête à partir de son instantané 'stock' :
+    calculées une fois par nombre de portions, puis réutilisées par tous les
+    contextes de la requête.
+    """
+
+    def __init__(self, index, snapshot, recipe_index):
+        self.index = index
+        self.snapshot = snapshot
+        self.recipe_index = recipe_index
+        self._by_portions = {}
+
+    def for_context(self, context):
+        portions = context.get('planned_portions') or 1
+        if portions not in self._by_portions:
+            self._by_portions[portions] = self.index.class_features(self.snapshot, portions, self.recipe_index)
+        return self._by_portions[portions]
+
+def request_stock(data, current):
+    """
+    StockFeatures si le corps contient un instantané 'stock', None sinon.
+    ValueError si l'instantané est invalide, LookupError si Node n'a pas encore
+    poussé l'index ou si 'recipe_index_version' (envoyé par Node) ne correspond
+    pas à l'index servi.
+    """
+    if data.get('stock') is None:
+        return None
+    index = recipe_ingredients.current()
+    if index is None:
+        raise LookupError('Index recettes x ingrédients absent (PUT /recipe-index)')
+    expected = data.get('recipe_index_version')
+    if expected is not None and str(expected) != index.version:
+        raise LookupError(f"Index recettes x ingrédients périmé ({index.version}, attendu {expected})")
+    return StockFeatures(index, StockSnapshot.parse(data['stock']), current.recipe_index)
+
+def recipe_index_version():
+    index = recipe_ingredients.current()
+    return index.version if index else None
+
+class PredictRequest:
+    """Corps de /predict validé, prêt pour l'inférence (X : matrice 1 x 6)"""
+
+    def __init__(self, context, inventory, options, profile, stock, X):
+        self.context = context
+        self.inventory = inventory
+        self.options = options
+        self.profile = profile
+        self.stock = stock
+        self.X = X
+
+def parse_predict(data, current, timer):
+    """
+    Étapes parse / features de /predict (partagées avec asgi.py).
+    Retourne (PredictRequest, None) ou (None, (corps d'erreur, statut)).
+    """
+    with timer.stage('parse'):
+        if not isinstance(data, dict) or not isinstance(data.get('context', {}), dict):
+            return None, ({'success': False, 'error': 'context doit être un objet'}, 400)
+        inventory_list = data.get('inventory', [])
+        
+        try:
+            options = parse_options(data)
+            profile = score_profiles.get(options['profile'])
+            stock = request_stock(data, current)
+        except ValueError as e:
+            return None, ({'success': False, 'error': str(e)}, 400)
+        except LookupError as e:
+            return None, ({'success': False, 'error': str(e), 'recipe_index_version': recipe_index_version()}, 409)
+    
+    with timer.stage('features'):
+        try:
+            X = context_matrix([data.get('context', {})])
+        except ValueError as e:
+            return None, ({'success': False, 'error': str(e)}, 400)
+        context = validated_contexts(X)[0]
+    
+    return PredictRequest(context, inventory_list, options, profile, stock, X), None
+
+def predict_response(current, parsed, probas, timer):
+    """Étapes stock / scoring de /predict à partir des probabilités d'habitude : corps de la réponse"""
+    # 2. Score hybride en NumPy (frigo aligné sur les classes via recipe_index)
+    # -------------------------------------------------------------------------
+    stock = parsed.stock
+    with timer.stage('stock'):
+        stock_arrays = stock.for_context(parsed.context) if stock else None
+    with timer.stage('scoring'):
+        predictions, num_eligible = build_predictions(probas, current.recipe_index, parsed.context, parsed.inventory,
+                                                      parsed.options, parsed.profile, stock_arrays)
+    
+    return {
+        'success': True,
+        'predictions': predictions,
+        'num_eligible': num_eligible,
+        'profile': parsed.profile.to_dict(),
+        'stock_features': stock is not None,
+        'recipe_index_version': stock.index.version if stock else None,
+        'model_version': current.version
+    }
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    global model, feature_names, label_encoder
-    
-    if model is None:
-        if not load_model():
-            return jsonify({'success': False, 'error': 'Modèle non entraîné'}), 400
+    """
+    Top-k hybride pour un contexte.
+    Options : num_predictions (défaut 5), min_availability, require_feasible,
+    profile (profil de pondération, voir score_profiles.json)
+    Frigo : 'inventory' (scores par recette calculés par Node) ou 'stock'
+    (instantané {product_id, available_qty, days_to_expiry} : les scores de
+    toutes les recettes sont calculés ici, voir stock_features.py).
+    """
+    current = get_active_model()
+    if current is None:
+        return jsonify({'success': False, 'error': 'Modèle non entraîné'}), 400
     
+    timer = metrics.StageTimer('/predict')
     try:
-        data = request.json
-        context = data.get('context', {})
-        inventory_list = data.get('inventory', [])
+        parsed, error = parse_predict(request.json, current, timer)
+        if error:
+            return jsonify(error[0]), error[1]
         
         # 1. Prédiction Habitude (XGBoost)
         # --------------------------------
-        X_input = pd.DataFrame([{col: context.get(col, 0) for col in HABIT_FEATURES}])
-        probas = model.predict_proba(X_input)[0]
-        
-        # Récupération des IDs et conversion stricte en INT
-        all_recipe_ids = label_encoder.inverse_transform(range(len(probas)))
+        with timer.stage('habit'):
+            probas = habit_probas(current, parsed.X)[0]
         
-        df_scores = pd.DataFrame({
-            'recipe_id': all_recipe_ids,
-            'score_envie': probas
-        })
-        df_scores['recipe_id'] = df_scores['recipe_id'].astype(int)
-        
-        # 2. Préparation Frigo
-        # --------------------
-        if not inventory_list:
-            # Si vide, on crée un dataframe vide avec les bonnes colonnes
-            df_inventory = pd.DataFrame(columns=['recipe_id', 'availability_score', 'urgency_score'])
-        else:
-            df_inventory = pd.DataFrame(inventory_list)
-            # CRUCIAL : On convertit l'ID en int pour que le merge fonctionne
-            if 'recipe_id' in df_inventory.columns:
-                df_inventory['recipe_id'] = df_inventory['recipe_id'].astype(int)
-            
-            # Sécurité si les colonnes manquent
-            if 'availability_score' not in df_inventory.columns: df_inventory['availability_score'] = 0.0
-            if 'urgency_score' not in df_inventory.columns: df_inventory['urgency_score'] = 0.0
-
-        # 3. Fusion (Le moment critique)
-        # ------------------------------
-        # On fusionne ce que le modèle pense (df_scores) avec ce qu'il y a dans le frigo (df_inventory)
-        df_final = pd.merge(df_scores, df_inventory, on='recipe_id', how='left')
-        
-        # On remplit les trous (NaN) par 0.0
-        df_final['availability_score'] = df_final['availability_score'].fillna(0.0)
-        df_final['urgency_score'] = df_final['urgency_score'].fillna(0.0)
-        df_final['score_envie'] = df_final['score_envie'].fillna(0.0)
-
-        # 4. Calcul du Score Final
-        # ------------------------
-        # Vous pouvez ajuster les poids ici (0.4 / 0.3 / 0.3 est un bon début)
-        df_final['score_final'] = (
-            (df_final['score_envie'] * 0.4) +
-            (df_final['availability_score'] * 0.3) +
-            (df_final['urgency_score'] * 0.3)
-        )
-        
-        # 5. Construction de la réponse pour le Frontend
-        # ----------------------------------------------
-        top_recipes = df_final.sort_values('score_final', ascending=False).head(5)
-        
-        predictions = []
-        days = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
-        day_name = days[context.get('day_of_week', 0)]
-
-        for _, row in top_recipes.iterrows():
-            # Extraction des valeurs propres
-            s_final = float(row['score_final'])
-            s_envie = float(row['score_envie'])
-            s_avail = float(row['availability_score'])
-            s_urgent = float(row['urgency_score'])
-            
-            # Génération des raisons (reasons) comme dans l'ancienne version
-            reasons = []
+        body = predict_response(current, parsed, probas, timer)
+        with timer.stage('serialize'):
+            return jsonify(body)
+
+    except Exception as e:
+        log.exception("Erreur predict")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/predict-batch', methods=['POST'])
+def predict_batch():
+    """
+    Score N contextes en UN SEUL appel XGBoost (matrice N x 6).
+    Body : { "contexts": [ { "context": {...}, "inventory": [...] }, ... ] }
+    Les options de /predict peuvent être données au niveau racine (communes)
+    ou dans chaque élément (prioritaires). Un instantané 'stock' à la racine
+    sert à tous les contextes (features calculées une fois par nb de portions).
+    Chaque élément de 'results' a la même forme que la réponse de /predict.
+    """
+    current = get_active_model()
+    if current is None:
+        return jsonify({'success': False, 'error': 'Modèle non entraîné'}), 400
+    
+    timer = metrics.StageTimer('/predict-batch')
+    try:
+        with timer.stage('parse'):
+            data = request.json
+            items = data.get('contexts', []) if isinstance(data, dict) else None
             
-            # Raison : Habitude (Le modèle XGBoost)
-            if s_envie > 0.15: # Seuil arbitraire
-                reasons.append(f"Souvent mangé le {day_name}")
-            elif s_envie > 0.05:
-                reasons.append(f"Adapté pour un {day_name}")
-                
-            # Raison : Disponibilité
-            if s_avail >= 1.0:
-                reasons.append("100% des ingrédients disponibles")
-            elif s_avail >= 0.7:
-                reasons.append("Majorité des ingrédients en stock")
-                
-            # Raison : Urgence
-            if s_urgent >= 0.8:
-                reasons.append("⚠️ Ingrédients à utiliser rapidement !")
+            if not isinstance(items, list):
+                return jsonify({'success': False, 'error': 'contexts doit être une liste'}), 400
+            if not items:
+                return jsonify({'success': False, 'error': 'Aucun contexte fourni'}), 400
+            if len(items) > MAX_BATCH_SIZE:
+                return jsonify({'success': False, 'error': f'Trop de contextes (max {MAX_BATCH_SIZE})'}), 400
+            for i, item in enumerate(items):
+                if not isinstance(item, dict) or not isinstance(item.get('context', {}), dict):
+                    return jsonify({'success': False, 'error': f'contexts[{i}] : objet {{"context": {{...}}}} attendu'}), 400
             
-            # Définition de la "confidence" basée sur le score final
-            confidence = 'low'
-            if s_final > 0.6: confidence = 'high'
-            elif s_final > 0.4: confidence = 'medium'
-
-            predictions.append({
-                'recipe_id': int(row['recipe_id']),
-                # --- COMPATIBILITÉ ---
-                'probability': round(s_final, 4), # On remet 'probability' pour que le frontend s'y retrouve
-                # ---------------------
-                'score_final': round(s_final, 4),
-                'confidence': confidence,
-                'details': {
-                    'habit_score': round(s_envie, 3),
-                    'availability': round(s_avail, 2),
-                    'urgency': round(s_urgent, 2)
-                },
-                'reasons': reasons
+            try:
+                options_list = [parse_options(item, defaults=data) for item in items]
+                profiles = [score_profiles.get(options['profile']) for options in options_list]
+                stock = request_stock(data, current)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            except LookupError as e:
+                return jsonify({'success': False, 'error': str(e), 'recipe_index_version': recipe_index_version()}), 409
+        
+        with timer.stage('features'):
+            try:
+                X = context_matrix([item.get('context', {}) for item in items])
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            contexts = validated_contexts(X)
+        
+        # 1. Prédiction Habitude : une seule matrice N x 6 pour tous les contextes
+        # ------------------------------------------------------------------------
+        with timer.stage('habit'):
+            probas_batch = habit_probas(current, X)
+        
+        # 2. Re-pondération frigo par contexte (chacun a son propre inventaire)
+        # ---------------------------------------------------------------------
+        with timer.stage('stock'):
+            stock_list = [stock.for_context(ctx) if stock else None for ctx in contexts]
+        with timer.stage('scoring'):
+            results = []
+            for item, ctx, options, profile, probas, stock_arrays in zip(items, contexts, options_list, profiles,
+                                                                         probas_batch, stock_list):
+                predictions, num_eligible = build_predictions(probas, current.recipe_index, ctx, item.get('inventory', []),
+                                                              options, profile, stock_arrays)
+                results.append({
+                    'success': True,
+                    'predictions': predictions,
+                    'num_eligible': num_eligible,
+                    'profile': profile.to_dict()
+                })
+        
+        with timer.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'results': results,
+                'stock_features': stock is not None,
+                'recipe_index_version': stock.index.version if stock else None,
+                'model_version': current.version
             })
-            
+
+    except Exception as e:
+        log.exception("Erreur predict-batch")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/plan', methods=['POST'])
+def plan():
+    """
+    Une recette par jour sur une période, le stock étant consommé FEFO d'un jour
+    à l'autre (voir meal_plan.py).
+    Body : { "start_date": "2026-10-19", "end_date": "2026-10-25",
+             "planned_portions": 40 (ou une valeur par jour), "last_recipes": [12, 7],
+             "stock": {product_id, available_qty, days_to_expiry : une ligne par lot},
+             "beam_width": 4, "budget_ms": 250, "profile": "anti_gaspi" }
+    """
+    current = get_active_model()
+    if current is None:
+        return jsonify({'success': False, 'error': 'Modèle non entraîné'}), 400
+    
+    try:
+        data = request.get_json(silent=True)  # corps absent ou invalide : None, refusé par parse_plan_request
+        index = recipe_ingredients.current()
+        if index is None:
+            return jsonify({'success': False, 'error': 'Index recettes x ingrédients absent (PUT /recipe-index)',
+                            'recipe_index_version': None}), 409
+        
+        try:
+            plan_request = parse_plan_request(data, PLAN_BEAM_WIDTH, PLAN_BUDGET_MS)
+            profile = score_profiles.get(data.get('profile'))
+            if data.get('stock') is None:
+                raise ValueError('stock requis (une ligne par lot)')
+            lots = LotStock.parse(data['stock'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Probabilités d'habitude des séquences du faisceau : un appel par jour (cache compris)
+        planner = MealPlanner(index, current.recipe_index, lots, profile,
+                              lambda contexts: habit_probas(current, context_matrix(contexts)))
+        try:
+            result = planner.plan(plan_request)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         return jsonify({
             'success': True,
-            'predictions': predictions
+            **result,
+            'profile': profile.to_dict(),
+            'recipe_index_version': index.version,
+            'model_version': current.version
         })
+    
+    except Exception as e:
+        log.exception("Erreur plan")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/rollout', methods=['POST'])
+def rollout_endpoint():
+    """
+    Prévision des habitudes sur H jours : last_recipe_1 / last_recipe_2 de chaque
+    jour viennent des recettes prévues les jours précédents (voir meal_plan.py).
+    Body : { "start_date": "2026-10-19", "horizon": 7, "planned_portions": 40,
+             "last_recipes": [12, 7], "beam_width": 8, "num_sequences": 3 }
+    """
+    current = get_active_model()
+    if current is None:
+        return jsonify({'success': False, 'error': 'Modèle non entraîné'}), 400
+    
+    try:
+        try:
+            rollout_request = parse_rollout_request(request.get_json(silent=True), ROLLOUT_BEAM_WIDTH)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Un seul appel d'inférence (beam_width lignes) par jour
+        try:
+            sequences = rollout(lambda contexts: habit_probas(current, context_matrix(contexts)),
+                                current.recipe_index, rollout_request)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'sequences': sequences,
+            'beam_width': rollout_request['beam_width'],
+            'horizon': len(rollout_request['days']),
+            'model_version': current.version
+        })
+    
     except Exception as e:
-        print(f" Erreur predict : {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Erreur rollout")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/recipe-index', methods=['PUT'])
+def put_recipe_index():
+    """
+    Index recette x produit envoyé par Node (lignes de recipe_item) :
+    {"version": "...", "items": {"recipe_id": [...], "product_id": [...], "qty_per_portion": [...]}}
+    (ou "items" en liste d'objets). Publié pour tous les workers.
+    """
+    try:
+        try:
+            index = RecipeIngredients.parse(request.json)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        recipe_ingredients.publish(index)
+        log.info("Index recettes x ingrédients publié", extra={'fields': index.info()})
+        return jsonify({'success': True, **index.info()})
+    except Exception as e:
+        log.exception("Erreur recipe-index")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/recipe-index', methods=['GET'])
+def get_recipe_index():
+    """Version de l'index recette x produit servi (Node ne repousse que s'il a changé)"""
+    index = recipe_ingredients.current()
+    if index is None:
+        return jsonify({'success': False, 'error': 'Aucun index', 'version': None}), 404
+    return jsonify({'success': True, **index.info()})
+
 # ═══════════════════════════════════════════════════════════════════════════
-# UTILITAIRES (Health, Status...)
+# UTILITAIRES (Health, Status, Metrics...)
 # ═══════════════════════════════════════════════════════════════════════════
-@app.route('/model-info', methods=['GET'])
-def model_info():
+
+# Routes à fort volume : logs INFO échantillonnés (LOG_SAMPLE_RATE), voir log_config.py
+SAMPLED_LOG_PATHS = ('/predict', '/predict-batch')
+
+@app.before_request
+def start_request():
+    g.request_start = time.perf_counter()
+    # Identifiant transmis par Node (X-Request-ID), ou généré ici
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    log_config.bind_request(g.request_id, sampled=request.path not in SAMPLED_LOG_PATHS or log_config.sample())
+
+@app.after_request
+def finish_request(response):
+    elapsed = time.perf_counter() - g.request_start
+    # Règle de la route (ex. /train/<job_id>) plutôt que le chemin : pas un label par job
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    metrics.REQUEST_LATENCY.labels(endpoint).observe(elapsed)
+    response.headers['X-Request-ID'] = g.request_id
+    # Erreurs toujours écrites ; GET (sondes, scraping, suivi de jobs) en DEBUG pour ne pas noyer les logs
+    if response.status_code >= 400:
+        level = logging.WARNING
+    else:
+        level = logging.DEBUG if request.method == 'GET' else logging.INFO
+    log.log(level, "Requête traitée", extra={'fields': {
+        'method': request.method, 'endpoint': endpoint, 'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 2)}})
+    return response
+
+@app.teardown_request
+def end_request(_exc):
+    # Les logs suivants de ce thread (rechargement, démarrage...) ne sont plus rattachés à la requête
+    log_config.bind_request(None)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métriques au format texte Prometheus (agrégées sur tous les workers, voir metrics.py)"""
+    body, content_type = metrics.exposition()
+    return Response(body, content_type=content_type)
+
+# Corps des routes de lecture, partagés avec l'entrée ASGI (asgi.py) : (corps, statut)
+
+def model_info_payload():
     """Informations détaillées sur le modèle (Requis par le Frontend)"""
-    global model, feature_names, label_encoder
-    
-    if model is None:
-        if not load_model():
-            return jsonify({
-                'trained': False,
-                'available': False,
-                'error': 'Modèle non entraîné'
-            })
+    current = get_active_model()
+    if current is None:
+        return {
+            'trained': False,
+            'available': False,
+            'error': 'Modèle non entraîné'
+        }, 200
     
     try:
+        feature_names = current.feature_names
+
         # Récupération de l'importance des features (Habitudes seulement)
-        importance = model.feature_importances_
+        importance = current.feature_importances()
         feature_importance_dict = {
             feature_names[i]: float(importance[i]) 
             for i in range(len(feature_names))
         }
         
         # Récupération des IDs de recettes connus par le modèle
-        if label_encoder:
-            # On transforme les index (0, 1, 2...) en vrais IDs (15, 20, 25...)
-            classes = label_encoder.inverse_transform(range(len(model.classes_)))
-        else:
-            classes = model.classes_
+        # (les index 0, 1, 2... correspondent aux vrais IDs 15, 20, 25...)
+        classes = current.recipe_index.recipe_ids
             
-        return jsonify({
+        return {
             'trained': True,
             'available': True,
             'model_type': 'Hybrid (XGBoost Habits + Rules)',
+            'model_version': current.version,
             'features': feature_names,
             'num_features': len(feature_names),
             'num_classes': len(classes),
@@ -792,51 +1806,120 @@ def model_info():
             # Champs de compatibilité pour votre frontend actuel
             'features_count': len(feature_names),
             'classes_count': len(classes)
-        })
+        }, 200
         
     except Exception as e:
-        print(f"Erreur model-info: {e}")
-        return jsonify({
+        log.exception("Erreur model-info")
+        return {
             'trained': False, 
             'available': False, 
             'error': str(e)
-        }), 500
-    
-@app.route('/health', methods=['GET'])
-def health():
-    return jsonify({'status': 'healthy', 'service': 'mont-vert-hybrid-ml'})
+        }, 500
 
-@app.route('/status', methods=['GET'])
-def status():
-    global model, feature_names, label_encoder
-    if model is None: load_model()
-    return jsonify({
-        'model_loaded': model is not None,
+def health_payload():
+    """200 une fois la phase de démarrage terminée (voir startup), 503 avant"""
+    if not service_ready:
+        return {'status': 'starting', 'service': 'mont-vert-hybrid-ml'}, 503
+    return {'status': 'healthy', 'service': 'mont-vert-hybrid-ml'}, 200
+
+def status_payload():
+    current = get_active_model()
+    return {
+        'model_loaded': current is not None,
         'model_type': 'Hybrid (Habit XGB + Rules)',
-        'num_features_habit': len(feature_names) if feature_names else 0,
-        'num_recipes_known': len(label_encoder.classes_) if label_encoder else 0
-    })
+        # Version servie par ce worker / dernière version publiée (différentes pendant un rechargement)
+        'model_version': current.version if current else None,
+        'published_version': (model_registry.read_pointer() or {}).get('version'),
+        'inference_backend': current.inference_backend if current else None,
+        # False : ce worker sert uniquement depuis les tableaux mmap partagés
+        'booster_loaded': current.booster_loaded if current else None,
+        'prediction_cache': prediction_cache.stats(),
+        'prediction_table': current.table.info() if current and current.table else None,
+        'score_profiles': dict(zip(('default', 'available'), score_profiles.names())),
+        'num_features_habit': len(current.feature_names) if current else 0,
+        'num_recipes_known': len(current.recipe_index) if current else 0
+    }, 200
 
-@app.route('/feature-importance', methods=['GET'])
-def feature_importance_endpoint():
+def feature_importance_payload():
     """Retourne l'importance des variables de contexte (Habitudes)"""
-    global model, feature_names
-    if model is None:
-        if not load_model(): return jsonify({'available': False, 'error': 'Modèle non chargé'})
+    current = get_active_model()
+    if current is None:
+        return {'available': False, 'error': 'Modèle non chargé'}, 200
     
     try:
-        importance = model.feature_importances_
+        feature_names = current.feature_names
+        importance = current.feature_importances()
         data = [
             {'feature': feature_names[i], 'importance': float(importance[i])}
             for i in range(len(feature_names))
         ]
         data.sort(key=lambda x: x['importance'], reverse=True)
-        return jsonify({'available': True, 'feature_importance': data})
+        return {'available': True, 'feature_importance': data}, 200
+    except Exception as e:
+        return {'available': False, 'error': str(e)}, 200
+
+@app.route('/model-info', methods=['GET'])
+def model_info():
+    body, status_code = model_info_payload()
+    return jsonify(body), status_code
+    
+@app.route('/health', methods=['GET'])
+def health():
+    body, status_code = health_payload()
+    return jsonify(body), status_code
+
+@app.route('/status', methods=['GET'])
+def status():
+    body, status_code = status_payload()
+    return jsonify(body), status_code
+
+@app.route('/feature-importance', methods=['GET'])
+def feature_importance_endpoint():
+    body, status_code = feature_importance_payload()
+    return jsonify(body), status_code
+
+# ═══════════════════════════════════════════════════════════════════════════
+# DÉMARRAGE (hooks gunicorn : voir gunicorn.conf.py)
+# ═══════════════════════════════════════════════════════════════════════════
+
+# Vrai quand le modèle publié est chargé et qu'une prédiction à blanc a tourné
+service_ready = False
+
+def preload_model():
+    """
+    Master gunicorn (preload_app) : lit le modèle publié une seule fois, SANS
+    inférence. Les workers forkés héritent de ces pages mémoire ; XGBoost n'a
+    encore démarré aucun thread OpenMP, qui ne survivrait pas au fork.
+    """
+    start = time.perf_counter()
+    try:
+        current = model_registry.load_current(loader=lambda version: load_version(version, warm=False))
+    except Exception as e:
+        log.warning(f"Préchargement du modèle impossible : {e}")
+        return
+    if current is not None:
+        log.info(f"Modèle préchargé dans le master en {time.perf_counter() - start:.2f}s")
+
+def startup():
+    """Phase de démarrage d'un worker : modèle (hérité du master ou chargé ici) + prédiction à blanc"""
+    global service_ready
+    log_config.start_listener()  # le thread d'écriture du master n'existe pas dans le worker forké
+    start = time.perf_counter()
+    current = None
+    try:
+        current = get_active_model()
+        if current is not None and not current.warmed:
+            warm_up(current)
     except Exception as e:
-        return jsonify({'available': False, 'error': str(e)})
+        log.warning(f"Démarrage sans modèle : {e}")
+    service_ready = True
+    if current is not None:
+        metrics.set_model_version(current.version)
+    log.info(f"Service prêt en {time.perf_counter() - start:.2f}s",
+             extra={'fields': {'model_version': current.version if current else None}})
 
 if __name__ == '__main__':
-    print(" Démarrage du service ML Mont-Vert (Mode Hybride)")
-    print(f"    Features Habitude : {HABIT_FEATURES}")
-    print(f"    Modèle : {MODEL_PATH}")
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    log.info("Démarrage du service ML Mont-Vert (Mode Hybride)",
+             extra={'fields': {'habit_features': HABIT_FEATURES, 'model_dir': MODEL_DIR}})
+    startup()
+    app.run(host='0.0.0.0', port=5001, debug=True)
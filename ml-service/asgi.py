@@ -0,0 +1,185 @@
+"""
+Mont-Vert ML Service - Entrée ASGI (async) du service
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+Avec les workers sync, chaque requête en cours (upload /train compris) occupe
+un processus entier. Ici une boucle asyncio par worker sert en natif les routes
+à fort volume (/predict, /model-info, /status, /feature-importance, /health) :
+  - l'inférence d'habitude (table, cache, moteur) part dans un pool de threads
+    borné (INFERENCE_THREADS), XGBoost libérant le GIL ;
+  - les /predict concurrents sont regroupés pendant MICRO_BATCH_WINDOW_MS
+    (au plus MICRO_BATCH_MAX contextes) en un seul appel au moteur
+    (micro_batching.py).
+Les autres routes (/train, /plan, /metrics...) restent celles de l'application
+Flask (app.py), servies par a2wsgi dans ses propres threads. Même code métier,
+mêmes hooks gunicorn (préchargement dans le master, startup par worker).
+"""
+
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import app as service
+import log_config
+import metrics
+from micro_batching import MicroBatcher
+
+log = logging.getLogger('mlservice')
+
+# Threads d'inférence par worker (appels XGBoost / prédicteur compilé simultanés)
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 2))
+# Attente des /predict quand un lot est déjà en cours dans le moteur (micro_batching.py)
+MICRO_BATCH_WINDOW_MS = float(os.environ.get('MICRO_BATCH_WINDOW_MS', 2))
+MICRO_BATCH_MAX = int(os.environ.get('MICRO_BATCH_MAX', 64))
+# Threads a2wsgi pour les routes Flask (/train, /plan...)
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 8))
+
+batcher = None
+
+
+def run_batch(current, X):
+    """Pool d'inférence : probabilités d'un micro-lot (table, cache puis moteur, voir app.habit_probas)"""
+    metrics.MICRO_BATCH_SIZE.observe(len(X))
+    return service.habit_probas(current, X)
+
+
+def terminated_input(wsgi_app):
+    """
+    a2wsgi fournit le corps ASGI jusqu'à son dernier message mais ne le signale
+    pas : sans Content-Length (corps chunked, comme /train envoyé par Node),
+    Werkzeug lirait un flux vide. Comme gunicorn, on pose wsgi.input_terminated.
+    """
+    def app(environ, start_response):
+        environ['wsgi.input_terminated'] = True
+        return wsgi_app(environ, start_response)
+    return app
+
+
+def json_response(body, status_code=200):
+    return JSONResponse(body, status_code=status_code)
+
+
+def route(path, methods=('GET',)):
+    """
+    Route native : identifiant de requête, métriques et ligne de log comme
+    start_request / finish_request côté Flask.
+    """
+    def wrap(handler):
+        async def endpoint(request):
+            start = time.perf_counter()
+            request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+            log_config.bind_request(request_id, sampled=path not in service.SAMPLED_LOG_PATHS or log_config.sample())
+            try:
+                response = await handler(request)
+            except Exception as e:
+                log.exception(f"Erreur {path}")
+                response = json_response({'success': False, 'error': str(e)}, 500)
+
+            elapsed = time.perf_counter() - start
+            metrics.REQUESTS.labels(path, request.method, response.status_code).inc()
+            metrics.REQUEST_LATENCY.labels(path).observe(elapsed)
+            response.headers['X-Request-ID'] = request_id
+            if response.status_code >= 400:
+                level = logging.WARNING
+            else:
+                level = logging.DEBUG if request.method == 'GET' else logging.INFO
+            log.log(level, "Requête traitée", extra={'fields': {
+                'method': request.method, 'endpoint': path, 'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 2)}})
+            log_config.bind_request(None)
+            return response
+        return Route(path, endpoint, methods=list(methods))
+    return wrap
+
+
+def prepare_predict(data, timer):
+    """
+    Modèle servi et corps validé : (modèle, PredictRequest, erreur). Lancé hors de
+    la boucle : le modèle (démarrage, rechargement) ou l'index recettes x
+    ingrédients peuvent être lus sur disque à cette étape.
+    """
+    current = service.get_active_model()
+    if current is None:
+        return None, None, ({'success': False, 'error': 'Modèle non entraîné'}, 400)
+    parsed, error = service.parse_predict(data, current, timer)
+    return current, parsed, error
+
+
+@route('/predict', methods=('POST',))
+async def predict(request):
+    """Même contrat que app.predict ; l'étape 'habit' passe par le micro-batcher"""
+    timer = metrics.StageTimer('/predict')
+    try:
+        data = await request.json()
+    except ValueError:
+        return json_response({'success': False, 'error': 'Corps JSON invalide'}, 400)
+
+    current, parsed, error = await run_in_threadpool(prepare_predict, data, timer)
+    if error:
+        return json_response(*error)
+
+    with timer.stage('habit'):
+        probas = (await batcher.submit(current, parsed.X[0]))[0]
+
+    body = service.predict_response(current, parsed, probas, timer)
+    with timer.stage('serialize'):
+        return json_response(body)
+
+
+# Lecture du modèle (et du booster pour l'importance des features) hors de la boucle
+
+@route('/model-info')
+async def model_info(request):
+    return json_response(*await run_in_threadpool(service.model_info_payload))
+
+
+@route('/status')
+async def status(request):
+    return json_response(*await run_in_threadpool(service.status_payload))
+
+
+@route('/feature-importance')
+async def feature_importance(request):
+    return json_response(*await run_in_threadpool(service.feature_importance_payload))
+
+
+@route('/health')
+async def health(request):
+    return json_response(*service.health_payload())
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global batcher
+    # Sous gunicorn, post_fork a déjà appelé startup() ; lancé seul (uvicorn asgi:app), c'est fait ici
+    if not service.service_ready:
+        service.startup()
+    executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix='inference')
+    batcher = MicroBatcher(run_batch, executor, window_ms=MICRO_BATCH_WINDOW_MS, max_batch=MICRO_BATCH_MAX)
+    log.info("Entrée ASGI prête", extra={'fields': {
+        'inference_threads': INFERENCE_THREADS, 'micro_batch_window_ms': MICRO_BATCH_WINDOW_MS,
+        'micro_batch_max': MICRO_BATCH_MAX}})
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=True)
+
+
+app = Starlette(
+    routes=[predict, model_info, status, feature_importance, health,
+            Mount('/', WSGIMiddleware(terminated_input(service.app), workers=WSGI_THREADS))],
+    # Comme CORS(app) côté Flask ; les en-têtes posés ici remplacent ceux de flask-cors
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
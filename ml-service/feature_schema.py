@@ -0,0 +1,62 @@
+"""
+Mont-Vert ML Service - Schéma typé des features d'habitude
+Les 6 features sont de petits entiers bornés : chaque colonne est validée une
+seule fois puis rangée dans le plus petit type entier qui la contient. XGBoost
+et le prédicteur compilé reçoivent ensuite UNE matrice float32 contiguë,
+construite en une allocation.
+Une valeur absente vaut 0 (comme l'ancien fillna(0)) : 0 est toujours accepté.
+"""
+
+import numpy as np
+
+# feature -> (type de stockage, min, max)
+FEATURE_SCHEMA = {
+    'day_of_week': (np.uint8, 0, 6),
+    'month': (np.uint8, 1, 12),
+    'week_of_year': (np.uint8, 0, 53),       # WEEK() MySQL : 0 à 53
+    'planned_portions': (np.uint16, 0, 65535),
+    'last_recipe_1': (np.uint32, 0, 2 ** 32 - 1),  # 0 = pas de recette précédente
+    'last_recipe_2': (np.uint32, 0, 2 ** 32 - 1)
+}
+
+# Features d'habitude du modèle (/train, /predict, scripts), dans l'ordre des colonnes
+HABIT_FEATURES = list(FEATURE_SCHEMA)
+
+
+def cast_column(name, values, lines=None):
+    """
+    Valide une colonne (float64, NaN = absent) et la convertit au type du schéma.
+    'lines' (numéros de ligne de chaque valeur) sert aux messages d'erreur.
+    Une feature hors schéma est simplement convertie en float32.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if name not in FEATURE_SCHEMA:
+        return np.nan_to_num(values, nan=0.0).astype(np.float32)
+
+    dtype, low, high = FEATURE_SCHEMA[name]
+    values = np.nan_to_num(values, nan=0.0)
+    bad = (values != np.floor(values)) | (((values < low) | (values > high)) & (values != 0))
+    if bad.any():
+        i = int(np.argmax(bad))
+        where = f"Ligne {lines[i]} : " if lines is not None else ""
+        raise ValueError(f"{where}{name} = {values[i]:g} invalide (entier de {low} à {high} attendu)")
+    return values.astype(dtype)
+
+
+def feature_matrix(columns, feature_names):
+    """Matrice float32 C-contiguë (n x nb_features) à partir des colonnes typées"""
+    n_rows = len(columns[feature_names[0]]) if feature_names else 0
+    X = np.empty((n_rows, len(feature_names)), dtype=np.float32)
+    for j, name in enumerate(feature_names):
+        X[:, j] = columns[name]
+    return X
+
+
+def context_matrix(contexts, feature_names):
+    """Matrice float32 validée (n x nb_features) pour des contextes de prédiction (dicts)"""
+    raw = np.array([
+        [np.nan if ctx.get(name) is None else ctx.get(name) for name in feature_names]
+        for ctx in contexts
+    ], dtype=np.float64).reshape(len(contexts), len(feature_names))
+    columns = {name: cast_column(name, raw[:, j]) for j, name in enumerate(feature_names)}
+    return feature_matrix(columns, feature_names)
@@ -0,0 +1,52 @@
+"""
+Configuration gunicorn du service ML : gunicorn -c gunicorn.conf.py app:app
+(ou -k uvicorn.workers.UvicornWorker asgi:app, mêmes hooks : voir asgi.py)
+
+Le master importe l'application et lit le modèle publié une seule fois
+(preload_app) ; les workers forkés partagent ces pages mémoire. Aucune
+inférence dans le master : le pool de threads OpenMP de XGBoost ne survit pas
+au fork. Chaque worker fait sa prédiction à blanc avant d'accepter des requêtes
+(/health répond 503 jusque-là).
+
+Après un /train, chaque worker recharge la nouvelle version lui-même : seuls
+les tableaux ouverts en mmap (classes, forêt compilée, table précalculée, voir
+shared_arrays.py) restent partagés. Avec INFERENCE_BACKEND=compiled, le booster
+XGBoost n'est pas chargé du tout par les workers.
+
+Métriques Prometheus : chaque processus écrit dans PROMETHEUS_MULTIPROC_DIR,
+fixé et vidé ici, avant que le master n'importe l'application (metrics.py).
+"""
+
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+# Un entraînement tourne dans un thread du worker : pas de timeout trop court
+timeout = 120
+
+# Les fichiers d'une exécution précédente fausseraient les compteurs
+multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                      os.path.join(tempfile.gettempdir(), 'mlservice-metrics'))
+shutil.rmtree(multiproc_dir, ignore_errors=True)
+os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def when_ready(server):
+    # Master, avant le premier fork
+    import app
+    app.preload_model()
+
+
+def post_fork(server, worker):
+    # Worker, avant qu'il n'accepte des connexions
+    import app
+    app.startup()
+
+
+def child_exit(server, worker):
+    # Master, après la sortie d'un worker : ses jauges "live" ne comptent plus
+    import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,114 @@
+"""
+Mont-Vert ML Service - Logs structurés
+Une ligne JSON par événement sur stdout : ts, level, logger, msg, request_id
+(X-Request-ID envoyé par Node) et les champs passés en extra={'fields': {...}}.
+
+Les requêtes n'écrivent jamais elles-mêmes : le QueueHandler du logger racine
+dépose l'enregistrement dans une file et un thread (QueueListener) le met en
+forme et l'écrit, traceback compris. Un thread ne survit pas au fork : chaque
+worker gunicorn redémarre le sien (start_listener, appelé par app.startup).
+
+Échantillonnage : sur les routes à fort volume (/predict...), seule une part
+LOG_SAMPLE_RATE des requêtes écrit ses logs INFO / DEBUG ; avertissements et
+erreurs sont toujours écrits.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+
+# Contexte de la requête en cours (un par thread / tâche)
+_request_id = contextvars.ContextVar('request_id', default=None)
+_sampled = contextvars.ContextVar('log_sampled', default=True)
+
+_handler = None
+_stream = None
+_listener = None
+_listener_pid = None
+
+
+def bind_request(request_id, sampled=True):
+    """Rattache les logs suivants de ce thread à request_id ; sampled=False ne garde que WARNING et plus"""
+    _request_id.set(request_id)
+    _sampled.set(sampled)
+
+
+def sample():
+    """Tirage de l'échantillonnage pour une requête d'une route à fort volume"""
+    return random.random() < LOG_SAMPLE_RATE
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Exécuté dans le thread appelant : ajoute request_id et applique l'échantillonnage"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return record.levelno >= logging.WARNING or _sampled.get()
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler qui ne met rien en forme dans le thread appelant : le message
+    est figé (args fusionnés), le traceback reste un objet et sera formaté par
+    le thread d'écriture.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging():
+    """Logger racine -> file -> thread d'écriture JSON (idempotent)"""
+    global _handler, _stream
+    if _handler is None:
+        _stream = logging.StreamHandler(sys.stdout)
+        _stream.setFormatter(JsonFormatter())
+        _handler = DeferredQueueHandler(queue.SimpleQueue())
+        _handler.addFilter(RequestContextFilter())
+        root = logging.getLogger()
+        root.handlers[:] = [_handler]
+        root.setLevel(LOG_LEVEL)
+    start_listener()
+
+
+def start_listener():
+    """Démarre le thread d'écriture de CE processus (nouvelle file après un fork)"""
+    global _listener, _listener_pid
+    if _handler is None or _listener_pid == os.getpid():
+        return
+    _handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_handler.queue, _stream, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    # Vide la file à l'arrêt du processus
+    atexit.register(_listener.stop)
@@ -0,0 +1,345 @@
+"""
+Mont-Vert ML Service - Planification multi-jours (/plan, /rollout)
+Choisit une recette par jour sur une période en tenant compte de ce que les
+jours précédents ont déjà consommé : deux jours ne peuvent plus compter sur
+le même lot qui va périmer.
+
+Le stock est suivi au niveau des lots. Après chaque jour, les ingrédients de la
+recette retenue sont prélevés FEFO (lot qui périme en premier d'abord), en
+une passe vectorisée sur tous les lots. Le lendemain, disponibilité et urgence
+de TOUTES les recettes sont recalculées sur le stock restant (matrice CSR de
+stock_features.py).
+
+Recherche en faisceau (beam) : chaque séquence partielle garde son propre
+stock ; les probabilités d'habitude des B séquences sont calculées en un seul
+appel (cache des prédictions compris). B = 1 donne un glouton. Si le budget
+de latence est dépassé, les jours restants sont complétés en glouton.
+
+/rollout prévoit les habitudes seules sur H jours : last_recipe_1 / 2 du jour
+N+1 dépendent de la recette du jour N, donc B séquences candidates avancent
+ensemble, un appel predict_proba de B lignes par jour (H appels au lieu de
+H x B allers-retours HTTP). Score d'une séquence : somme des log-probabilités.
+"""
+
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from scoring import blend_scores, format_predictions, top_k
+from stock_features import StockSnapshot
+
+MAX_PLAN_DAYS = 31
+MAX_BEAM_WIDTH = 16
+MAX_ROLLOUT_BEAM_WIDTH = 64
+MAX_PORTIONS = 65535  # borne de planned_portions dans feature_schema
+
+
+def day_context(day, planned_portions, last_recipes):
+    """
+    Features d'habitude d'une date, avec les conventions de l'export
+    d'entraînement (MySQL WEEKDAY : lundi = 0, WEEK mode 0 : semaines commençant
+    le dimanche, 0..53).
+    """
+    return {
+        'day_of_week': day.weekday(),
+        'month': day.month,
+        'week_of_year': int(day.strftime('%U')),
+        'planned_portions': planned_portions,
+        'last_recipe_1': last_recipes[0],
+        'last_recipe_2': last_recipes[1]
+    }
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f'{name} doit être une date AAAA-MM-JJ')
+
+
+def _parse_period(data):
+    """
+    (jours, portions par jour, [last_recipe_1, last_recipe_2]) communs à /plan et /rollout :
+      - start_date, puis end_date (incluse) ou horizon (nombre de jours)
+      - planned_portions : nombre (tous les jours) ou liste (un par jour)
+      - last_recipes : [last_recipe_1, last_recipe_2] avant start_date
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Corps JSON invalide : objet attendu')
+    start = _parse_date(data.get('start_date'), 'start_date')
+    if data.get('horizon') is not None and data.get('end_date') is None:
+        try:
+            num_days = int(data['horizon'])
+        except (TypeError, ValueError):
+            raise ValueError('horizon doit être un nombre de jours')
+    else:
+        num_days = (_parse_date(data.get('end_date', data.get('start_date')), 'end_date') - start).days + 1
+    if not 1 <= num_days <= MAX_PLAN_DAYS:
+        raise ValueError(f'La période doit couvrir de 1 à {MAX_PLAN_DAYS} jours')
+    days = [start + timedelta(days=i) for i in range(num_days)]
+
+    portions = data.get('planned_portions', 1)
+    if not isinstance(portions, list):
+        portions = [portions] * num_days
+    if len(portions) != num_days:
+        raise ValueError(f'planned_portions : {num_days} valeurs attendues (une par jour)')
+    if not all(isinstance(p, int) and not isinstance(p, bool) and 1 <= p <= MAX_PORTIONS for p in portions):
+        raise ValueError(f'planned_portions doit être un entier entre 1 et {MAX_PORTIONS}')
+
+    last_recipes = list(data.get('last_recipes') or [])[:2]
+    last_recipes += [0] * (2 - len(last_recipes))
+    if not all(isinstance(r, int) and r >= 0 for r in last_recipes):
+        raise ValueError('last_recipes doit être une liste de recipe_id')
+    return days, portions, last_recipes
+
+
+def _parse_beam_width(data, default, maximum):
+    try:
+        beam_width = int(data.get('beam_width', default))
+    except (TypeError, ValueError):
+        raise ValueError('beam_width doit être un nombre')
+    if not 1 <= beam_width <= maximum:
+        raise ValueError(f'beam_width doit être entre 1 et {maximum}')
+    return beam_width
+
+
+def parse_plan_request(data, default_beam_width=4, default_budget_ms=250):
+    """
+    Paramètres validés d'une requête /plan ; ValueError avec un message utilisateur.
+    Période comme _parse_period, plus beam_width, budget_ms,
+    require_feasible (défaut vrai) et allow_repeats (défaut faux).
+    """
+    days, portions, last_recipes = _parse_period(data)
+    beam_width = _parse_beam_width(data, default_beam_width, MAX_BEAM_WIDTH)
+    try:
+        budget_ms = float(data.get('budget_ms', default_budget_ms))
+    except (TypeError, ValueError):
+        raise ValueError('budget_ms doit être numérique')
+    if budget_ms <= 0:
+        raise ValueError('budget_ms doit être positif')
+
+    return {
+        'days': days,
+        'portions': portions,
+        'last_recipes': last_recipes,
+        'beam_width': beam_width,
+        'budget_ms': budget_ms,
+        'require_feasible': bool(data.get('require_feasible', True)),
+        'allow_repeats': bool(data.get('allow_repeats', False))
+    }
+
+
+def parse_rollout_request(data, default_beam_width=8):
+    """
+    Paramètres validés d'une requête /rollout : période comme _parse_period,
+    beam_width (séquences suivies) et num_sequences (séquences renvoyées, <= beam_width).
+    """
+    days, portions, last_recipes = _parse_period(data)
+    beam_width = _parse_beam_width(data, default_beam_width, MAX_ROLLOUT_BEAM_WIDTH)
+    try:
+        num_sequences = int(data.get('num_sequences', min(5, beam_width)))
+    except (TypeError, ValueError):
+        raise ValueError('num_sequences doit être un nombre')
+    if not 1 <= num_sequences <= beam_width:
+        raise ValueError('num_sequences doit être entre 1 et beam_width')
+    return {'days': days, 'portions': portions, 'last_recipes': last_recipes,
+            'beam_width': beam_width, 'num_sequences': num_sequences}
+
+
+def rollout(habit_fn, recipe_index, request):
+    """
+    Recherche en faisceau sur les seules probabilités d'habitude.
+    habit_fn(contexts) -> probabilités (len(contexts) x nb_classes) ; un appel par jour.
+    Retourne les num_sequences meilleures séquences (log-probabilité jointe décroissante).
+    """
+    days, portions, width = request['days'], request['portions'], request['beam_width']
+    # Chaque séquence : recipe_id des jours précédents (les deux derniers servent de features)
+    histories = np.array([request['last_recipes'][::-1]], dtype=np.int64)
+    classes = np.empty((1, 0), dtype=np.int64)
+    step_probas = np.empty((1, 0))
+    log_probs = np.zeros(1)
+
+    for day, day_portions in zip(days, portions):
+        contexts = [day_context(day, day_portions, (history[-1], history[-2])) for history in histories.tolist()]
+        probas = habit_fn(contexts)
+        # Score de chaque extension (séquence b, recette c) : une matrice B x C
+        totals = log_probs[:, None] + np.log(np.maximum(probas, 1e-12))
+        best = top_k(totals.ravel(), width)
+        parents, chosen = np.divmod(best, probas.shape[1])
+
+        histories = np.column_stack((histories[parents], recipe_index.recipe_ids[chosen]))
+        classes = np.column_stack((classes[parents], chosen))
+        step_probas = np.column_stack((step_probas[parents], probas[parents, chosen]))
+        log_probs = totals.ravel()[best]
+
+    sequences = []
+    for b in range(min(request['num_sequences'], len(log_probs))):
+        sequences.append({
+            'log_prob': round(float(log_probs[b]), 4),
+            'joint_probability': float(np.exp(log_probs[b])),
+            'days': [
+                {'date': day.isoformat(), 'planned_portions': day_portions,
+                 'recipe_id': int(recipe_index.recipe_ids[c]), 'probability': round(float(p), 4)}
+                for day, day_portions, c, p in zip(days, portions, classes[b], step_probas[b])
+            ]
+        })
+    return sequences
+
+
+class LotStock:
+    """
+    Lots triés par (produit, jours avant péremption). Les quantités restantes
+    vivent à part (un vecteur par séquence du faisceau) : l'objet est partagé.
+    """
+
+    def __init__(self, product_ids, quantity, days_to_expiry):
+        order = np.lexsort((days_to_expiry, product_ids))
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)[order]
+        self.quantity = np.asarray(quantity, dtype=np.float64)[order]
+        self.days_to_expiry = np.asarray(days_to_expiry, dtype=np.float64)[order]
+        self.products, self.starts, self.group = np.unique(self.product_ids, return_index=True, return_inverse=True)
+
+    @classmethod
+    def parse(cls, payload):
+        """Même format que 'stock' de /predict, avec une ligne par LOT (un produit peut se répéter)"""
+        snapshot = StockSnapshot.parse(payload)
+        return cls(snapshot.product_ids, snapshot.available_qty, snapshot.days_to_expiry)
+
+    def _usable(self, remaining, day_offset):
+        return (self.days_to_expiry - day_offset >= 0) & (remaining > 0)
+
+    def snapshot(self, remaining, day_offset):
+        """Stock par produit vu le jour day_offset : lots périmés exclus, péremptions rapprochées"""
+        days = self.days_to_expiry - day_offset
+        usable = self._usable(remaining, day_offset)
+        qty = np.bincount(self.group, weights=np.where(usable, remaining, 0.0), minlength=len(self.products))
+        # Lots triés par péremption dans chaque produit : le premier lot utilisable donne le minimum
+        min_days = np.full(len(self.products), np.inf)
+        np.minimum.at(min_days, self.group[usable], days[usable])
+        known = np.isfinite(min_days)
+        return StockSnapshot(self.products[known], qty[known], min_days[known])
+
+    def consume(self, remaining, day_offset, need):
+        """
+        Quantités restantes après prélèvement FEFO de 'need' (quantité par
+        produit, alignée sur self.products). Un besoin non couvert vide les
+        lots disponibles sans aller en négatif.
+        """
+        available = np.where(self._usable(remaining, day_offset), remaining, 0.0)
+        # Quantité des lots du même produit qui périment avant : cumul exclusif par produit
+        before = np.cumsum(available) - available
+        before -= before[self.starts][self.group]
+        taken = np.clip(need[self.group] - before, 0.0, available)
+        return remaining - taken
+
+    def expiring_unused(self, remaining, num_days):
+        """(nb de lots, quantité) encore en stock qui périment avant la fin de la période"""
+        lost = (self.days_to_expiry < num_days) & (remaining > 0)
+        return int(lost.sum()), float(remaining[lost].sum())
+
+
+class MealPlanner:
+    """
+    Planifie une période pour un modèle et un index recettes x ingrédients.
+    habit_fn(contexts) -> probabilités (len(contexts) x nb_classes).
+    """
+
+    def __init__(self, ingredients, recipe_index, lots, profile, habit_fn):
+        self.ingredients = ingredients
+        self.recipe_index = recipe_index
+        self.lots = lots
+        self.profile = profile
+        self.habit_fn = habit_fn
+        # Classe du modèle -> ligne de la matrice des besoins (-1 : recette sans ingrédient connu)
+        self.row_of_class = np.full(len(recipe_index), -1, dtype=np.int64)
+        positions = recipe_index.positions(ingredients.recipe_ids)
+        self.row_of_class[positions[positions >= 0]] = np.flatnonzero(positions >= 0)
+        # Colonne de la matrice -> produit du stock (-1 : produit absent du stock)
+        self.product_of_col = np.full(len(ingredients.product_ids), -1, dtype=np.int64)
+        if len(lots.products):
+            pos = np.minimum(np.searchsorted(lots.products, ingredients.product_ids), len(lots.products) - 1)
+            self.product_of_col = np.where(lots.products[pos] == ingredients.product_ids, pos, -1)
+
+    def need(self, class_index, planned_portions):
+        """Quantité par produit du stock consommée par une recette pour planned_portions"""
+        need = np.zeros(len(self.lots.products))
+        row = self.row_of_class[class_index]
+        if row < 0:
+            return need
+        A = self.ingredients.requirements
+        cols = A.indices[A.indptr[row]:A.indptr[row + 1]]
+        qty = A.data[A.indptr[row]:A.indptr[row + 1]] * planned_portions
+        products = self.product_of_col[cols]
+        known = products >= 0
+        np.add.at(need, products[known], qty[known])
+        return need
+
+    def plan(self, request):
+        """Meilleure séquence (une recette par jour) et statistiques de la recherche"""
+        start = time.perf_counter()
+        deadline = start + request['budget_ms'] / 1000
+        days, portions = request['days'], request['portions']
+        if not request['allow_repeats'] and len(days) > len(self.recipe_index):
+            # Sans répétition, il faut au moins une recette distincte par jour
+            raise ValueError(f'{len(days)} jours pour {len(self.recipe_index)} recettes : '
+                             'allow_repeats requis')
+        beams = [{'score': 0.0, 'classes': [], 'recipes': list(request['last_recipes'][::-1]),
+                  'remaining': self.lots.quantity.copy(), 'days': []}]
+        degraded_at = None
+
+        for d, (day, day_portions) in enumerate(zip(days, portions)):
+            width = request['beam_width']
+            if degraded_at is None and d > 0 and time.perf_counter() > deadline:
+                degraded_at = d
+            if degraded_at is not None:
+                beams, width = beams[:1], 1
+
+            contexts = [day_context(day, day_portions, (beam['recipes'][-1], beam['recipes'][-2])) for beam in beams]
+            probas = self.habit_fn(contexts)
+
+            candidates = []
+            for b, beam in enumerate(beams):
+                stock = self.ingredients.class_features(self.lots.snapshot(beam['remaining'], d), day_portions,
+                                                        self.recipe_index)
+                scores = blend_scores(probas[b], stock['availability_score'], stock['urgency_score'],
+                                      self.profile.weights)
+                allowed = np.ones(len(scores), dtype=bool)
+                if not request['allow_repeats']:
+                    allowed[beam['classes']] = False
+                mask = allowed & stock['recipe_feasible'] if request['require_feasible'] else allowed
+                if not mask.any():
+                    mask = allowed  # aucune recette faisable ce jour-là : la meilleure quand même
+                for c in top_k(scores, width, mask):
+                    candidates.append((beam['score'] + float(scores[c]), b, int(c), probas[b], scores, stock))
+
+            # Tri stable : à score égal, l'ordre du faisceau précédent puis des classes est conservé
+            candidates.sort(key=lambda cand: -cand[0])
+            next_beams = []
+            for total, b, c, habit, scores, stock in candidates[:width]:
+                beam = beams[b]
+                entry = format_predictions([c], self.recipe_index, habit, stock['availability_score'],
+                                           stock['urgency_score'], scores, contexts[b], self.profile, stock)[0]
+                entry.update(date=day.isoformat(), planned_portions=day_portions)
+                next_beams.append({
+                    'score': total,
+                    'classes': beam['classes'] + [c],
+                    'recipes': beam['recipes'] + [entry['recipe_id']],
+                    'remaining': self.lots.consume(beam['remaining'], d, self.need(c, day_portions)),
+                    'days': beam['days'] + [entry]
+                })
+            beams = next_beams
+
+        best = beams[0]
+        lots_lost, qty_lost = self.lots.expiring_unused(best['remaining'], len(days))
+        return {
+            'plan': best['days'],
+            'total_score': round(best['score'], 4),
+            'expiring_unused': {'lots': lots_lost, 'quantity': round(qty_lost, 3)},
+            'search': {
+                'beam_width': request['beam_width'],
+                'degraded_at_day': degraded_at,
+                'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+                'budget_ms': request['budget_ms']
+            }
+        }
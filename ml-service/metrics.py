@@ -0,0 +1,122 @@
+"""
+Mont-Vert ML Service - Métriques Prometheus (/metrics)
+Compteurs de requêtes, histogrammes de latence par endpoint et par étape de
+/predict, durée de chargement des modèles et des entraînements, succès du
+cache et de la table des prédictions, taille des micro-lots (ASGI), version servie.
+
+Plusieurs workers gunicorn : avec PROMETHEUS_MULTIPROC_DIR, chaque processus
+écrit ses valeurs dans des fichiers mmap de ce dossier et /metrics (servi par
+n'importe quel worker) les agrège avec MultiProcessCollector. La variable doit
+être définie AVANT l'import de prometheus_client : gunicorn.conf.py la fixe,
+vide le dossier au démarrage et marque les workers arrêtés (child_exit).
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+# Une requête /predict prend quelques ms ; un lot /predict-batch jusqu'à ~1 s
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+MODEL_LOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TRAINING_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+REQUESTS = Counter('mlservice_requests_total', 'Requêtes HTTP traitées',
+                   ['endpoint', 'method', 'status'])
+REQUEST_LATENCY = Histogram('mlservice_request_duration_seconds', 'Durée de traitement des requêtes HTTP',
+                            ['endpoint'], buckets=REQUEST_BUCKETS)
+STAGE_LATENCY = Histogram('mlservice_predict_stage_seconds',
+                          'Durée des étapes de /predict et /predict-batch '
+                          '(parse, features, habit, stock, scoring, serialize)',
+                          ['endpoint', 'stage'], buckets=STAGE_BUCKETS)
+MODEL_LOAD = Histogram('mlservice_model_load_seconds', "Chargement d'une version de modèle (fichiers + warm-up)",
+                       buckets=MODEL_LOAD_BUCKETS)
+TRAINING = Histogram('mlservice_training_duration_seconds', 'Durée des jobs /train et /tune',
+                     ['kind', 'status'], buckets=TRAINING_BUCKETS)
+CACHE_LOOKUPS = Counter('mlservice_prediction_cache_lookups_total', 'Consultations du cache des probabilités',
+                        ['result'])
+TABLE_LOOKUPS = Counter('mlservice_prediction_table_lookups_total', 'Contextes cherchés dans la table précalculée',
+                        ['result'])
+# Entrée ASGI : contextes par appel au moteur (micro_batching.py)
+MICRO_BATCH_SIZE = Histogram('mlservice_micro_batch_size', 'Contextes /predict regroupés par appel au moteur (ASGI)',
+                             buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+# 1 pour chaque version servie par au moins un worker vivant
+MODEL_INFO = Gauge('mlservice_model_info', 'Version de modèle servie', ['version'],
+                   multiprocess_mode='livemax')
+
+_served_version = None
+
+
+def set_model_version(version):
+    """Déclare la version servie par ce processus (l'ancienne repasse à 0)"""
+    global _served_version
+    if version == _served_version:
+        return
+    if _served_version is not None:
+        MODEL_INFO.labels(_served_version).set(0)
+    MODEL_INFO.labels(version).set(1)
+    _served_version = version
+
+
+def record_cache(hits, misses):
+    if hits:
+        CACHE_LOOKUPS.labels('hit').inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels('miss').inc(misses)
+
+
+def record_table(hits, misses):
+    if hits:
+        TABLE_LOOKUPS.labels('hit').inc(hits)
+    if misses:
+        TABLE_LOOKUPS.labels('miss').inc(misses)
+
+
+class StageTimer:
+    """Chronomètre les étapes d'une requête : with timer.stage('habit'): ..."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            STAGE_LATENCY.labels(self.endpoint, name).observe(time.perf_counter() - start)
+
+
+def timed_job(kind, fn):
+    """fn(job, *args) d'un job d'entraînement, dont la durée est mesurée (réussi ou échoué)"""
+    def run(job, *args):
+        start = time.perf_counter()
+        status = 'failed'
+        try:
+            result = fn(job, *args)
+            status = 'succeeded'
+            return result
+        finally:
+            TRAINING.labels(kind, status).observe(time.perf_counter() - start)
+    return run
+
+
+def exposition():
+    """(corps, content-type) au format texte Prometheus, agrégé sur tous les workers si multiprocess"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Master gunicorn, à la sortie d'un worker : ses jauges 'live*' disparaissent"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,75 @@
+"""
+Mont-Vert ML Service - Micro-batching des prédictions (entrée ASGI, asgi.py)
+Les /predict concurrents d'un worker déposent leur contexte dans une file ;
+un seul appel au moteur par modèle pour tout le lot, exécuté dans le pool de
+threads borné (XGBoost libère le GIL pendant l'inférence). Chaque requête
+récupère sa ligne de probabilités.
+Moteur inoccupé : la file part au tour de boucle suivant (pas d'attente à
+faible charge). Un lot déjà en cours : elle attend la fenêtre (window_ms),
+ou part dès max_batch contextes.
+"""
+
+import asyncio
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    run_batch(current, X) -> probas (n x nb_classes), appelé dans 'executor'.
+    À utiliser depuis la boucle asyncio qui l'a créé.
+    """
+
+    def __init__(self, run_batch, executor, window_ms=2.0, max_batch=64):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending = []
+        self._timer = None
+        self._running = 0
+
+    async def submit(self, current, row):
+        """Probabilités (1 x nb_classes) du contexte 'row' (6 features) pour le modèle 'current'"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((current, row, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            # Seules les requêtes arrivées dans le même tour de boucle sont groupées si rien ne tourne
+            wait = self.window if self._running else 0
+            self._timer = loop.call_later(wait, self._flush) if wait else loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+
+        # Un rechargement peut survenir au milieu d'une fenêtre : un lot par version servie
+        groups = {}
+        for current, row, future in pending:
+            groups.setdefault(id(current), (current, [], []))
+            groups[id(current)][1].append(row)
+            groups[id(current)][2].append(future)
+
+        loop = asyncio.get_running_loop()
+        for current, rows, futures in groups.values():
+            self._running += 1
+            task = loop.run_in_executor(self.executor, self.run_batch, current, np.vstack(rows))
+            task.add_done_callback(lambda done, futures=futures: self._resolve(done, futures))
+
+    def _resolve(self, done, futures):
+        self._running -= 1
+        error = done.exception()
+        probas = None if error else done.result()
+        for i, future in enumerate(futures):
+            # Client déconnecté : la requête a été annulée entre-temps
+            if future.done():
+                continue
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(probas[i:i + 1])
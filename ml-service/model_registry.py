@@ -0,0 +1,169 @@
+"""
+Mont-Vert ML Service - Registre de modèles versionnés
+Chaque entraînement produit une version : ses fichiers portent la version dans
+leur nom et sont écrits dans un fichier temporaire puis renommés, un lecteur ne
+voit donc jamais un fichier à moitié écrit. Le pointeur current_version.json
+désigne la version servie ; chaque worker compare son mtime (un os.stat) pour
+détecter une version publiée ailleurs et la recharge en arrière-plan.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+POINTER_NAME = 'current_version.json'
+
+
+class ModelRegistry:
+    """
+    loader(version) construit le modèle prêt à servir pour une version publiée
+    (objet exposant .version) et lève une exception si c'est impossible.
+    on_change(modèle) est appelé à chaque changement du modèle servi.
+    """
+
+    def __init__(self, model_dir, loader, on_change=None, prefix='recipe_model_hybrid',
+                 keep_versions=3, check_interval=1.0):
+        self.model_dir = model_dir
+        self.loader = loader
+        self.on_change = on_change
+        self.prefix = prefix
+        self.keep_versions = keep_versions
+        self.check_interval = check_interval
+        self.pointer_path = os.path.join(model_dir, POINTER_NAME)
+        self.active = None
+        self._lock = threading.Lock()  # un seul chargement / publication à la fois
+        self._pointer_mtime = None
+        self._next_check = 0.0
+        self._reloading = False
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Fichiers
+    # ───────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def new_version():
+        """Identifiant de version triable chronologiquement"""
+        return f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    def path(self, version, suffix):
+        """Chemin d'un fichier de la version (ex. suffix='.pkl')"""
+        return os.path.join(self.model_dir, f'{self.prefix}-{version}{suffix}')
+
+    @staticmethod
+    def write_atomic(path, write_fn):
+        """write_fn(fichier binaire) dans un temporaire, puis rename atomique vers 'path'"""
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                write_fn(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def read_pointer(self):
+        """Contenu de current_version.json, ou None si aucune version publiée"""
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _pointer_stat(self):
+        try:
+            return os.stat(self.pointer_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Publication / chargement
+    # ───────────────────────────────────────────────────────────────────────
+
+    def publish(self, loaded, metadata=None):
+        """Désigne loaded.version comme version servie par tous les workers et l'active ici"""
+        pointer = {
+            'version': loaded.version,
+            'published_at': datetime.now().isoformat(timespec='seconds'),
+            **(metadata or {})
+        }
+        with self._lock:
+            self.write_atomic(self.pointer_path, lambda f: f.write(json.dumps(pointer).encode('utf-8')))
+            self._pointer_mtime = self._pointer_stat()
+            self._activate(loaded)
+        self._prune(loaded.version)
+
+    def load_current(self, loader=None):
+        """
+        Charge (de façon synchrone) la version désignée par le pointeur ; None si aucune.
+        'loader' remplace ponctuellement self.loader (ex. chargement sans inférence).
+        """
+        with self._lock:
+            # mtime lu AVANT le contenu : une publication concurrente sera revue au prochain contrôle
+            mtime = self._pointer_stat()
+            pointer = self.read_pointer()
+            if pointer is None:
+                self._pointer_mtime = mtime
+                return self.active
+            if self.active is None or self.active.version != pointer['version']:
+                self._activate((loader or self.loader)(pointer['version']))
+            self._pointer_mtime = mtime
+            return self.active
+
+    def _activate(self, loaded):
+        # Une seule affectation : les requêtes en cours gardent leur référence à l'ancien modèle
+        self.active = loaded
+        if self.on_change is not None:
+            self.on_change(loaded)
+
+    def current(self):
+        """
+        Modèle servi par ce worker. Au plus toutes les check_interval secondes,
+        vérifie si une autre version a été publiée ; si oui, elle est rechargée
+        dans un thread pendant que l'ancienne continue de servir.
+        """
+        active = self.active
+        if active is None:
+            return self.load_current()
+
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            if self._pointer_stat() != self._pointer_mtime and not self._reloading:
+                self._reloading = True
+                threading.Thread(target=self._reload, name='model-reload', daemon=True).start()
+        return active
+
+    def _reload(self):
+        try:
+            previous = self.active
+            loaded = self.load_current()
+            if loaded is not previous:
+                log.info(f"Nouvelle version de modèle chargée : {loaded.version}")
+        except Exception as e:
+            log.warning(f"Rechargement du modèle impossible : {e}")
+        finally:
+            self._reloading = False
+
+    def _prune(self, current_version):
+        """Supprime les fichiers des versions au-delà des keep_versions plus récentes"""
+        marker = f'{self.prefix}-'
+        try:
+            names = [name for name in os.listdir(self.model_dir) if name.startswith(marker) and not name.endswith('.tmp')]
+        except OSError:
+            return
+        versions = sorted({name[len(marker):].split('.', 1)[0] for name in names}, reverse=True)
+        stale = [v for v in versions[self.keep_versions:] if v != current_version]
+        for name in names:
+            if name[len(marker):].split('.', 1)[0] in stale:
+                try:
+                    os.remove(os.path.join(self.model_dir, name))
+                except OSError:
+                    pass
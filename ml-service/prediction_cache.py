@@ -0,0 +1,71 @@
+"""
+Mont-Vert ML Service - Cache des probabilités d'habitude
+LRU (taille max + durée de vie) indexé sur le tuple des 6 HABIT_FEATURES.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Cache LRU thread-safe : contexte (tuple) -> vecteur de probabilités.
+    Un vecteur en cache est en lecture seule : il est partagé entre requêtes.
+    max_size=0 désactive le cache.
+    """
+
+    def __init__(self, max_size=4096, ttl_seconds=3600.0):
+        self.max_size = int(max_size)
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries = OrderedDict()  # clé -> (expiration, probas)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        """Vecteur en cache pour ce contexte, ou None (absent / expiré)"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, probas):
+        if not self.enabled:
+            return
+        probas.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, probas)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Vide le cache (nouveau modèle) ; les compteurs sont conservés"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,143 @@
+"""
+Mont-Vert ML Service - Table de prédictions précalculées
+Les 6 features d'habitude prennent peu de valeurs (7 jours, 12 mois, 54
+semaines, des portions bornées, les recettes précédentes connues). Après un
+entraînement, les probabilités de tous les contextes distincts vus à
+l'entraînement sont calculées une fois et écrites avec la version :
+  - .table.arrays : clés des contextes (uint64 triés) et vocabulaire des
+    recettes précédentes (shared_arrays.py) ;
+  - .table.npy : probabilités float32 (contextes x classes).
+Les deux sont ouverts en mmap lecture seule : les workers lisent les mêmes
+pages du cache disque du noyau, la table n'est pas recopiée par processus.
+Une recherche est un searchsorted sur les clés ; un contexte absent de la table
+passe par le modèle.
+"""
+
+import numpy as np
+
+import shared_arrays
+
+# Bits de chaque feature dans la clé, dans l'ordre de HABIT_FEATURES :
+# jour (0-6), mois (0-12), semaine (0-53), portions (0-65535), puis le code
+# des deux recettes précédentes dans le vocabulaire (0 = pas de recette)
+KEY_BITS = (3, 4, 6, 16, 17, 17)
+RECIPE_COLUMNS = (4, 5)
+MAX_VOCAB = 2 ** 17 - 1
+
+# Contextes prédits par appel au moteur pendant la construction
+BUILD_BATCH_SIZE = 8192
+
+
+def pack_keys(codes):
+    """Clés uint64 des lignes de 'codes' (n x 6, entiers déjà dans leurs bornes)"""
+    keys = np.zeros(len(codes), dtype=np.uint64)
+    for j, bits in enumerate(KEY_BITS):
+        keys = (keys << np.uint64(bits)) | codes[:, j].astype(np.uint64)
+    return keys
+
+
+def recipe_codes(vocab, ids):
+    """(codes, connus) : position + 1 de chaque recipe_id dans le vocabulaire trié, 0 pour 0"""
+    if len(vocab) == 0:
+        return np.zeros_like(ids), ids == 0
+    pos = np.searchsorted(vocab, ids)
+    known = (ids == 0) | (vocab[np.minimum(pos, len(vocab) - 1)] == ids)
+    return np.where(ids == 0, 0, pos + 1), known
+
+
+def encode(X, vocab):
+    """(clés, encodables) des contextes de X ; une recette précédente hors vocabulaire n'est pas encodable"""
+    codes = np.asarray(X).astype(np.int64).reshape(-1, len(KEY_BITS))
+    encodable = np.ones(len(codes), dtype=bool)
+    for j in RECIPE_COLUMNS:
+        codes[:, j], known = recipe_codes(vocab, codes[:, j])
+        encodable &= known
+    for j, bits in enumerate(KEY_BITS):
+        encodable &= (codes[:, j] >= 0) & (codes[:, j] < (1 << bits))
+    codes[~encodable] = 0
+    return pack_keys(codes), encodable
+
+
+def select_contexts(X, max_rows):
+    """
+    Contextes distincts de X (les max_rows plus fréquents s'il y en a plus),
+    triés par clé : (clés, vocabulaire, contextes float32).
+    """
+    contexts, counts = np.unique(np.asarray(X, dtype=np.float32), axis=0, return_counts=True)
+    if len(contexts) > max_rows:
+        contexts = contexts[np.argsort(-counts, kind='stable')[:max_rows]]
+
+    previous = contexts[:, list(RECIPE_COLUMNS)].astype(np.int64).ravel()
+    vocab = np.unique(previous[previous != 0])
+    if len(vocab) > MAX_VOCAB:
+        raise ValueError(f"{len(vocab)} recettes précédentes distinctes (max {MAX_VOCAB})")
+
+    keys, encodable = encode(contexts, vocab)
+    contexts, keys = contexts[encodable], keys[encodable]
+    order = np.argsort(keys)
+    return keys[order], vocab, np.ascontiguousarray(contexts[order])
+
+
+def write_probas(file, contexts, predict_fn, num_class, batch_size=BUILD_BATCH_SIZE):
+    """
+    Écrit au format .npy (fichier binaire ouvert) les probabilités float32 des
+    contextes, lot par lot : la matrice complète n'est jamais en mémoire.
+    """
+    np.lib.format.write_array_header_1_0(file, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+        'fortran_order': False,
+        'shape': (len(contexts), int(num_class))
+    })
+    for start in range(0, len(contexts), batch_size):
+        probas = np.ascontiguousarray(predict_fn(contexts[start:start + batch_size]), dtype=np.float32)
+        if probas.shape[1] != num_class:
+            raise ValueError(f"{probas.shape[1]} probabilités par contexte, {num_class} attendues")
+        file.write(probas.tobytes())
+
+
+def write_keys(file, keys, vocab):
+    shared_arrays.save(file, {'keys': keys, 'vocab': vocab})
+
+
+class PredictionTable:
+    """Contextes précalculés d'une version : keys[i] -> probas[i] (memmap float32)"""
+
+    def __init__(self, keys, vocab, probas):
+        self.keys = keys
+        self.vocab = vocab
+        self.probas = probas
+
+    @classmethod
+    def load(cls, keys_path, probas_path):
+        data = shared_arrays.load(keys_path)
+        keys, vocab = data['keys'], data['vocab']
+        probas = np.load(probas_path, mmap_mode='r')
+        if probas.shape[0] != len(keys):
+            raise ValueError(f"Table incohérente : {len(keys)} clés, {probas.shape[0]} lignes")
+        return cls(keys, vocab, probas)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def num_class(self):
+        return self.probas.shape[1]
+
+    def lookup(self, X):
+        """(trouvés, positions) : la ligne i de X est dans la table si trouvés[i], à la ligne positions[i]"""
+        keys, encodable = encode(X, self.vocab)
+        if len(self.keys) == 0:
+            return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return encodable & (self.keys[positions] == keys), positions
+
+    def rows(self, positions):
+        """Probabilités (copie float32) des lignes 'positions' de la table"""
+        return np.array(self.probas[positions])
+
+    def info(self):
+        return {
+            'rows': len(self.keys),
+            'num_classes': int(self.num_class),
+            'size_mb': round((self.probas.nbytes + self.keys.nbytes) / 1e6, 2)
+        }
@@ -0,0 +1,149 @@
+"""
+Mont-Vert ML Service - Profils de pondération du score hybride
+Chaque cuisine peut choisir son compromis habitude / disponibilité / urgence
+(ex. les sites anti-gaspillage poussent l'urgence). Les profils sont décrits
+dans un fichier JSON (score_profiles.json), relu dès que son mtime change :
+pas de redéploiement pour ajuster un poids.
+
+Format :
+    {
+      "default": "standard",
+      "profiles": {
+        "standard":   {"weights": {"habit": 0.4, "availability": 0.3, "urgency": 0.3},
+                       "confidence": {"high": 0.6, "medium": 0.4}},
+        "anti_gaspi": {"weights": {"habit": 0.25, "availability": 0.25, "urgency": 0.5}}
+      }
+    }
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Ordre des composantes : celui de np.stack((probas, availability, urgency)) dans scoring.py
+COMPONENTS = ('habit', 'availability', 'urgency')
+
+DEFAULT_CONFIDENCE = {'high': 0.6, 'medium': 0.4}
+
+
+class ScoreProfile:
+    """Profil compilé : poids en vecteur float64 (3,) prêt pour un produit matriciel"""
+
+    def __init__(self, name, weights, confidence=None):
+        self.name = name
+        self.weights = np.array([float(weights[c]) for c in COMPONENTS], dtype=np.float64)
+        confidence = {**DEFAULT_CONFIDENCE, **(confidence or {})}
+        self.confidence_high = float(confidence['high'])
+        self.confidence_medium = float(confidence['medium'])
+
+    def to_dict(self):
+        """Forme renvoyée dans les réponses /predict"""
+        return {
+            'name': self.name,
+            'weights': {c: float(w) for c, w in zip(COMPONENTS, self.weights)},
+            'confidence': {'high': self.confidence_high, 'medium': self.confidence_medium}
+        }
+
+
+# Profil historique (0.4 / 0.3 / 0.3), utilisé sans fichier de profils
+DEFAULT_PROFILE = ScoreProfile('standard', {'habit': 0.4, 'availability': 0.3, 'urgency': 0.3})
+
+
+def parse_profiles(config):
+    """
+    (nom du profil par défaut, {nom: ScoreProfile}) à partir du contenu du fichier.
+    Lève ValueError si un profil est incomplet ou incohérent.
+    """
+    raw_profiles = config.get('profiles')
+    if not isinstance(raw_profiles, dict) or not raw_profiles:
+        raise ValueError("'profiles' doit être un objet non vide")
+
+    profiles = {}
+    for name, raw in raw_profiles.items():
+        weights = (raw or {}).get('weights') or {}
+        missing = [c for c in COMPONENTS if c not in weights]
+        if missing:
+            raise ValueError(f"Profil '{name}' : poids manquants {missing}")
+        try:
+            profile = ScoreProfile(name, weights, raw.get('confidence'))
+        except (TypeError, ValueError):
+            raise ValueError(f"Profil '{name}' : poids et seuils doivent être numériques")
+        if (profile.weights < 0).any() or profile.weights.sum() <= 0:
+            raise ValueError(f"Profil '{name}' : poids positifs attendus")
+        if not 0 <= profile.confidence_medium <= profile.confidence_high:
+            raise ValueError(f"Profil '{name}' : il faut 0 <= confidence.medium <= confidence.high")
+        profiles[name] = profile
+
+    default = config.get('default', next(iter(profiles)))
+    if default not in profiles:
+        raise ValueError(f"Profil par défaut inconnu : '{default}'")
+    return default, profiles
+
+
+class ProfileStore:
+    """
+    Profils chargés depuis 'path' et rechargés quand le fichier change
+    (stat au plus toutes les check_interval secondes, comme le registre de modèles).
+    Un fichier absent donne le seul DEFAULT_PROFILE ; un fichier invalide est
+    signalé et les profils précédents restent en place.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        # (nom par défaut, {nom: profil}) remplacé d'un bloc : jamais lu à moitié rechargé
+        self._state = (DEFAULT_PROFILE.name, {DEFAULT_PROFILE.name: DEFAULT_PROFILE})
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._reload_if_changed()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload_if_changed(self):
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+            if mtime is None:
+                self._state = (DEFAULT_PROFILE.name, {DEFAULT_PROFILE.name: DEFAULT_PROFILE})
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._state = parse_profiles(json.load(f))
+                log.info(f"Profils de score chargés : {sorted(self._state[1])} (défaut : {self._state[0]})")
+            except (OSError, ValueError, AttributeError) as e:
+                log.warning(f"Profils de score ignorés ({self.path}) : {e}")
+
+    def _current(self):
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self._reload_if_changed()
+        return self._state
+
+    def names(self):
+        """(profil par défaut, noms des profils disponibles)"""
+        default, profiles = self._current()
+        return default, sorted(profiles)
+
+    def get(self, name=None):
+        """Profil 'name' (profil par défaut si None) ; ValueError si inconnu"""
+        default, profiles = self._current()
+        profile = profiles.get(name or default)
+        if profile is None:
+            raise ValueError(f"Profil inconnu : '{name}' (disponibles : {sorted(profiles)})")
+        return profile
@@ -0,0 +1,243 @@
+"""
+Mont-Vert ML Service - Score hybride en NumPy
+Habitude (XGBoost) x 0.4 + Disponibilité x 0.3 + Urgence x 0.3, sans pandas.
+Les poids et seuils de confiance viennent d'un profil (score_profiles.py) ;
+sans profil, les valeurs historiques ci-dessus s'appliquent.
+"""
+
+import numpy as np
+
+from score_profiles import DEFAULT_PROFILE
+
+# Nombre de recettes renvoyées par défaut, et plafond accepté via num_predictions
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 100
+
+DAYS = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
+
+
+class RecipeIndex:
+    """
+    Correspondance recipe_id <-> index de classe du modèle.
+    Calculée une seule fois au chargement du modèle : la "jointure" avec
+    l'inventaire devient une simple lecture dans un tableau.
+    """
+
+    def __init__(self, recipe_ids):
+        self.recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        size = int(self.recipe_ids.max()) + 1 if len(self.recipe_ids) else 0
+        # lookup[recipe_id] = index de classe, -1 si la recette est inconnue du modèle
+        self.lookup = np.full(size, -1, dtype=np.int64)
+        self.lookup[self.recipe_ids] = np.arange(len(self.recipe_ids))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Index déjà calculé (dict recipe_ids / lookup, ex. tableaux mmap de shared_arrays)"""
+        index = cls.__new__(cls)
+        index.recipe_ids = arrays['recipe_ids']
+        index.lookup = arrays['lookup']
+        return index
+
+    def arrays(self):
+        return {'recipe_ids': self.recipe_ids, 'lookup': self.lookup}
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def positions(self, recipe_ids):
+        """Index de classe de chaque recipe_id (-1 si inconnu)"""
+        ids = np.asarray(recipe_ids, dtype=np.int64)
+        in_range = (ids >= 0) & (ids < len(self.lookup))
+        return np.where(in_range, self.lookup[np.where(in_range, ids, 0)], -1)
+
+
+def inventory_arrays(index, inventory_list):
+    """
+    Transforme la liste 'inventory' en vecteurs alignés sur les classes :
+    disponibilité, urgence et faisabilité.
+    Les recettes absentes du frigo gardent 0.0 (équivalent du merge + fillna).
+    En cas de doublon de recipe_id, la dernière entrée l'emporte.
+    """
+    n = len(index)
+    availability = np.zeros(n, dtype=np.float64)
+    urgency = np.zeros(n, dtype=np.float64)
+    feasible = np.zeros(n, dtype=bool)
+    if not inventory_list:
+        return availability, urgency, feasible
+
+    items = [item for item in inventory_list if item.get('recipe_id') is not None]
+    if not items:
+        return availability, urgency, feasible
+
+    pos = index.positions([int(item['recipe_id']) for item in items])
+    known = pos >= 0
+    avail_values = np.array([_as_float(item.get('availability_score')) for item in items])
+    urgency_values = np.array([_as_float(item.get('urgency_score')) for item in items])
+    # recipe_feasible envoyé par Node si disponible, sinon "tous les ingrédients en stock"
+    feasible_values = np.array([
+        bool(item['recipe_feasible']) if item.get('recipe_feasible') is not None else avail >= 1.0
+        for item, avail in zip(items, avail_values)
+    ], dtype=bool)
+
+    availability[pos[known]] = avail_values[known]
+    urgency[pos[known]] = urgency_values[known]
+    feasible[pos[known]] = feasible_values[known]
+    return availability, urgency, feasible
+
+
+def _as_float(value):
+    return 0.0 if value is None else float(value)
+
+
+def blend_scores(probas, availability, urgency, weights=DEFAULT_PROFILE.weights):
+    """Score final : vecteur de poids (3,) x composantes empilées (3 x n), un seul produit matriciel"""
+    return weights @ np.stack((probas, availability, urgency))
+
+
+def top_k(scores, k, mask=None):
+    """
+    Indices des k meilleurs scores parmi les classes retenues par 'mask',
+    triés par score décroissant.
+    argpartition (O(n)) puis tri des k seuls candidats ; à score égal,
+    l'ordre des classes est conservé.
+    """
+    eligible = np.arange(len(scores)) if mask is None else np.flatnonzero(mask)
+    k = max(0, min(int(k), len(eligible)))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(eligible):
+        candidates = eligible[np.argpartition(-scores[eligible], k - 1)[:k]]
+    else:
+        candidates = eligible
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def parse_options(data, defaults=None):
+    """
+    Options de sélection d'une requête /predict :
+      - num_predictions  : taille du top-k (1..MAX_TOP_K)
+      - min_availability : disponibilité minimale (0..1)
+      - require_feasible : ne garder que les recettes faisables
+      - profile          : nom du profil de pondération (None = profil par défaut)
+    'defaults' permet à /predict-batch de fournir des options communes.
+    Lève ValueError si une valeur est invalide.
+    """
+    defaults = defaults or {}
+    k = data.get('num_predictions', defaults.get('num_predictions', DEFAULT_TOP_K))
+    min_availability = data.get('min_availability', defaults.get('min_availability'))
+    require_feasible = data.get('require_feasible', defaults.get('require_feasible', False))
+    profile = data.get('profile', defaults.get('profile'))
+
+    try:
+        k = int(k)
+        min_availability = None if min_availability is None else float(min_availability)
+    except (TypeError, ValueError):
+        raise ValueError('num_predictions et min_availability doivent être numériques')
+    if not 1 <= k <= MAX_TOP_K:
+        raise ValueError(f'num_predictions doit être entre 1 et {MAX_TOP_K}')
+    if min_availability is not None and not 0.0 <= min_availability <= 1.0:
+        raise ValueError('min_availability doit être entre 0 et 1')
+    if profile is not None and not isinstance(profile, str):
+        raise ValueError('profile doit être un nom de profil')
+
+    return {
+        'num_predictions': k,
+        'min_availability': min_availability,
+        'require_feasible': bool(require_feasible),
+        'profile': profile
+    }
+
+
+def eligibility_mask(availability, feasible, options):
+    """Masque des classes qui passent les filtres (None si aucun filtre)"""
+    mask = None
+    if options.get('min_availability') is not None:
+        mask = availability >= options['min_availability']
+    if options.get('require_feasible'):
+        mask = feasible if mask is None else (mask & feasible)
+    return mask
+
+
+def format_predictions(indices, index, probas, availability, urgency, scores, context, profile=DEFAULT_PROFILE,
+                       stock=None):
+    """Construction de la réponse pour le Frontend (raisons, confidence...)"""
+    predictions = []
+    day_name = DAYS[context.get('day_of_week', 0)]
+
+    for i in indices:
+        # Extraction des valeurs propres
+        s_final = float(scores[i])
+        s_envie = float(probas[i])
+        s_avail = float(availability[i])
+        s_urgent = float(urgency[i])
+
+        # Génération des raisons (reasons) comme dans l'ancienne version
+        reasons = []
+
+        # Raison : Habitude (Le modèle XGBoost)
+        if s_envie > 0.15: # Seuil arbitraire
+            reasons.append(f"Souvent mangé le {day_name}")
+        elif s_envie > 0.05:
+            reasons.append(f"Adapté pour un {day_name}")
+
+        # Raison : Disponibilité
+        if s_avail >= 1.0:
+            reasons.append("100% des ingrédients disponibles")
+        elif s_avail >= 0.7:
+            reasons.append("Majorité des ingrédients en stock")
+
+        # Raison : Urgence
+        if s_urgent >= 0.8:
+            reasons.append("⚠️ Ingrédients à utiliser rapidement !")
+
+        # Définition de la "confidence" basée sur le score final
+        confidence = 'low'
+        if s_final > profile.confidence_high: confidence = 'high'
+        elif s_final > profile.confidence_medium: confidence = 'medium'
+
+        predictions.append({
+            'recipe_id': int(index.recipe_ids[i]),
+            # --- COMPATIBILITÉ ---
+            'probability': round(s_final, 4), # On remet 'probability' pour que le frontend s'y retrouve
+            # ---------------------
+            'score_final': round(s_final, 4),
+            'confidence': confidence,
+            'details': {
+                'habit_score': round(s_envie, 3),
+                'availability': round(s_avail, 2),
+                'urgency': round(s_urgent, 2)
+            },
+            'reasons': reasons
+        })
+        if stock is not None:
+            # Features de stock calculées par Python : mêmes noms que côté Node
+            predictions[-1].update({
+                'recipe_feasible': int(stock['recipe_feasible'][i]),
+                'availability_score': float(stock['availability_score'][i]),
+                'urgency_score': float(stock['urgency_score'][i]),
+                'min_days_to_expiry': int(stock['min_days_to_expiry'][i]),
+                'nb_missing_ingredients': int(stock['nb_missing_ingredients'][i])
+            })
+
+    return predictions
+
+
+def build_predictions(probas, index, context, inventory_list, options=None, profile=DEFAULT_PROFILE, stock=None):
+    """
+    Combine les probabilités d'habitude d'UN contexte avec le frigo, pondérés
+    par 'profile', et retourne (top k au format attendu par le Frontend, nb de
+    recettes éligibles). Les filtres et la sélection portent sur TOUTES les classes du modèle.
+    'stock' (features alignées sur les classes, voir stock_features.py) remplace
+    inventory_list et ajoute ses features à chaque prédiction.
+    """
+    options = options or {}
+    if stock is not None:
+        availability, urgency, feasible = stock['availability_score'], stock['urgency_score'], stock['recipe_feasible']
+    else:
+        availability, urgency, feasible = inventory_arrays(index, inventory_list)
+    scores = blend_scores(probas, availability, urgency, profile.weights)
+    mask = eligibility_mask(availability, feasible, options)
+    indices = top_k(scores, options.get('num_predictions', DEFAULT_TOP_K), mask)
+    num_eligible = len(index) if mask is None else int(np.count_nonzero(mask))
+    predictions = format_predictions(indices, index, probas, availability, urgency, scores, context, profile, stock)
+    return predictions, num_eligible
@@ -0,0 +1,153 @@
+"""
+Débit et latence de /predict : workers gunicorn sync (app:app) face à
+l'entrée ASGI (asgi:app, UvicornWorker, pool d'inférence + micro-batching).
+Chaque mode est lancé avec gunicorn.conf.py et le même nombre de workers sur
+une copie de --model-dir. Des clients (threads, une connexion par requête)
+envoient des contextes tirés au hasard, hors table précalculée et cache pour
+la plupart : chaque requête passe par le moteur d'inférence. Pour chaque
+niveau de concurrence : requêtes/s, p50 et p99. Les réponses des deux modes
+aux mêmes contextes sont comparées avant la mesure.
+
+Usage :
+    python scripts/bench_asgi.py [--model-dir model] [--workers 2] [--concurrency 1 8 32 64]
+                                 [--requests 2000] [--mode sync asgi] [--backend xgboost] [--port 5099]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from bench_startup import BASE_DIR, request, wait_until
+
+COMMANDS = {
+    'sync': ['app:app'],
+    'asgi': ['-k', 'uvicorn.workers.UvicornWorker', 'asgi:app'],
+}
+
+
+def random_contexts(classes, count, seed=0):
+    """Contextes valides tirés au hasard (recettes précédentes parmi les classes du modèle)"""
+    rng = np.random.default_rng(seed)
+    return [{
+        'day_of_week': int(rng.integers(0, 7)),
+        'month': int(rng.integers(1, 13)),
+        'week_of_year': int(rng.integers(0, 54)),
+        'planned_portions': int(rng.integers(1, 500)),
+        'last_recipe_1': int(rng.choice(classes)),
+        'last_recipe_2': int(rng.choice(classes)),
+    } for _ in range(count)]
+
+
+def load(base, contexts, concurrency):
+    """(durée totale, latences en s, erreurs) : 'concurrency' clients se partagent les contextes"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    position = iter(range(len(contexts)))
+
+    def client():
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            code, _ = request(f'{base}/predict', {'context': contexts[i]})
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if code == 200 else errors).append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, errors
+
+
+def serve(mode, port, env, model_dir):
+    """Lance gunicorn dans le mode demandé ; (process, dossier temporaire)"""
+    tmp = tempfile.mkdtemp()
+    env = dict(env, MODEL_DIR=os.path.join(tmp, 'model'), PROMETHEUS_MULTIPROC_DIR=os.path.join(tmp, 'metrics'))
+    shutil.copytree(model_dir, env['MODEL_DIR'])
+    cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'] + COMMANDS[mode]
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return proc, tmp
+
+
+def stop(proc, tmp):
+    proc.send_signal(signal.SIGTERM)
+    proc.wait(timeout=60)
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', default=os.path.join(BASE_DIR, 'model'))
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+    parser.add_argument('--requests', type=int, default=2000, help='/predict par niveau de concurrence')
+    parser.add_argument('--mode', nargs='+', default=['sync', 'asgi'], choices=list(COMMANDS))
+    parser.add_argument('--backend', default='xgboost', choices=['xgboost', 'compiled'])
+    parser.add_argument('--check', type=int, default=50, help='Contextes dont les réponses sont comparées')
+    args = parser.parse_args()
+
+    env = dict(os.environ, WEB_CONCURRENCY=str(args.workers), INFERENCE_BACKEND=args.backend, LOG_LEVEL='WARNING')
+    base = f'http://127.0.0.1:{args.port}'
+    model_dir = os.path.abspath(args.model_dir)
+
+    contexts = None
+    answers = {}
+    rows = []
+    for mode in args.mode:
+        proc, tmp = serve(mode, args.port, env, model_dir)
+        try:
+            wait_until(f'{base}/health', lambda code: code == 200)
+            if contexts is None:
+                _, body = request(f'{base}/model-info')
+                classes = json.loads(body)['classes']
+                contexts = random_contexts(classes, args.requests * len(args.concurrency) + args.check)
+
+            # Mêmes contextes, mêmes réponses (modèle, version et scoring identiques)
+            answers[mode] = [json.loads(request(f'{base}/predict', {'context': context})[1])['predictions']
+                             for context in contexts[:args.check]]
+
+            offset = args.check
+            for concurrency in args.concurrency:
+                # Contextes jamais envoyés à ce serveur : pas de cache chaud d'un niveau à l'autre
+                batch = contexts[offset:offset + args.requests]
+                offset += args.requests
+                elapsed, latencies, errors = load(base, batch, concurrency)
+                rows.append((mode, concurrency, len(latencies) / elapsed, statistics.median(latencies) * 1000,
+                             percentile(latencies, 99) * 1000, len(errors)))
+        finally:
+            stop(proc, tmp)
+
+    if len(answers) == 2:
+        first, second = answers.values()
+        print(f"Réponses identiques sur {args.check} contextes : {first == second}")
+
+    print(f"\nmoteur {args.backend}, {args.workers} workers, {args.requests} requêtes par niveau")
+    print(f"{'mode':>5} | {'clients':>7} | {'req/s':>7} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | {'erreurs':>7}")
+    print('-' * 58)
+    for mode, concurrency, throughput, p50, p99, errors in rows:
+        print(f"{mode:>5} | {concurrency:>7} | {throughput:>7.0f} | {p50:>8.1f} | {p99:>8.1f} | {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
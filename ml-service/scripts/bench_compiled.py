@@ -0,0 +1,89 @@
+"""
+Parité et micro-benchmark du prédicteur compilé (tree_compiler.py) face à
+XGBClassifier.predict_proba.
+
+Entraîne un modèle avec les mêmes paramètres que /train sur un CSV au format
+de server/src/script/training_data.csv, compile les arbres, vérifie la parité
+sur toutes les lignes puis mesure la latence en ligne unique et par lots.
+
+Usage :
+    python scripts/bench_compiled.py [--csv chemin.csv] [--repeat 200]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from feature_schema import HABIT_FEATURES  # noqa: E402
+from tree_compiler import CompiledForest, PARITY_TOLERANCE  # noqa: E402
+
+DEFAULT_CSV = os.path.join(BASE_DIR, '..', 'server', 'src', 'script', 'training_data.csv')
+
+
+def train_reference_model(csv_path):
+    """Même préparation et mêmes hyperparamètres que la route /train"""
+    df = pd.read_csv(csv_path)
+    counts = df['recipe_id'].value_counts()
+    df = df[df['recipe_id'].isin(counts[counts > 1].index)]
+    X = df[HABIT_FEATURES].fillna(0)
+    y = LabelEncoder().fit_transform(df['recipe_id'])
+    clf = xgb.XGBClassifier(
+        n_estimators=100,
+        max_depth=5,
+        learning_rate=0.05,
+        random_state=42,
+        objective='multi:softprob',
+        eval_metric='mlogloss'
+    )
+    clf.fit(X, y)
+    return clf, X
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 7, 100, 500])
+    args = parser.parse_args()
+
+    clf, X_train = train_reference_model(args.csv)
+    forest = CompiledForest.from_booster(clf.get_booster())
+    print(f"Modèle : {forest.num_trees} arbres, {forest.num_class} classes, profondeur {forest.depth}")
+
+    # 1. Parité sur toutes les lignes d'entraînement + des contextes aléatoires
+    rng = np.random.default_rng(0)
+    X_random = np.column_stack([
+        rng.integers(0, 7, 2000), rng.integers(1, 13, 2000), rng.integers(1, 54, 2000),
+        rng.integers(1, 200, 2000), rng.integers(0, 60, 2000), rng.integers(0, 60, 2000)
+    ]).astype(np.float32)
+    X_all = np.vstack([X_train.to_numpy(dtype=np.float32), X_random])
+    reference = clf.predict_proba(pd.DataFrame(X_all, columns=HABIT_FEATURES))
+    diff = forest.max_abs_diff(X_all, reference)
+    print(f"Parité sur {len(X_all)} lignes : écart max {diff:.2e} (tolérance {PARITY_TOLERANCE:.0e})")
+    if diff > PARITY_TOLERANCE:
+        sys.exit(1)
+
+    # 2. Latence : predict_proba (DataFrame) vs prédicteur compilé (ndarray float32)
+    print(f"\n{'lot':>6} | {'xgboost (µs)':>13} | {'compilé (µs)':>13} | {'gain':>6}")
+    print('-' * 48)
+    for size in args.batches:
+        X = X_all[:size]
+        df = pd.DataFrame(X, columns=HABIT_FEATURES)
+        xgb_s = timeit.timeit(lambda: clf.predict_proba(df), number=args.repeat)
+        compiled_s = timeit.timeit(lambda: forest.predict_proba(X), number=args.repeat)
+        xgb_us = xgb_s / args.repeat * 1e6
+        compiled_us = compiled_s / args.repeat * 1e6
+        print(f"{size:>6} | {xgb_us:>13.1f} | {compiled_us:>13.1f} | {xgb_us / compiled_us:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Mémoire de pointe pendant la lecture des données d'entraînement :
+corps JSON complet + pd.DataFrame (ancien /train) face au NDJSON / CSV lu en
+flux et converti en colonnes typées (training_data.py).
+
+L'historique est simulé en répétant les lignes de training_data.csv ; chaque
+corps est écrit sur disque puis relu comme le ferait request.stream.
+La mémoire est mesurée avec tracemalloc (NumPy et pandas y déclarent leurs tableaux).
+
+Usage :
+    python scripts/bench_ingest.py [--csv chemin.csv] [--rows 10000 100000 500000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from feature_schema import HABIT_FEATURES  # noqa: E402
+from training_data import read_csv, read_ndjson  # noqa: E402
+
+DEFAULT_CSV = os.path.join(BASE_DIR, '..', 'server', 'src', 'script', 'training_data.csv')
+
+
+def legacy_json(path):
+    """Ancien chemin : request.json puis pd.DataFrame(training_data)"""
+    with open(path, 'rb') as f:
+        data = json.loads(f.read())
+    df = pd.DataFrame(data['training_data'])
+    return df[HABIT_FEATURES].fillna(0)
+
+
+def streamed(reader):
+    def run(path):
+        with open(path, 'rb') as f:
+            return reader(f, HABIT_FEATURES)
+    return run
+
+
+def peak(fn, path):
+    """(pic mémoire en Mo, durée en s)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(path)
+    elapsed = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak_bytes / 1e6, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    args = parser.parse_args()
+
+    base = pd.read_csv(args.csv)
+    print(f"{'lignes':>8} | {'format':>8} | {'corps (Mo)':>10} | {'pic (Mo)':>9} | {'durée (s)':>9}")
+    print('-' * 58)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in args.rows:
+            df = pd.concat([base] * (n_rows // len(base) + 1), ignore_index=True).iloc[:n_rows]
+            records = json.loads(df.to_json(orient='records'))
+            paths = {
+                'json': os.path.join(tmp, 'body.json'),
+                'ndjson': os.path.join(tmp, 'body.ndjson'),
+                'csv': os.path.join(tmp, 'body.csv'),
+            }
+            with open(paths['json'], 'w', encoding='utf-8') as f:
+                json.dump({'training_data': records}, f)
+            with open(paths['ndjson'], 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+            df.to_csv(paths['csv'], index=False)
+            del records, df
+
+            for name, fn in (('json', legacy_json), ('ndjson', streamed(read_ndjson)), ('csv', streamed(read_csv))):
+                mem, elapsed = peak(fn, paths[name])
+                size = os.path.getsize(paths[name]) / 1e6
+                print(f"{n_rows:>8} | {name:>8} | {size:>10.1f} | {mem:>9.1f} | {elapsed:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Taille sur disque et temps de chargement : ancien pickle (XGBClassifier +
+LabelEncoder) face au booster natif UBJSON + sidecar JSON.
+
+Entraîne un modèle avec les mêmes paramètres que /train, l'écrit dans les deux
+formats (dossier temporaire), puis mesure :
+  - le chargement à chaud (imports déjà faits, médiane sur --repeat essais) ;
+  - le démarrage à froid : un processus Python neuf qui importe ce qu'il faut
+    et charge le modèle (c'est ce que paie un worker gunicorn au démarrage).
+
+Usage :
+    python scripts/bench_model_io.py [--csv chemin.csv] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import xgboost as xgb
+
+from bench_compiled import DEFAULT_CSV, HABIT_FEATURES, train_reference_model
+
+COLD_PICKLE = '''
+import pickle, sys, time
+t = time.perf_counter()
+with open(sys.argv[1], 'rb') as f:
+    saved = pickle.load(f)
+print(time.perf_counter() - t)
+'''
+
+COLD_NATIVE = '''
+import json, sys, time
+t = time.perf_counter()
+import xgboost as xgb
+with open(sys.argv[2], 'r', encoding='utf-8') as f:
+    meta = json.load(f)
+booster = xgb.Booster()
+with open(sys.argv[1], 'rb') as f:
+    booster.load_model(bytearray(f.read()))
+print(time.perf_counter() - t)
+'''
+
+
+def load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_native(ubj_path, meta_path):
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    booster = xgb.Booster()
+    with open(ubj_path, 'rb') as f:
+        booster.load_model(bytearray(f.read()))
+    return booster, meta
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def cold_ms(script, *paths, repeat=5):
+    """Médiane du temps mesuré DANS un processus neuf (imports compris pour le natif)"""
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', script, *paths], capture_output=True, text=True, check=True)
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    clf, X_train = train_reference_model(args.csv)
+    from sklearn.preprocessing import LabelEncoder
+    le = LabelEncoder().fit(np.arange(clf.n_classes_))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl_path = os.path.join(tmp, 'model.pkl')
+        ubj_path = os.path.join(tmp, 'model.ubj')
+        meta_path = os.path.join(tmp, 'model.meta.json')
+
+        with open(pkl_path, 'wb') as f:
+            pickle.dump({'model': clf, 'feature_names': HABIT_FEATURES, 'label_encoder': le}, f)
+        with open(ubj_path, 'wb') as f:
+            f.write(clf.get_booster().save_raw(raw_format='ubj'))
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'feature_names': HABIT_FEATURES, 'recipe_ids': [int(c) for c in le.classes_]}, f)
+
+        # Parité : le booster rechargé doit prédire exactement comme le wrapper
+        booster, _ = load_native(ubj_path, meta_path)
+        X = X_train.to_numpy(dtype=np.float32)
+        diff = float(np.max(np.abs(booster.inplace_predict(X, validate_features=False) - clf.predict_proba(X_train))))
+        print(f"Parité booster natif / predict_proba : écart max {diff:.2e}")
+
+        pkl_size = os.path.getsize(pkl_path)
+        native_size = os.path.getsize(ubj_path) + os.path.getsize(meta_path)
+        print(f"\n{'format':>16} | {'taille (Ko)':>11} | {'à chaud (ms)':>12} | {'à froid (ms)':>12}")
+        print('-' * 62)
+        print(f"{'pickle':>16} | {pkl_size / 1024:>11.1f} | "
+              f"{median_ms(lambda: load_pickle(pkl_path), args.repeat):>12.2f} | "
+              f"{cold_ms(COLD_PICKLE, pkl_path):>12.1f}")
+        print(f"{'ubj + sidecar':>16} | {native_size / 1024:>11.1f} | "
+              f"{median_ms(lambda: load_native(ubj_path, meta_path), args.repeat):>12.2f} | "
+              f"{cold_ms(COLD_NATIVE, ubj_path, meta_path):>12.1f}")
+        print("\nÀ froid : le pickle importe xgboost ET sklearn au dépicklage ; le natif n'importe que xgboost.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Table de prédictions précalculées (prediction_table.py) face au moteur XGBoost.
+Entraîne un modèle avec les mêmes paramètres que /train, construit la table des
+contextes d'entraînement dans un dossier temporaire (comme save_model), vérifie
+que chaque contexte de la table redonne exactement inplace_predict, puis mesure
+la latence d'une recherche (searchsorted + lecture mmap) et d'une prédiction,
+en ligne unique et par lots.
+
+Usage :
+    python scripts/bench_prediction_table.py [--csv chemin.csv] [--repeat 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+from bench_compiled import DEFAULT_CSV, train_reference_model
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prediction_table import PredictionTable, select_contexts, write_keys, write_probas  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 7, 100, 500])
+    args = parser.parse_args()
+
+    clf, X_train = train_reference_model(args.csv)
+    booster = clf.get_booster()
+    num_class = len(clf.classes_)
+
+    def predict(X):
+        return booster.inplace_predict(np.ascontiguousarray(X, dtype=np.float32), validate_features=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        keys_path, probas_path = os.path.join(tmp, 'table.arrays'), os.path.join(tmp, 'table.npy')
+        build = timeit.default_timer()
+        keys, vocab, contexts = select_contexts(X_train.to_numpy(dtype=np.float32), max_rows=10 ** 6)
+        with open(probas_path, 'wb') as f:
+            write_probas(f, contexts, predict, num_class)
+        with open(keys_path, 'wb') as f:
+            write_keys(f, keys, vocab)
+        table = PredictionTable.load(keys_path, probas_path)
+        build = timeit.default_timer() - build
+        print(f"Table : {len(table)} contextes x {num_class} classes, {table.info()['size_mb']} Mo, "
+              f"construite en {build:.2f}s")
+
+        # 1. Parité : chaque contexte d'entraînement est trouvé et redonne inplace_predict
+        X_all = X_train.to_numpy(dtype=np.float32)
+        found, positions = table.lookup(X_all)
+        if not found.all():
+            print(f"ÉCART : {int((~found).sum())} contextes d'entraînement absents de la table")
+            sys.exit(1)
+        diff = float(np.abs(table.rows(positions) - predict(X_all)).max())
+        print(f"Parité sur {len(X_all)} lignes : écart max {diff:.2e}")
+        if diff > 0:
+            sys.exit(1)
+
+        # 2. Latence : recherche dans la table vs inplace_predict
+        print(f"\n{'lot':>6} | {'xgboost (µs)':>13} | {'table (µs)':>11} | {'gain':>6}")
+        print('-' * 46)
+        rng = np.random.default_rng(0)
+        for size in args.batches:
+            X = X_all[rng.integers(0, len(X_all), size)]
+            xgb_us = timeit.timeit(lambda: predict(X), number=args.repeat) / args.repeat * 1e6
+            table_us = timeit.timeit(lambda: table.rows(table.lookup(X)[1]), number=args.repeat) / args.repeat * 1e6
+            print(f"{size:>6} | {xgb_us:>13.1f} | {table_us:>11.1f} | {xgb_us / table_us:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark du score hybride : ancienne version pandas vs version NumPy (scoring.py).
+
+Vérifie d'abord que les deux versions renvoient exactement les mêmes prédictions,
+puis mesure la latence par requête pour plusieurs nombres de recettes.
+
+Usage :
+    python scripts/bench_scoring.py [--classes 50 300 1000] [--repeat 2000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import RecipeIndex, build_predictions  # noqa: E402
+
+
+def legacy_build_predictions(probas, all_recipe_ids, context, inventory_list):
+    """Copie fidèle de l'ancienne version (merge pandas + sort_values + iterrows)"""
+    df_scores = pd.DataFrame({'recipe_id': all_recipe_ids, 'score_envie': probas})
+    df_scores['recipe_id'] = df_scores['recipe_id'].astype(int)
+
+    if not inventory_list:
+        df_inventory = pd.DataFrame(columns=['recipe_id', 'availability_score', 'urgency_score'])
+    else:
+        df_inventory = pd.DataFrame(inventory_list)
+        if 'recipe_id' in df_inventory.columns:
+            df_inventory['recipe_id'] = df_inventory['recipe_id'].astype(int)
+        if 'availability_score' not in df_inventory.columns: df_inventory['availability_score'] = 0.0
+        if 'urgency_score' not in df_inventory.columns: df_inventory['urgency_score'] = 0.0
+
+    df_final = pd.merge(df_scores, df_inventory, on='recipe_id', how='left')
+    df_final['availability_score'] = df_final['availability_score'].fillna(0.0)
+    df_final['urgency_score'] = df_final['urgency_score'].fillna(0.0)
+    df_final['score_envie'] = df_final['score_envie'].fillna(0.0)
+    df_final['score_final'] = (
+        (df_final['score_envie'] * 0.4) +
+        (df_final['availability_score'] * 0.3) +
+        (df_final['urgency_score'] * 0.3)
+    )
+    top_recipes = df_final.sort_values('score_final', ascending=False).head(5)
+
+    predictions = []
+    days = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
+    day_name = days[context.get('day_of_week', 0)]
+    for _, row in top_recipes.iterrows():
+        s_final = float(row['score_final'])
+        s_envie = float(row['score_envie'])
+        s_avail = float(row['availability_score'])
+        s_urgent = float(row['urgency_score'])
+        reasons = []
+        if s_envie > 0.15:
+            reasons.append(f"Souvent mangé le {day_name}")
+        elif s_envie > 0.05:
+            reasons.append(f"Adapté pour un {day_name}")
+        if s_avail >= 1.0:
+            reasons.append("100% des ingrédients disponibles")
+        elif s_avail >= 0.7:
+            reasons.append("Majorité des ingrédients en stock")
+        if s_urgent >= 0.8:
+            reasons.append("⚠️ Ingrédients à utiliser rapidement !")
+        confidence = 'low'
+        if s_final > 0.6: confidence = 'high'
+        elif s_final > 0.4: confidence = 'medium'
+        predictions.append({
+            'recipe_id': int(row['recipe_id']),
+            'probability': round(s_final, 4),
+            'score_final': round(s_final, 4),
+            'confidence': confidence,
+            'details': {
+                'habit_score': round(s_envie, 3),
+                'availability': round(s_avail, 2),
+                'urgency': round(s_urgent, 2)
+            },
+            'reasons': reasons
+        })
+    return predictions
+
+
+def make_case(rng, num_classes):
+    """Probabilités float32 (comme predict_proba) + un inventaire partiel"""
+    recipe_ids = np.sort(rng.choice(np.arange(1, num_classes * 4), size=num_classes, replace=False))
+    logits = rng.normal(size=num_classes)
+    probas = (np.exp(logits) / np.exp(logits).sum()).astype(np.float32)
+    in_stock = rng.choice(recipe_ids, size=max(1, num_classes // 3), replace=False)
+    inventory = [
+        {
+            'recipe_id': int(rid),
+            'availability_score': round(float(rng.uniform()), 2),
+            'urgency_score': round(float(rng.uniform()), 2)
+        }
+        for rid in in_stock
+    ]
+    context = {'day_of_week': int(rng.integers(0, 7))}
+    return recipe_ids, probas, context, inventory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, nargs='+', default=[50, 300, 1000])
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'classes':>8} | {'pandas (µs)':>12} | {'numpy (µs)':>11} | {'gain':>6}")
+    print('-' * 48)
+    for num_classes in args.classes:
+        recipe_ids, probas, context, inventory = make_case(rng, num_classes)
+        index = RecipeIndex(recipe_ids)
+
+        # Parité stricte avant de mesurer quoi que ce soit
+        for with_inventory in (inventory, []):
+            expected = legacy_build_predictions(probas, recipe_ids, context, with_inventory)
+            got, _ = build_predictions(probas, index, context, with_inventory)
+            if got != expected:
+                print(f"ÉCART pour {num_classes} classes :\n  pandas={expected}\n  numpy ={got}")
+                sys.exit(1)
+
+        legacy_s = timeit.timeit(
+            lambda: legacy_build_predictions(probas, recipe_ids, context, inventory), number=args.repeat)
+        numpy_s = timeit.timeit(
+            lambda: build_predictions(probas, index, context, inventory), number=args.repeat)
+
+        legacy_us = legacy_s / args.repeat * 1e6
+        numpy_us = numpy_s / args.repeat * 1e6
+        print(f"{num_classes:>8} | {legacy_us:>12.1f} | {numpy_us:>11.1f} | {legacy_us / numpy_us:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
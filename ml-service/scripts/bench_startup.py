@@ -0,0 +1,105 @@
+"""
+Temps jusqu'à la première prédiction après un (re)démarrage du service.
+
+Lance gunicorn deux fois sur le modèle publié dans --model-dir :
+  - avant : "gunicorn --workers N app:app" (modèle chargé au premier /predict) ;
+  - après : "gunicorn -c gunicorn.conf.py app:app" (préchargement dans le
+    master + prédiction à blanc par worker, /health à 200 une fois prêt).
+Mesure le temps entre le lancement et la première réponse 200 de /predict,
+ainsi que la latence de ce premier /predict. Les deux modes partagent le même
+code applicatif (pandas / sklearn déjà différés) : l'écart mesuré est celui du
+chargement et de la prédiction à blanc faits avant la première requête.
+
+Usage :
+    python scripts/bench_startup.py [--model-dir model] [--port 5099] [--runs 3]
+"""
+
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONTEXT = {'day_of_week': 2, 'month': 5, 'week_of_year': 20, 'planned_portions': 40,
+           'last_recipe_1': 15, 'last_recipe_2': 16}
+
+
+def request(url, payload=None):
+    """(code HTTP, corps) ; (None, None) si le port n'écoute pas encore"""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, ConnectionError):
+        return None, None
+
+
+def wait_until(url, accept, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        code, _ = request(url)
+        if code is not None and accept(code):
+            return
+        time.sleep(0.01)
+    raise TimeoutError(url)
+
+
+def measure(cmd, port, env, wait_health):
+    """(temps jusqu'à la 1re prédiction, latence du 1er /predict) en secondes"""
+    base = f'http://127.0.0.1:{port}'
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if wait_health:
+            wait_until(f'{base}/health', lambda code: code == 200)
+        else:
+            # Port ouvert (n'importe quelle réponse, même 404)
+            wait_until(f'{base}/__ping__', lambda code: True)
+        first = time.perf_counter()
+        code, body = request(f'{base}/predict', {'context': CONTEXT})
+        if code != 200:
+            raise RuntimeError(f'/predict -> {code} : {body[:200]!r}')
+        end = time.perf_counter()
+        return end - start, end - first
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', default=os.path.join(BASE_DIR, 'model'))
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    env = dict(os.environ, MODEL_DIR=os.path.abspath(args.model_dir), PORT=str(args.port),
+               WEB_CONCURRENCY=str(args.workers))
+    gunicorn = [sys.executable, '-m', 'gunicorn']
+    modes = [
+        ('avant (lazy)', gunicorn + ['--bind', f'127.0.0.1:{args.port}', '--workers', str(args.workers), 'app:app'], False),
+        ('après (preload)', gunicorn + ['-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{args.port}', 'app:app'], True),
+    ]
+
+    print(f"{'mode':>16} | {'1re prédiction (s)':>18} | {'latence 1er /predict (ms)':>25}")
+    print('-' * 66)
+    for name, cmd, wait_health in modes:
+        results = [measure(cmd, args.port, env, wait_health) for _ in range(args.runs)]
+        total = statistics.median(r[0] for r in results)
+        first = statistics.median(r[1] for r in results)
+        print(f"{name:>16} | {total:>18.2f} | {first * 1000:>25.1f}")
+
+
+if __name__ == '__main__':
+    main()
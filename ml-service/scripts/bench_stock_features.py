@@ -0,0 +1,120 @@
+"""
+Benchmark des features de stock : boucle par recette (portage Python de
+calculateRecipeStockFeatures, ml.service.js) vs matrice creuse CSR
+(stock_features.RecipeIngredients).
+
+Vérifie d'abord que les deux versions donnent exactement les mêmes features
+pour toutes les recettes, puis mesure le temps de calcul pour tout le catalogue.
+
+Usage :
+    python scripts/bench_stock_features.py [--recipes 1000] [--products 5000]
+                                           [--ingredients 8] [--portions 1 20 80] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stock_features import RecipeIngredients, StockSnapshot  # noqa: E402
+
+
+def legacy_stock_features(ingredients, stock_map, planned_portions):
+    """Copie fidèle de calculateRecipeStockFeatures (une recette, boucle sur ses ingrédients)"""
+    if not ingredients:
+        return {'recipe_feasible': 1, 'availability_score': 1.0, 'min_days_to_expiry': 999,
+                'nb_missing_ingredients': 0, 'urgency_score': 0}
+
+    nb_available = nb_missing = 0
+    min_days = 999
+    total_urgency = 0.0
+    for product_id, required_qty in ingredients:
+        stock = stock_map.get(product_id)
+        if stock is None or stock[0] < required_qty * planned_portions:
+            nb_missing += 1
+        else:
+            nb_available += 1
+            min_days = min(min_days, stock[1])
+            total_urgency += max(0.0, min(1.0, 1 - stock[1] / 30))
+
+    return {
+        'recipe_feasible': 1 if nb_missing == 0 else 0,
+        'availability_score': js_to_fixed2(nb_available / len(ingredients)),
+        'min_days_to_expiry': min_days,
+        'nb_missing_ingredients': nb_missing,
+        'urgency_score': js_to_fixed2(total_urgency / nb_available) if nb_available else 0
+    }
+
+
+def js_to_fixed2(x):
+    """Number(x.toFixed(2)) : arrondi de la valeur binaire exacte, égalités vers le haut"""
+    return float(Decimal(x).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+
+def make_data(n_recipes, n_products, n_ingredients, seed=0):
+    """Catalogue synthétique : ~n_ingredients lignes recipe_item par recette, stock partiel"""
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(1, 2 * n_ingredients, size=n_recipes)
+    recipe_ids = np.repeat(np.arange(1, n_recipes + 1) * 7, counts)
+    product_ids = rng.integers(1, n_products + 1, size=len(recipe_ids))
+    qty = np.round(rng.uniform(0.01, 0.5, size=len(recipe_ids)), 3)
+
+    # ~70% des produits en stock, péremption 0..60 jours ou inconnue (999)
+    in_stock = np.flatnonzero(rng.uniform(size=n_products) < 0.7) + 1
+    available = np.round(rng.uniform(0, 40, size=len(in_stock)), 2)
+    days = rng.integers(0, 60, size=len(in_stock)).astype(float)
+    days[rng.uniform(size=len(in_stock)) < 0.1] = 999
+    return recipe_ids, product_ids, qty, in_stock, available, days
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--ingredients', type=int, default=8, help="Nombre moyen d'ingrédients par recette")
+    parser.add_argument('--portions', type=int, nargs='+', default=[1, 20, 80])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    recipe_ids, product_ids, qty, stock_ids, available, days = make_data(
+        args.recipes, args.products, args.ingredients)
+    index = RecipeIngredients('bench', recipe_ids, product_ids, qty)
+    snapshot = StockSnapshot(stock_ids, available, days)
+
+    # Structures de la version JS : Map produit -> stock, liste d'ingrédients par recette
+    stock_map = {int(p): (float(a), float(d)) for p, a, d in zip(stock_ids, available, days)}
+    by_recipe = {}
+    for r, p, q in zip(recipe_ids.tolist(), product_ids.tolist(), qty.tolist()):
+        by_recipe.setdefault(r, []).append((p, q))
+
+    print(f"{len(index.recipe_ids)} recettes x {args.products} produits, {index.num_entries} lignes recipe_item, "
+          f"{len(snapshot)} produits en stock")
+
+    # Parité
+    for portions in args.portions:
+        expected = [legacy_stock_features(by_recipe[int(r)], stock_map, portions) for r in index.recipe_ids]
+        got = index.features(snapshot, portions)
+        for name in expected[0]:
+            legacy = np.array([e[name] for e in expected], dtype=np.float64)
+            mismatches = int((legacy != got[name].astype(np.float64)).sum())
+            if mismatches:
+                print(f"ÉCART portions={portions} {name} : {mismatches} recettes")
+                sys.exit(1)
+    print(f"Parité OK ({len(args.portions)} nombres de portions, 5 features)")
+
+    print(f"\n{'portions':>8} | {'boucle (ms)':>12} | {'CSR (ms)':>9} | {'gain':>6}")
+    for portions in args.portions:
+        loop = timeit.timeit(
+            lambda: [legacy_stock_features(by_recipe[int(r)], stock_map, portions) for r in index.recipe_ids],
+            number=args.repeat) / args.repeat * 1000
+        csr = timeit.timeit(lambda: index.features(snapshot, portions), number=args.repeat) / args.repeat * 1000
+        print(f"{portions:>8} | {loop:>12.2f} | {csr:>9.3f} | x{loop / csr:>5.0f}")
+
+
+if __name__ == '__main__':
+    main()
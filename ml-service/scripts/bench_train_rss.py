@@ -0,0 +1,115 @@
+"""
+Pic de RSS d'un entraînement complet, de la lecture du corps au booster :
+ancien /train (JSON -> pd.DataFrame -> fillna(0) -> LabelEncoder, colonnes
+int64/float64) face au chemin typé (NDJSON en flux -> colonnes uint8/uint16/uint32
+validées par feature_schema.py -> une matrice float32 contiguë).
+
+Chaque mesure tourne dans un processus neuf (ru_maxrss = pic de ce seul
+entraînement). L'historique est simulé en répétant training_data.csv.
+
+Usage :
+    python scripts/bench_train_rss.py [--csv chemin.csv] [--rows 100000 500000] [--rounds 10]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from feature_schema import HABIT_FEATURES  # noqa: E402
+
+DEFAULT_CSV = os.path.join(BASE_DIR, '..', 'server', 'src', 'script', 'training_data.csv')
+XGB_PARAMS = {'max_depth': 5, 'eta': 0.05, 'seed': 42, 'objective': 'multi:softprob',
+              'eval_metric': 'mlogloss', 'tree_method': 'hist'}
+
+
+def legacy(body_dir):
+    """Ancien chemin : (X, y) à partir du corps JSON complet"""
+    from sklearn.preprocessing import LabelEncoder
+
+    with open(os.path.join(body_dir, 'body.json'), 'rb') as f:
+        data = json.loads(f.read())
+    df = pd.DataFrame(data['training_data'])
+    counts = df['recipe_id'].value_counts()
+    df = df[df['recipe_id'].isin(counts[counts > 1].index)]
+    X = df[HABIT_FEATURES].fillna(0)
+    y = LabelEncoder().fit_transform(df['recipe_id'])
+    return X, y
+
+
+def typed(body_dir):
+    """Chemin actuel : colonnes compactes, X float32 construite une fois"""
+    from training_data import read_ndjson
+
+    with open(os.path.join(body_dir, 'body.ndjson'), 'rb') as f:
+        training_set = read_ndjson(f, HABIT_FEATURES).keep_recurring()
+    _, y = np.unique(training_set.recipe_ids, return_inverse=True)
+    return training_set.X, y.astype(np.int32)
+
+
+def run_one(path_name, body_dir, rounds):
+    """Lecture + un entraînement (appelé dans un processus neuf)"""
+    import xgboost as xgb
+
+    start = time.perf_counter()
+    X, y = {'legacy': legacy, 'typed': typed}[path_name](body_dir)
+    rss_data = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    dtrain = xgb.DMatrix(X, label=y, feature_names=HABIT_FEATURES)
+    xgb.train({**XGB_PARAMS, 'num_class': int(y.max()) + 1}, dtrain, num_boost_round=rounds)
+    elapsed = time.perf_counter() - start
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Ko sous Linux
+    print(json.dumps({'seconds': elapsed, 'rss_data_mb': rss_data / 1024, 'rss_peak_mb': rss_peak / 1024}))
+
+
+def write_bodies(base, n_rows, body_dir):
+    df = pd.concat([base] * (n_rows // len(base) + 1), ignore_index=True).iloc[:n_rows]
+    records = json.loads(df.to_json(orient='records'))
+    with open(os.path.join(body_dir, 'body.json'), 'w', encoding='utf-8') as f:
+        json.dump({'training_data': records}, f)
+    with open(os.path.join(body_dir, 'body.ndjson'), 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--one', nargs=2, metavar=('PATH', 'BODY_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        run_one(args.one[0], args.one[1], args.rounds)
+        return
+
+    base = pd.read_csv(args.csv)
+    print(f"{'lignes':>8} | {'chemin':>7} | {'durée (s)':>9} | {'RSS données (Mo)':>16} | {'RSS pic (Mo)':>12}")
+    print('-' * 66)
+    with tempfile.TemporaryDirectory() as body_dir:
+        for n_rows in args.rows:
+            write_bodies(base, n_rows, body_dir)
+            for path_name in ('legacy', 'typed'):
+                cmd = [sys.executable, os.path.abspath(__file__), '--one', path_name, body_dir,
+                       '--rounds', str(args.rounds)]
+                out = subprocess.run(cmd, capture_output=True, text=True)
+                if out.returncode != 0:
+                    print(f"{n_rows:>8} | {path_name:>7} | échec : {out.stderr.strip().splitlines()[-1]}")
+                    continue
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f"{n_rows:>8} | {path_name:>7} | {result['seconds']:>9.2f} | "
+                      f"{result['rss_data_mb']:>16.1f} | {result['rss_peak_mb']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
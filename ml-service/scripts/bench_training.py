@@ -0,0 +1,100 @@
+"""
+Durée d'entraînement et mémoire de pointe selon les réglages moteur
+(tree_method / data, voir training_config.py) sur des historiques synthétiques.
+
+Chaque combinaison tourne dans un processus neuf : ru_maxrss (pic de RSS) n'y
+mesure que cet entraînement. Les données imitent training_data.csv : jour,
+mois, semaine, portions et deux recettes précédentes, la recette cible
+dépendant du jour et de la dernière recette.
+
+Usage :
+    python scripts/bench_training.py [--rows 10000 100000 1000000] [--rounds 20]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from feature_schema import HABIT_FEATURES  # noqa: E402
+from training_config import XGB_PARAMS  # noqa: E402
+
+CONFIGS = [
+    ('exact', 'memory'),
+    ('hist', 'memory'),
+    ('hist', 'quantile'),
+    ('hist', 'external'),
+]
+
+
+def synthetic_history(n_rows, n_recipes=40, seed=0):
+    """(X float32 n x 6, y int) au format des HABIT_FEATURES"""
+    rng = np.random.default_rng(seed)
+    day = rng.integers(0, 7, n_rows)
+    week = rng.integers(1, 54, n_rows)
+    month = np.minimum((week - 1) // 4.42 + 1, 12).astype(int)
+    portions = rng.integers(5, 200, n_rows)
+    last_1 = rng.integers(0, n_recipes, n_rows)
+    last_2 = rng.integers(0, n_recipes, n_rows)
+    # Habitudes : la recette dépend du jour et de la précédente, plus du bruit
+    y = (day * 5 + last_1 * 3 + rng.integers(0, 4, n_rows)) % n_recipes
+    X = np.column_stack([day, month, week, portions, last_1, last_2]).astype(np.float32)
+    return X, y
+
+
+def run_one(n_rows, tree_method, data, rounds, nthread):
+    """Un entraînement (appelé dans un processus neuf) : durée et pic de RSS"""
+    from training_config import booster_params, parse_training_config, train_booster
+
+    X, y = synthetic_history(n_rows)
+    config = parse_training_config({'tree_method': tree_method, 'data': data, 'nthread': nthread})
+    params = booster_params(config, XGB_PARAMS, num_class=int(y.max()) + 1)
+    rss_data = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        train_booster(params, X, y, HABIT_FEATURES, config, cache_dir, num_boost_round=rounds)
+        elapsed = time.perf_counter() - start
+
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Ko sous Linux
+    print(json.dumps({'seconds': elapsed, 'rss_peak_mb': rss_peak / 1024, 'rss_data_mb': rss_data / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--nthread', type=int, default=0)
+    parser.add_argument('--one', nargs=3, metavar=('ROWS', 'TREE_METHOD', 'DATA'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        run_one(int(args.one[0]), args.one[1], args.one[2], args.rounds, args.nthread)
+        return
+
+    print(f"{'lignes':>9} | {'tree_method':>11} | {'data':>8} | {'durée (s)':>9} | {'RSS données (Mo)':>16} | {'RSS pic (Mo)':>12}")
+    print('-' * 80)
+    for n_rows in args.rows:
+        for tree_method, data in CONFIGS:
+            cmd = [sys.executable, os.path.abspath(__file__), '--one', str(n_rows), tree_method, data,
+                   '--rounds', str(args.rounds), '--nthread', str(args.nthread)]
+            out = subprocess.run(cmd, capture_output=True, text=True)
+            if out.returncode != 0:
+                print(f"{n_rows:>9} | {tree_method:>11} | {data:>8} | échec : {out.stderr.strip().splitlines()[-1]}")
+                continue
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{n_rows:>9} | {tree_method:>11} | {data:>8} | {result['seconds']:>9.2f} | "
+                  f"{result['rss_data_mb']:>16.1f} | {result['rss_peak_mb']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Mémoire par worker gunicorn selon le nombre de workers.
+Pour chaque nombre de workers, lance "gunicorn -c gunicorn.conf.py app:app" sur
+une copie de --model-dir, attend /health, envoie des /predict (tous les workers
+en reçoivent), puis lit /proc/<pid>/smaps_rollup du master et de chaque worker.
+Deuxième mesure après un /train (--csv) : un worker entraîne et publie une
+version, les autres la rechargent chacun de leur côté, hors préchargement du
+master. C'est là qu'un modèle non partagé se retrouve copié dans chaque worker.
+  - RSS : pages résidentes du processus, partagées comprises ;
+  - PSS : chaque page partagée est divisée par le nombre de processus qui la
+    lisent ; la somme des PSS est la mémoire réellement occupée ;
+  - USS : pages privées du processus (Private_Clean + Private_Dirty), ce que
+    coûte un worker de plus.
+Les valeurs par worker sont des médianes (le worker qui a entraîné est à part).
+Linux uniquement (smaps_rollup, noyau >= 4.14).
+
+Usage :
+    python scripts/bench_worker_rss.py [--model-dir model] [--csv chemin.csv] [--workers 2 4 8 16]
+                                       [--backend xgboost compiled] [--port 5099]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_compiled import DEFAULT_CSV
+from bench_startup import BASE_DIR, CONTEXT, request, wait_until
+
+FIELDS = ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty')
+
+
+def smaps_rollup(pid):
+    """Compteurs de /proc/<pid>/smaps_rollup en Mo"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in FIELDS:
+                values[name] = int(rest.split()[0]) / 1024
+    return {'rss': values['Rss'], 'pss': values['Pss'],
+            'uss': values['Private_Clean'] + values['Private_Dirty']}
+
+
+def children(pid):
+    """pids des processus fils de 'pid' (les workers du master gunicorn)"""
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # "pid (comm) state ppid ..." : comm peut contenir des espaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return found
+
+
+def predict_all(base, n_workers, count):
+    """'count' /predict concurrents ; versions de modèle ayant répondu"""
+    with ThreadPoolExecutor(max_workers=n_workers * 2) as pool:
+        responses = list(pool.map(lambda _: request(f'{base}/predict', {'context': CONTEXT}), range(count)))
+    if any(code != 200 for code, _ in responses):
+        raise RuntimeError(f'/predict en échec : {sorted({code for code, _ in responses})}')
+    return {json.loads(body)['model_version'] for _, body in responses}
+
+
+def retrain(base, csv_path, n_workers):
+    """/train sur un worker, puis /predict jusqu'à ce que tous servent la nouvelle version"""
+    with open(csv_path, 'rb') as f:
+        req = urllib.request.Request(f'{base}/train', data=f.read(), headers={'Content-Type': 'text/csv'})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        job_id = json.loads(resp.read())['job_id']
+    while True:
+        _, body = request(f'{base}/train/{job_id}')
+        job = json.loads(body)
+        if job['status'] == 'failed':
+            raise RuntimeError(f"/train en échec : {job.get('error')}")
+        if job['status'] == 'succeeded':
+            version = job['metrics']['model_version']
+            break
+        time.sleep(0.2)
+
+    deadline = time.perf_counter() + 120
+    while predict_all(base, n_workers, n_workers * 8) != {version}:
+        if time.perf_counter() > deadline:
+            raise TimeoutError('rechargement de la nouvelle version')
+        time.sleep(0.2)
+
+
+def snapshot(pid):
+    """(master, [workers]) : compteurs mémoire une fois les requêtes terminées"""
+    time.sleep(0.5)
+    return smaps_rollup(pid), [smaps_rollup(child) for child in children(pid)]
+
+
+def measure(port, env, model_dir, csv_path, n_workers, requests_per_worker):
+    """Mémoire au démarrage puis après un /train"""
+    base = f'http://127.0.0.1:{port}'
+    tmp = tempfile.mkdtemp()
+    env = dict(env, WEB_CONCURRENCY=str(n_workers), MODEL_DIR=os.path.join(tmp, 'model'),
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(tmp, 'metrics'))
+    shutil.copytree(model_dir, env['MODEL_DIR'])
+    cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'app:app']
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until(f'{base}/health', lambda code: code == 200)
+        deadline = time.perf_counter() + 120
+        while len(children(proc.pid)) < n_workers and time.perf_counter() < deadline:
+            time.sleep(0.1)
+
+        # Chaque worker sert des /predict (modèle, table, cache touchés)
+        predict_all(base, n_workers, n_workers * requests_per_worker)
+        startup = snapshot(proc.pid)
+        retrain(base, csv_path, n_workers)
+        predict_all(base, n_workers, n_workers * requests_per_worker)
+        return startup, snapshot(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def median(rows, key):
+    return statistics.median(row[key] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', default=os.path.join(BASE_DIR, 'model'))
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='Historique envoyé à /train pour la 2e mesure')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8, 16])
+    parser.add_argument('--backend', nargs='+', default=['xgboost', 'compiled'], choices=['xgboost', 'compiled'])
+    parser.add_argument('--requests', type=int, default=20, help='/predict par worker avant chaque mesure')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PORT=str(args.port), LOG_LEVEL='WARNING')
+    print(f"{'moteur':>9} | {'workers':>7} | {'mesure':>12} | {'RSS/worker':>10} | {'PSS/worker':>10} | "
+          f"{'USS/worker':>10} | {'somme RSS':>9} | {'somme PSS':>9}   (Mo)")
+    print('-' * 107)
+    for backend in args.backend:
+        for n_workers in args.workers:
+            phases = measure(args.port, dict(env, INFERENCE_BACKEND=backend), os.path.abspath(args.model_dir),
+                             os.path.abspath(args.csv), n_workers, args.requests)
+            for name, (master, workers) in zip(('démarrage', 'après /train'), phases):
+                everyone = [master] + workers
+                print(f"{backend:>9} | {len(workers):>7} | {name:>12} | {median(workers, 'rss'):>10.1f} | "
+                      f"{median(workers, 'pss'):>10.1f} | {median(workers, 'uss'):>10.1f} | "
+                      f"{sum(p['rss'] for p in everyone):>9.0f} | {sum(p['pss'] for p in everyone):>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
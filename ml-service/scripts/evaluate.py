@@ -0,0 +1,265 @@
+"""
+Évaluation hors ligne du recommandeur hybride : qualité et latence.
+
+Rejoue training_data.csv dans l'ordre chronologique : le modèle est entraîné
+sur les premiers jours (--train-fraction), puis chaque exemple des jours
+suivants est scoré avec le même code que /predict (feature_schema.py +
+scoring.build_predictions). Rapporte top-1, top-5 et MRR :
+  - habitude : classement des seules probabilités XGBoost ;
+  - hybride  : classement du score final. Le CSV ne donne disponibilité et
+               urgence que pour les recettes servies : le frigo d'un jour
+               reprend, pour chaque recette, ses derniers scores connus AVANT
+               ce jour (aucune fuite de la réponse du jour).
+Une recette inconnue du modèle (jamais vue deux fois avant la coupure) compte
+comme un échec.
+
+Mesure ensuite la latence (p50 / p95 / p99) du chemin complet d'une prédiction,
+ligne par ligne puis par lots (comme /predict-batch).
+
+Avec --baseline (rapport JSON d'une exécution précédente, écrit par --output),
+signale les régressions et sort en code 1 : baisse de qualité au-delà de
+--max-quality-drop, ou p95 plus lent de plus de --max-latency-increase.
+
+Usage :
+    python scripts/evaluate.py [--csv chemin.csv] [--output rapport.json] [--baseline rapport.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from feature_schema import HABIT_FEATURES, context_matrix  # noqa: E402
+from scoring import MAX_TOP_K, RecipeIndex, build_predictions  # noqa: E402
+from score_profiles import ProfileStore  # noqa: E402
+from training_config import fit_full, parse_training_config, tuned_hyperparams  # noqa: E402
+from training_data import from_records  # noqa: E402
+from tree_compiler import CompiledForest  # noqa: E402
+
+DEFAULT_CSV = os.path.join(BASE_DIR, '..', 'server', 'src', 'script', 'training_data.csv')
+DEFAULT_PROFILES = os.path.join(BASE_DIR, 'score_profiles.json')
+QUALITY_METRICS = ('top1', 'top5', 'mrr')
+
+
+def load_history(csv_path):
+    """Historique trié par date (tri stable : l'ordre du fichier départage un même jour)"""
+    df = pd.read_csv(csv_path)
+    df['date'] = pd.to_datetime(df['date']).dt.normalize()
+    df[HABIT_FEATURES] = df[HABIT_FEATURES].fillna(0)
+    return df.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def split_by_day(df, train_fraction):
+    """(apprentissage, test) : coupure sur une frontière de jour"""
+    days = df['date'].drop_duplicates().to_numpy()
+    if len(days) < 2:
+        sys.exit("Il faut au moins deux jours distincts dans l'historique")
+    cutoff = days[min(max(int(len(days) * train_fraction), 1), len(days) - 1)]
+    return df[df['date'] < cutoff], df[df['date'] >= cutoff]
+
+
+def train(train_df, hyperparams, nthread):
+    """
+    Booster + RecipeIndex, par le même code que /train : colonnes typées de
+    training_data, recettes vues au moins deux fois, training_config.fit_full.
+    """
+    records = train_df[['recipe_id', *HABIT_FEATURES]].to_dict('records')
+    training_set = from_records(records, HABIT_FEATURES).keep_recurring()
+    recipe_ids, y = np.unique(training_set.recipe_ids, return_inverse=True)
+    config = parse_training_config({'nthread': nthread})
+    with tempfile.TemporaryDirectory() as cache_dir:
+        booster = fit_full(training_set.X, y.astype(np.int32), HABIT_FEATURES, config, hyperparams, cache_dir)
+    return booster, RecipeIndex(recipe_ids)
+
+
+def make_predictor(booster, backend):
+    """Fonction X -> probabilités, comme ActiveModel.predict_proba"""
+    if backend == 'compiled':
+        forest = CompiledForest.from_booster(booster)
+        return forest.predict_proba
+    return lambda X: booster.inplace_predict(X, validate_features=False)
+
+
+def day_inventories(df, test_days):
+    """
+    Frigo de chaque jour de test : derniers scores connus de chaque recette
+    strictement avant ce jour (df = historique complet trié par date).
+    """
+    columns = [c for c in ('recipe_id', 'availability_score', 'urgency_score', 'recipe_feasible') if c in df]
+    latest, inventories = {}, {}
+    for day, group in df.groupby('date', sort=True):
+        if day in test_days:
+            inventories[day] = list(latest.values())
+        for record in group[columns].to_dict('records'):
+            latest[record['recipe_id']] = record
+    return inventories
+
+
+def rank_metrics(ranks):
+    """top-1, top-5 et MRR à partir des rangs (1 = premier, inf = absent)"""
+    ranks = np.asarray(ranks, dtype=np.float64)
+    return {
+        'top1': round(float(np.mean(ranks <= 1)), 4),
+        'top5': round(float(np.mean(ranks <= 5)), 4),
+        'mrr': round(float(np.mean(1.0 / ranks)), 4)
+    }
+
+
+def evaluate_quality(predict, index, test_df, inventories, profile):
+    """Rejoue les jours de test dans l'ordre ; retourne les métriques habitude et hybride"""
+    contexts = test_df[HABIT_FEATURES].astype(int).to_dict('records')
+    probas = predict(context_matrix(contexts, HABIT_FEATURES))
+    true_classes = index.positions(test_df['recipe_id'].to_numpy())
+
+    habit_ranks, hybrid_ranks = [], []
+    options = {'num_predictions': min(MAX_TOP_K, len(index))}
+    for row_probas, ctx, true_class, day, recipe_id in zip(probas, contexts, true_classes,
+                                                           test_df['date'], test_df['recipe_id']):
+        if true_class < 0:
+            habit_ranks.append(np.inf)
+            hybrid_ranks.append(np.inf)
+            continue
+        habit_ranks.append(1 + int(np.sum(row_probas > row_probas[true_class])))
+        predictions, _ = build_predictions(row_probas, index, ctx, inventories[day], options, profile)
+        served = [p['recipe_id'] for p in predictions]
+        hybrid_ranks.append(served.index(int(recipe_id)) + 1 if int(recipe_id) in served else np.inf)
+
+    return {
+        'habit': rank_metrics(habit_ranks),
+        'hybrid': rank_metrics(hybrid_ranks),
+        'coverage': round(float(np.mean(true_classes >= 0)), 4)
+    }
+
+
+def percentiles(samples_s):
+    samples_ms = np.asarray(samples_s) * 1000
+    return {f'p{q}': round(float(np.percentile(samples_ms, q)), 3) for q in (50, 95, 99)}
+
+
+def evaluate_latency(predict, index, test_df, inventories, samples, batch_sizes, warmup=20):
+    """Chemin complet d'une prédiction : matrice validée + modèle + score hybride (top 5)"""
+    contexts = test_df[HABIT_FEATURES].astype(int).to_dict('records')
+    days = test_df['date'].tolist()
+    n = len(contexts)
+
+    def serve(rows):
+        probas = predict(context_matrix([contexts[i] for i in rows], HABIT_FEATURES))
+        for i, row_probas in zip(rows, probas):
+            build_predictions(row_probas, index, contexts[i], inventories[days[i]], {'num_predictions': 5})
+
+    results = {}
+    for size in [1] + list(batch_sizes):
+        batches = [[(start + j) % n for j in range(size)] for start in range(0, samples * size, size)]
+        for rows in batches[:warmup]:
+            serve(rows)
+        timings = []
+        for rows in batches[:samples]:
+            start = time.perf_counter()
+            serve(rows)
+            timings.append(time.perf_counter() - start)
+        results['single' if size == 1 else f'batch_{size}'] = percentiles(timings)
+    return results
+
+
+def regressions(report, baseline, max_quality_drop, max_latency_increase):
+    """Liste des régressions (texte) face à un rapport de référence"""
+    flags = []
+    for kind in ('habit', 'hybrid'):
+        for metric in QUALITY_METRICS:
+            before = baseline['quality'][kind][metric]
+            after = report['quality'][kind][metric]
+            if after < before - max_quality_drop:
+                flags.append(f"qualité {kind}.{metric} : {before:.4f} -> {after:.4f}")
+    for name, values in report['latency_ms'].items():
+        before = baseline['latency_ms'].get(name, {}).get('p95')
+        if before and values['p95'] > before * (1 + max_latency_increase):
+            flags.append(f"latence {name}.p95 : {before:.3f} ms -> {values['p95']:.3f} ms")
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--train-fraction', type=float, default=0.8, help='part des jours servant à entraîner')
+    parser.add_argument('--params', help='best_params.json écrit par /tune (défaut : XGB_PARAMS de training_config)')
+    parser.add_argument('--backend', choices=('xgboost', 'compiled'), default='xgboost')
+    parser.add_argument('--profiles', default=DEFAULT_PROFILES, help='fichier de profils de score')
+    parser.add_argument('--profile', help='profil de pondération du score hybride (défaut : celui du fichier)')
+    parser.add_argument('--nthread', type=int, default=1, help='threads XGBoost (1 = mesures reproductibles)')
+    parser.add_argument('--latency-samples', type=int, default=500)
+    parser.add_argument('--batches', type=int, nargs='+', default=[7, 100])
+    parser.add_argument('--output', help='rapport JSON à écrire')
+    parser.add_argument('--baseline', help='rapport JSON de référence')
+    parser.add_argument('--max-quality-drop', type=float, default=0.01, help='baisse absolue tolérée')
+    parser.add_argument('--max-latency-increase', type=float, default=0.25, help='hausse relative du p95 tolérée')
+    args = parser.parse_args()
+
+    best = None
+    if args.params:
+        with open(args.params, 'r', encoding='utf-8') as f:
+            best = json.load(f)
+    hyperparams, _ = tuned_hyperparams(best)
+
+    profile = ProfileStore(args.profiles).get(args.profile)
+    df = load_history(args.csv)
+    train_df, test_df = split_by_day(df, args.train_fraction)
+    print(f"Historique : {len(df)} lignes ; entraînement {len(train_df)} "
+          f"(jusqu'au {train_df['date'].max().date()}), test {len(test_df)} "
+          f"({test_df['date'].nunique()} jours)")
+
+    start = time.perf_counter()
+    booster, index = train(train_df, hyperparams, args.nthread)
+    fit_seconds = time.perf_counter() - start
+    predict = make_predictor(booster, args.backend)
+    inventories = day_inventories(df, set(test_df['date']))
+
+    report = {
+        'config': {'csv': os.path.basename(args.csv), 'train_fraction': args.train_fraction,
+                   'backend': args.backend, 'nthread': args.nthread, 'params': hyperparams,
+                   'profile': profile.to_dict()},
+        'dataset': {'train_rows': len(train_df), 'test_rows': len(test_df), 'num_classes': len(index)},
+        'fit_seconds': round(fit_seconds, 3),
+        'quality': evaluate_quality(predict, index, test_df, inventories, profile),
+        'latency_ms': evaluate_latency(predict, index, test_df, inventories, args.latency_samples, args.batches)
+    }
+
+    quality = report['quality']
+    print(f"\n{'classement':>10} | {'top-1':>6} | {'top-5':>6} | {'MRR':>6}")
+    print('-' * 38)
+    for kind in ('habit', 'hybrid'):
+        q = quality[kind]
+        print(f"{kind:>10} | {q['top1']:>6.3f} | {q['top5']:>6.3f} | {q['mrr']:>6.3f}")
+    print(f"Couverture (recette du test connue du modèle) : {quality['coverage']:.1%}")
+
+    print(f"\n{'latence (ms)':>12} | {'p50':>8} | {'p95':>8} | {'p99':>8}")
+    print('-' * 46)
+    for name, values in report['latency_ms'].items():
+        print(f"{name:>12} | {values['p50']:>8.3f} | {values['p95']:>8.3f} | {values['p99']:>8.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nRapport écrit : {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        flags = regressions(report, baseline, args.max_quality_drop, args.max_latency_increase)
+        if flags:
+            print('\nRégressions :')
+            for flag in flags:
+                print(f"  - {flag}")
+            sys.exit(1)
+        print('\nAucune régression face à la référence')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Mont-Vert ML Service - Tableaux partagés entre workers (fichiers .arrays)
+Plusieurs tableaux NumPy écrits bout à bout dans un seul fichier, précédés
+d'un index JSON, chacun aligné sur 64 octets. load() les ouvre en np.memmap
+lecture seule : les pages viennent du cache disque du noyau et sont les mêmes
+pour tous les workers (zéro copie, aucune désérialisation). Un tableau vide
+est recréé en mémoire (mmap de 0 octet impossible).
+
+Format : MAGIC | longueur de l'en-tête (uint64) | index JSON | données
+"""
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'MVARRAYS'
+ALIGN = 64
+
+
+def _padded(size):
+    return -(-size // ALIGN) * ALIGN
+
+
+def save(file, arrays):
+    """Écrit le dict nom -> tableau dans 'file' (fichier binaire déjà ouvert)"""
+    arrays = {name: np.ascontiguousarray(values) for name, values in arrays.items()}
+    index = {}
+    offset = 0
+    for name, values in arrays.items():
+        index[name] = {'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': offset}
+        offset += _padded(values.nbytes)
+
+    header = json.dumps(index).encode('utf-8')
+    header_size = _padded(len(MAGIC) + 8 + len(header))
+    file.write(MAGIC + struct.pack('<Q', header_size) + header)
+    file.write(b'\0' * (header_size - len(MAGIC) - 8 - len(header)))
+    for values in arrays.values():
+        file.write(values.tobytes())
+        file.write(b'\0' * (_padded(values.nbytes) - values.nbytes))
+
+
+def load(path, mmap=True):
+    """dict nom -> tableau lecture seule (np.memmap si mmap, sinon copie en mémoire)"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} : pas un fichier de tableaux partagés")
+        header_size, = struct.unpack('<Q', f.read(8))
+        index = json.loads(f.read(header_size - len(MAGIC) - 8).rstrip(b'\0').decode('utf-8'))
+
+    arrays = {}
+    for name, spec in index.items():
+        dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+        if int(np.prod(shape)) == 0:
+            values = np.empty(shape, dtype=dtype)
+        else:
+            values = np.memmap(path, dtype=dtype, mode='r', offset=header_size + spec['offset'], shape=shape)
+            if not mmap:
+                values = np.array(values)
+        values.setflags(write=False)
+        arrays[name] = values
+    return arrays
@@ -0,0 +1,266 @@
+"""
+Mont-Vert ML Service - Features de stock calculées côté Python
+Équivalent vectorisé de calculateRecipeStockFeatures (server/src/services/ml.service.js) :
+à partir d'un instantané du stock (product_id, available_qty, days_to_expiry),
+calcule pour TOUTES les recettes disponibilité, urgence, faisabilité, plus
+proche péremption et nombre d'ingrédients manquants.
+
+Les besoins recette x produit forment une matrice creuse CSR (recettes x
+produits, une entrée par ligne de recipe_item) : disponibilité et urgence de
+toutes les recettes sont des produits matrice creuse x vecteur, sans boucle
+par recette. L'index est poussé par Node (PUT /recipe-index), écrit en .npz
+dans MODEL_DIR et relu par chaque worker quand le fichier change ; sa version
+(empreinte calculée par Node) l'invalide quand recipe_item change.
+"""
+
+import io
+import logging
+import os
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from scipy import sparse
+
+from model_registry import ModelRegistry
+
+log = logging.getLogger(__name__)
+
+# Valeur de Node pour une péremption inconnue (lot sans date / produit absent)
+NO_EXPIRY_DAYS = 999.0
+
+# Horizon (jours) de l'urgence : 1 - jours / 30, borné à [0, 1]
+URGENCY_HORIZON_DAYS = 30.0
+
+
+def round2(values):
+    """
+    Arrondi à 2 décimales comme Number(x.toFixed(2)) en JavaScript : toFixed
+    arrondit la valeur binaire EXACTE (0.175 vaut 0.17499... -> 0.17) et
+    les vraies égalités vers le haut (0.125 -> 0.13). x * 100 peut tomber du
+    mauvais côté de la demi-unité : ces rares cas sont tranchés en Decimal.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100
+    result = np.floor(scaled + 0.5) / 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        exact = Decimal(float(values.flat[i])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        result.flat[i] = float(exact)
+    return result
+
+
+def _columns(payload, names, label):
+    """
+    Colonnes d'un corps JSON, au format compact {"col": [...], ...}
+    ou en liste d'objets [{"col": v, ...}, ...].
+    """
+    if isinstance(payload, dict):
+        missing = [name for name in names if name not in payload]
+        if missing:
+            raise ValueError(f'{label} : colonnes manquantes {missing}')
+        columns = [list(payload[name]) for name in names]
+        if len({len(col) for col in columns}) > 1:
+            raise ValueError(f'{label} : colonnes de longueurs différentes')
+        return columns
+    if isinstance(payload, list):
+        try:
+            return [[item.get(name) for item in payload] for name in names]
+        except AttributeError:
+            raise ValueError(f'{label} : liste d\'objets attendue')
+    raise ValueError(f'{label} : objet de colonnes ou liste d\'objets attendu')
+
+
+class StockSnapshot:
+    """Instantané du stock : un produit par ligne (product_id, quantité, jours avant péremption)"""
+
+    def __init__(self, product_ids, available_qty, days_to_expiry):
+        # Trié par product_id une fois : chaque recherche est un searchsorted
+        order = np.argsort(np.asarray(product_ids, dtype=np.int64), kind='stable')
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)[order]
+        self.available_qty = np.asarray(available_qty, dtype=np.float64)[order]
+        self.days_to_expiry = np.asarray(days_to_expiry, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    @classmethod
+    def parse(cls, payload):
+        """Instantané depuis le corps d'une requête ; ValueError si invalide"""
+        product_ids, qty, days = _columns(payload, ('product_id', 'available_qty', 'days_to_expiry'), 'stock')
+        try:
+            return cls(
+                np.array(product_ids, dtype=np.int64),
+                np.array([0.0 if v is None else v for v in qty], dtype=np.float64),
+                np.array([NO_EXPIRY_DAYS if v is None else v for v in days], dtype=np.float64)
+            )
+        except (TypeError, ValueError):
+            raise ValueError('stock : valeurs numériques attendues')
+
+    def lookup(self, product_ids):
+        """(présent dans l'instantané, quantité, jours) pour chaque product_id demandé"""
+        if not len(self):
+            return (np.zeros(len(product_ids), dtype=bool), np.zeros(len(product_ids)),
+                    np.full(len(product_ids), NO_EXPIRY_DAYS))
+        pos = np.minimum(np.searchsorted(self.product_ids, product_ids), len(self) - 1)
+        known = self.product_ids[pos] == product_ids
+        qty = np.where(known, self.available_qty[pos], 0.0)
+        days = np.where(known, self.days_to_expiry[pos], NO_EXPIRY_DAYS)
+        return known, qty, days
+
+
+class RecipeIngredients:
+    """
+    Besoins recette x produit en CSR : ligne i = recette recipe_ids[i],
+    colonne j = produit product_ids[j], valeur = quantité par portion.
+    Deux lignes de recipe_item sur le même produit restent deux entrées
+    (comme deux ingrédients dans la boucle JS). 'version' identifie le
+    contenu (calculé par Node) pour éviter de repousser un index inchangé.
+    """
+
+    def __init__(self, version, recipe_ids, product_ids, qty_per_portion):
+        self.version = str(version)
+        self.recipe_ids, rows = np.unique(np.asarray(recipe_ids, dtype=np.int64), return_inverse=True)
+        self.product_ids, cols = np.unique(np.asarray(product_ids, dtype=np.int64), return_inverse=True)
+        # CSR construit directement (pas via COO -> tocsr, qui additionnerait les doublons)
+        order = np.argsort(rows, kind='stable')
+        self.num_ingredients = np.bincount(rows, minlength=len(self.recipe_ids))
+        indptr = np.concatenate(([0], np.cumsum(self.num_ingredients)))
+        self.requirements = sparse.csr_matrix(
+            (np.asarray(qty_per_portion, dtype=np.float64)[order], cols[order].astype(np.int32), indptr),
+            shape=(len(self.recipe_ids), len(self.product_ids))
+        )
+
+    @property
+    def num_entries(self):
+        return self.requirements.nnz
+
+    @classmethod
+    def parse(cls, payload):
+        """Index depuis le corps de PUT /recipe-index ; ValueError si invalide"""
+        if not isinstance(payload, dict) or not payload.get('version'):
+            raise ValueError('version requise')
+        items = payload.get('items', payload)
+        recipe_ids, product_ids, qty = _columns(items, ('recipe_id', 'product_id', 'qty_per_portion'), 'items')
+        try:
+            return cls(payload['version'], np.array(recipe_ids, dtype=np.int64),
+                       np.array(product_ids, dtype=np.int64),
+                       np.array([0.0 if v is None else v for v in qty], dtype=np.float64))
+        except (TypeError, ValueError):
+            raise ValueError('items : valeurs numériques attendues')
+
+    def info(self):
+        return {'version': self.version, 'num_recipes': len(self.recipe_ids), 'num_entries': self.num_entries}
+
+    def save(self, file):
+        # Format "une entrée par ligne de recipe_item", indépendant de la structure en mémoire
+        rows = np.repeat(np.arange(len(self.recipe_ids)), self.num_ingredients)
+        np.savez(file, version=np.array(self.version), recipe_ids=self.recipe_ids[rows],
+                 product_ids=self.product_ids[self.requirements.indices], qty=self.requirements.data)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(str(data['version']), data['recipe_ids'], data['product_ids'], data['qty'])
+
+    def features(self, snapshot, planned_portions):
+        """
+        Features de chaque recette de l'index (tableaux alignés sur self.recipe_ids),
+        mêmes règles que calculateRecipeStockFeatures : un ingrédient est couvert
+        si le produit est en stock en quantité >= qty_per_portion x portions.
+        """
+        A = self.requirements
+        # Stock aligné sur les colonnes de la matrice (un lookup par produit, pas par entrée)
+        known, qty, days = snapshot.lookup(self.product_ids)
+        qty = np.where(known, qty, -np.inf)
+        urgency = np.clip(1 - days / URGENCY_HORIZON_DAYS, 0, 1)
+
+        # Masque des entrées couvertes, sur la même structure creuse que A
+        covered = sparse.csr_matrix(((qty[A.indices] >= A.data * float(planned_portions)).astype(np.float64),
+                                     A.indices, A.indptr), shape=A.shape)
+        num_covered = covered @ np.ones(A.shape[1])
+        urgency_sum = covered @ urgency
+
+        # Plus proche péremption des ingrédients couverts (999 sinon)
+        covered_days = np.where(covered.data > 0, days[A.indices], NO_EXPIRY_DAYS)
+        min_days = np.full(A.shape[0], NO_EXPIRY_DAYS)
+        has_entries = self.num_ingredients > 0
+        if covered_days.size:
+            min_days[has_entries] = np.minimum.reduceat(covered_days, A.indptr[:-1][has_entries])
+
+        return {
+            'recipe_feasible': num_covered == self.num_ingredients,
+            'availability_score': np.where(has_entries, round2(num_covered / np.maximum(self.num_ingredients, 1)), 1.0),
+            'min_days_to_expiry': min_days,
+            'nb_missing_ingredients': (self.num_ingredients - num_covered).astype(np.int64),
+            'urgency_score': np.where(num_covered > 0, round2(urgency_sum / np.maximum(num_covered, 1)), 0.0)
+        }
+
+    def class_features(self, snapshot, planned_portions, recipe_index):
+        """
+        Features alignées sur les classes du modèle (RecipeIndex). Une recette
+        du modèle absente de l'index n'a pas d'ingrédient : faisable, disponibilité 1
+        (comme calculateRecipeStockFeatures avec une liste vide).
+        """
+        per_recipe = self.features(snapshot, planned_portions)
+        n = len(recipe_index)
+        aligned = {
+            'recipe_feasible': np.ones(n, dtype=bool),
+            'availability_score': np.ones(n),
+            'min_days_to_expiry': np.full(n, NO_EXPIRY_DAYS),
+            'nb_missing_ingredients': np.zeros(n, dtype=np.int64),
+            'urgency_score': np.zeros(n)
+        }
+        pos = recipe_index.positions(self.recipe_ids)
+        known = pos >= 0
+        for name, values in per_recipe.items():
+            aligned[name][pos[known]] = values[known]
+        return aligned
+
+
+class RecipeIngredientStore:
+    """
+    Index courant partagé par les workers : publish() l'écrit atomiquement
+    dans 'path' ; current() le relit quand le mtime du fichier change (stat au
+    plus toutes les check_interval secondes).
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._active = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def publish(self, index):
+        buffer = io.BytesIO()
+        index.save(buffer)
+        with self._lock:
+            ModelRegistry.write_atomic(self.path, lambda f: f.write(buffer.getvalue()))
+            self._mtime = self._stat()
+            self._active = index
+
+    def current(self):
+        """Index courant, ou None si Node n'en a jamais poussé"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._active
+        self._next_check = now + self.check_interval
+        mtime = self._stat()
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self._active = RecipeIngredients.load(self.path) if mtime is not None else None
+                        self._mtime = mtime
+                    except (OSError, ValueError, KeyError) as e:
+                        log.warning(f"Index recettes x ingrédients illisible ({self.path}) : {e}")
+        return self._active
@@ -0,0 +1,67 @@
+"""
+Tests du service ML : depuis ml-service/, python -m pytest -q
+Le service lit sa configuration à l'import : MODEL_DIR pointe vers un dossier
+temporaire avant le premier import de app. Un seul entraînement (historique
+de server/src/script) sert à toute la session.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+os.environ['MODEL_DIR'] = tempfile.mkdtemp(prefix='mlservice-tests-')
+os.environ['MODEL_CHECK_INTERVAL'] = '0'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+TRAINING_CSV = os.path.join(BASE_DIR, '..', 'server', 'src', 'script', 'training_data.csv')
+
+CONTEXT = {'day_of_week': 2, 'month': 5, 'week_of_year': 20, 'planned_portions': 40,
+           'last_recipe_1': 15, 'last_recipe_2': 16}
+
+
+@pytest.fixture(scope='session')
+def service():
+    import app
+    return app
+
+
+@pytest.fixture(scope='session')
+def client(service):
+    return service.app.test_client()
+
+
+@pytest.fixture(scope='session')
+def training_csv():
+    with open(TRAINING_CSV, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='session')
+def wait_job(client):
+    """Attend la fin d'un job (/train/<id>, /tune/<id>) et retourne son statut"""
+    def wait(path, timeout=300):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            job = client.get(path).json
+            if job['status'] in ('succeeded', 'failed'):
+                return job
+            time.sleep(0.1)
+        raise TimeoutError(path)
+    return wait
+
+
+@pytest.fixture(scope='session')
+def trained(client, training_csv, wait_job):
+    """Job /train terminé sur l'historique de référence (modèle publié)"""
+    response = client.post('/train', data=training_csv, content_type='text/csv')
+    assert response.status_code == 202, response.json
+    job = wait_job(f"/train/{response.json['job_id']}")
+    assert job['status'] == 'succeeded', job.get('error')
+    return job
@@ -0,0 +1,83 @@
+"""Entrée ASGI (asgi.py), appelée directement par le protocole ASGI"""
+
+import asyncio
+import csv
+import io
+import json
+import threading
+
+import asgi
+from conftest import CONTEXT
+
+
+async def call(method, path, chunks=(), headers=()):
+    """(statut, corps JSON) d'une requête envoyée à asgi.app, corps découpé en 'chunks'"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+        'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 5001)
+    }
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': True} for chunk in chunks]
+    messages.append({'type': 'http.request', 'body': b'', 'more_body': False})
+    done = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope, receive, send)
+    done.set()
+    body = b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+    return sent[0]['status'], json.loads(body)
+
+
+def serve(*requests):
+    """Exécute les requêtes dans une boucle asyncio, lifespan compris (pool d'inférence, micro-batcher)"""
+    async def run():
+        async with asgi.lifespan(asgi.app):
+            return [await call(*request) for request in requests]
+    return asyncio.run(run())
+
+
+def test_train_chunked(client, wait_job, training_csv):
+    rows = csv.DictReader(io.StringIO(training_csv.decode('utf-8')))
+    ndjson = ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+    # Corps sans Content-Length, en morceaux, comme trainModel côté Node
+    chunks = [ndjson[i:i + 4096] for i in range(0, len(ndjson), 4096)]
+    headers = [('Content-Type', 'application/x-ndjson'), ('Transfer-Encoding', 'chunked')]
+    [(code, body)] = serve(('POST', '/train', chunks, headers))
+    assert code == 202, body
+    assert wait_job(f"/train/{body['job_id']}")['status'] == 'succeeded'
+
+
+def test_predict_comme_flask(client, trained):
+    payload = json.dumps({'context': CONTEXT, 'num_predictions': 4}).encode('utf-8')
+    headers = [('Content-Type', 'application/json')]
+    responses = serve(('POST', '/predict', [payload], headers), ('POST', '/predict', [b'{"context": 3}'], headers),
+                      ('GET', '/status'), ('GET', '/model-info'), ('GET', '/feature-importance'), ('GET', '/health'))
+    assert [code for code, _ in responses] == [200, 400, 200, 200, 200, 200]
+    expected = client.post('/predict', json={'context': CONTEXT, 'num_predictions': 4}).json
+    assert responses[0][1]['predictions'] == expected['predictions']
+
+
+def test_modele_lu_hors_de_la_boucle(service, trained, monkeypatch):
+    threads = []
+    get_active_model = service.get_active_model
+
+    def recording():
+        threads.append(threading.current_thread())
+        return get_active_model()
+    monkeypatch.setattr(service, 'get_active_model', recording)
+
+    payload = json.dumps({'context': CONTEXT}).encode('utf-8')
+    [(code, _)] = serve(('POST', '/predict', [payload], [('Content-Type', 'application/json')]))
+    assert code == 200
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,102 @@
+"""Entraînement incrémental : exemples retenus (incremental_rows), replis et booster continué"""
+
+import csv
+import io
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import CONTEXT
+from model_registry import ModelRegistry
+from scoring import RecipeIndex
+from training_data import from_records
+
+
+def training_set(service, rows):
+    """(recipe_id, date) -> TrainingSet, contexte de conftest pour toutes les lignes"""
+    return from_records([{**CONTEXT, 'recipe_id': r, 'date': d} for r, d in rows], service.HABIT_FEATURES)
+
+
+def published(recipe_ids, watermark='2026-01-10', watermark_rows=None, rounds=100):
+    return SimpleNamespace(recipe_index=RecipeIndex(np.array(recipe_ids)), watermark=watermark,
+                           watermark_rows=watermark_rows,
+                           booster=SimpleNamespace(num_boosted_rounds=lambda: rounds))
+
+
+def test_exemples_posterieurs_au_watermark(service):
+    data = training_set(service, [(1, '2026-01-09'), (2, '2026-01-10'), (1, '2026-01-11'), (2, '2026-01-12')])
+    # Version sans empreintes : le jour du watermark est considéré comme appris
+    new_rows, reason = service.incremental_rows(published([1, 2]), np.array([1, 2]), data)
+    assert reason is None
+    assert new_rows.tolist() == [False, False, True, True]
+
+
+def test_jour_du_watermark_repris_sans_doublon(service):
+    day = [(1, '2026-01-10'), (2, '2026-01-10'), (2, '2026-01-10')]
+    learned = service.row_fingerprints(training_set(service, day[:2]).X, [1, 2])
+    # Deux exemples appris, dont un (2) présent deux fois dans le nouvel envoi : un seul est repris
+    data = training_set(service, [(1, '2026-01-09')] + day + [(1, '2026-01-11')])
+    new_rows, _ = service.incremental_rows(published([1, 2], watermark_rows=learned), np.array([1, 2]), data)
+    assert new_rows.tolist() == [False, False, False, True, True]
+
+
+@pytest.mark.parametrize('current, reason', [
+    (None, 'aucun modèle publié'),
+    (published([1, 2], watermark=None), 'modèle publié sans watermark'),
+    (published([1, 3]), 'ensemble des recettes modifié'),
+    (published([1, 2], rounds=295), 'booster à 300 itérations'),
+])
+def test_replis_sur_entrainement_complet(service, current, reason):
+    data = training_set(service, [(1, '2026-01-11'), (2, '2026-01-11')])
+    assert service.incremental_rows(current, np.array([1, 2]), data) == (None, reason)
+
+
+@pytest.fixture
+def isolated_registry(service, tmp_path, monkeypatch):
+    """Modèle publié propre au test : le modèle de session n'est pas modifié"""
+    registry = ModelRegistry(str(tmp_path), service.load_version, check_interval=0)
+    monkeypatch.setattr(service, 'model_registry', registry)
+    return registry
+
+
+def as_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=rows[0].keys())
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode('utf-8')
+
+
+def test_booster_continue_avec_les_exemples_du_dernier_jour(client, service, wait_job, training_csv,
+                                                             isolated_registry):
+    rows = list(csv.DictReader(io.StringIO(training_csv.decode('utf-8'))))
+    last_day = max(row['date'] for row in rows)
+    counts = Counter(row['recipe_id'] for row in rows)
+    # Exemples tardifs : recettes encore récurrentes sans eux (keep_recurring ne les écarte pas)
+    late = [i for i, row in enumerate(rows) if row['date'] == last_day and counts[row['recipe_id']] > 2][1:]
+    assert late
+    # Premier entraînement avant l'enregistrement des derniers exemples du jour
+    early = [row for i, row in enumerate(rows) if i not in late]
+
+    def train(body, mode):
+        response = client.post(f'/train?mode={mode}', data=body, content_type='text/csv')
+        assert response.status_code == 202, response.json
+        job = wait_job(f"/train/{response.json['job_id']}")
+        assert job['status'] == 'succeeded', job.get('error')
+        return job['metrics']
+
+    full = train(as_csv(early), 'full')
+    assert full['watermark'] == last_day
+
+    incremental = train(as_csv(rows), 'incremental')
+    assert incremental['mode'] == 'incremental' and 'fallback_reason' not in incremental
+    assert incremental['num_new_samples'] == len(late)
+    assert incremental['num_boosted_rounds'] == full['num_boosted_rounds'] + service.INCREMENTAL_ESTIMATORS
+    assert incremental['watermark'] == last_day
+
+    # Tout le jour du watermark est maintenant appris
+    again = train(as_csv(rows), 'incremental')
+    assert again['num_new_samples'] == 0
+    assert again['model_version'] == incremental['model_version']
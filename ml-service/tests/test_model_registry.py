@@ -0,0 +1,92 @@
+"""Registre versionné (model_registry.py) et migration des anciens pickles (app.py)"""
+
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+
+from model_registry import ModelRegistry
+
+
+class Loaded:
+    def __init__(self, version):
+        self.version = version
+
+
+def test_publication_vue_par_un_autre_worker(tmp_path):
+    worker_a = ModelRegistry(str(tmp_path), Loaded, check_interval=0)
+    worker_b = ModelRegistry(str(tmp_path), Loaded, check_interval=0)
+    assert worker_b.current() is None
+
+    worker_a.publish(Loaded('v1'))
+    assert worker_b.current().version == 'v1'
+
+    worker_a.publish(Loaded('v2'))
+    # B sert v1 pendant le rechargement en arrière-plan, puis v2
+    deadline = time.monotonic() + 5
+    while worker_b.current().version != 'v2':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_anciennes_versions_supprimees(tmp_path):
+    registry = ModelRegistry(str(tmp_path), Loaded, keep_versions=2)
+    for version in ('v1', 'v2', 'v3'):
+        with open(registry.path(version, '.ubj'), 'wb') as f:
+            f.write(b'x')
+        registry.publish(Loaded(version))
+    assert sorted(os.listdir(tmp_path)) == ['current_version.json', 'recipe_model_hybrid-v2.ubj',
+                                            'recipe_model_hybrid-v3.ubj']
+
+
+@pytest.fixture
+def legacy_pickle():
+    """Ancien format : XGBClassifier + LabelEncoder picklés ; (contenu, X de contrôle)"""
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 20, size=(300, 6)).astype(np.float32)
+    encoder = LabelEncoder().fit([15, 16, 20])
+    y = encoder.transform(np.array([15, 16, 20])[X[:, 0].astype(int) % 3])
+    model = xgb.XGBClassifier(n_estimators=10, max_depth=3).fit(X, y)
+    return {'model': model, 'feature_names': ['day_of_week', 'month', 'week_of_year', 'planned_portions',
+                                              'last_recipe_1', 'last_recipe_2'],
+            'label_encoder': encoder}, X
+
+
+@pytest.fixture
+def isolated_registry(service, tmp_path, monkeypatch):
+    """Registre du service dans un dossier vide, le temps d'un test"""
+    registry = ModelRegistry(str(tmp_path), service.load_version, check_interval=0)
+    monkeypatch.setattr(service, 'model_registry', registry)
+    monkeypatch.setattr(service, 'MODEL_PATH', str(tmp_path / 'recipe_model_hybrid.pkl'))
+    return registry
+
+
+def test_migration_du_pickle_unique(service, isolated_registry, legacy_pickle):
+    saved, X = legacy_pickle
+    with open(service.MODEL_PATH, 'wb') as f:
+        pickle.dump(saved, f)
+
+    current = service.get_active_model()
+    assert current is not None
+    assert not os.path.exists(service.MODEL_PATH)
+    assert os.path.exists(isolated_registry.path(current.version, '.ubj'))
+    assert list(current.recipe_index.recipe_ids) == [15, 16, 20]
+    assert np.abs(current.predict_proba(X) - saved['model'].predict_proba(X)).max() < 1e-6
+
+
+def test_conversion_d_une_version_pkl(service, isolated_registry, legacy_pickle):
+    saved, X = legacy_pickle
+    with open(isolated_registry.path('v1', '.pkl'), 'wb') as f:
+        pickle.dump(saved, f)
+    isolated_registry.publish(Loaded('v1'))
+    isolated_registry.active = None
+
+    current = isolated_registry.load_current()
+    assert current.version == 'v1'
+    assert not os.path.exists(isolated_registry.path('v1', '.pkl'))
+    assert os.path.exists(isolated_registry.path('v1', '.meta.json'))
+    assert np.abs(current.predict_proba(X) - saved['model'].predict_proba(X)).max() < 1e-6
@@ -0,0 +1,60 @@
+"""/plan : planning multi-jours avec consommation FEFO du stock"""
+
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def plan_request(client, service, trained):
+    """Index recettes x ingrédients poussé comme par Node, et corps /plan sur une semaine"""
+    recipe_ids = service.get_active_model().recipe_index.recipe_ids.tolist()
+    items = [{'recipe_id': r, 'product_id': r % 5 + 1, 'qty_per_portion': 0.1} for r in recipe_ids]
+    assert client.put('/recipe-index', json={'version': 'v1', 'items': items}).status_code == 200
+    return {
+        'start_date': '2026-10-19', 'end_date': '2026-10-25', 'planned_portions': 20,
+        'last_recipes': recipe_ids[:2],
+        'stock': {'product_id': [1, 2, 3, 4, 5], 'available_qty': [5.0] * 5, 'days_to_expiry': [1, 2, 3, 8, 9]}
+    }
+
+
+def test_plan_une_recette_par_jour(client, plan_request):
+    response = client.post('/plan', json=plan_request)
+    assert response.status_code == 200, response.json
+    body = response.json
+    assert [day['date'] for day in body['plan']] == [f'2026-10-{d}' for d in range(19, 26)]
+    assert body['total_score'] == pytest.approx(sum(day['score_final'] for day in body['plan']), abs=1e-3)
+    assert body['search']['degraded_at_day'] is None
+
+
+def test_plan_budget_depasse(client, plan_request):
+    # Budget trop court : la recherche finit en glouton, le planning reste complet
+    body = client.post('/plan', json={**plan_request, 'beam_width': 8, 'budget_ms': 1}).json
+    assert len(body['plan']) == 7
+    assert body['search']['degraded_at_day'] is not None
+
+
+def test_plan_requetes_invalides(client, plan_request):
+    assert client.post('/plan', json={**plan_request, 'end_date': '2026-12-25'}).status_code == 400
+    assert client.post('/plan', json={**plan_request, 'stock': None}).status_code == 400
+
+
+def test_plan_plus_de_jours_que_de_recettes(client, service, plan_request, monkeypatch):
+    monkeypatch.setattr('meal_plan.MAX_PLAN_DAYS', 60)
+    num_classes = len(service.get_active_model().recipe_index)
+    request = {**plan_request, 'end_date': str(date(2026, 10, 19) + timedelta(days=num_classes)),
+               'beam_width': 1}
+    response = client.post('/plan', json=request)
+    assert response.status_code == 400
+    assert 'allow_repeats' in response.json['error']
+    response = client.post('/plan', json={**request, 'allow_repeats': True})
+    assert response.status_code == 200, response.json
+    assert len(response.json['plan']) == num_classes + 1
+
+
+def test_plan_corps_non_objet(client, plan_request):
+    for body in ([plan_request], 3, 'x'):
+        response = client.post('/plan', json=body)
+        assert response.status_code == 400
+        assert response.json['error'] == 'Corps JSON invalide : objet attendu'
+    assert client.post('/plan', data='{', content_type='application/json').status_code == 400
@@ -0,0 +1,63 @@
+"""/predict et /predict-batch (client de test Flask)"""
+
+from conftest import CONTEXT
+
+
+def test_predict_top_k(client, trained):
+    response = client.post('/predict', json={'context': CONTEXT, 'num_predictions': 3})
+    assert response.status_code == 200
+    body = response.json
+    assert body['success'] and body['model_version'] == client.get('/status').json['model_version']
+    assert len(body['predictions']) == 3
+    scores = [p['score_final'] for p in body['predictions']]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_predict_contexte_invalide(client, trained):
+    response = client.post('/predict', json={'context': dict(CONTEXT, day_of_week=9)})
+    assert response.status_code == 400
+    assert not response.json['success']
+
+
+def test_predict_options_invalides(client, trained):
+    response = client.post('/predict', json={'context': CONTEXT, 'num_predictions': 0})
+    assert response.status_code == 400
+
+
+def test_predict_batch_comme_predict(client, trained):
+    contexts = [CONTEXT, dict(CONTEXT, day_of_week=4, last_recipe_1=0, last_recipe_2=0)]
+    response = client.post('/predict-batch', json={'contexts': [{'context': c} for c in contexts],
+                                                   'num_predictions': 4})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert len(results) == 2
+    for context, result in zip(contexts, results):
+        single = client.post('/predict', json={'context': context, 'num_predictions': 4}).json
+        assert result['predictions'] == single['predictions']
+
+
+def test_predict_batch_vide_ou_trop_grand(client, service, trained):
+    assert client.post('/predict-batch', json={'contexts': []}).status_code == 400
+    items = [{'context': CONTEXT}] * (service.MAX_BATCH_SIZE + 1)
+    assert client.post('/predict-batch', json={'contexts': items}).status_code == 400
+
+
+def test_predict_valeurs_converties_par_le_schema(client, trained):
+    expected = client.post('/predict', json={'context': dict(CONTEXT, day_of_week=3)}).json['predictions']
+    for day in ('3', 3.0):
+        response = client.post('/predict', json={'context': dict(CONTEXT, day_of_week=day)})
+        assert response.status_code == 200, response.json
+        assert response.json['predictions'] == expected
+    # null = feature absente (0, lundi)
+    assert client.post('/predict', json={'context': dict(CONTEXT, day_of_week=None)}).status_code == 200
+    assert client.post('/predict', json={'context': [1, 2]}).status_code == 400
+
+
+def test_predict_batch_element_invalide(client, trained):
+    response = client.post('/predict-batch', json={'contexts': [{'context': CONTEXT}, 1, 'x']})
+    assert response.status_code == 400
+    assert 'contexts[1]' in response.json['error']
+    assert client.post('/predict-batch', json={'contexts': [{'context': 'x'}]}).status_code == 400
+    assert client.post('/predict-batch', json={'contexts': 3}).status_code == 400
+    response = client.post('/predict-batch', json={'contexts': [{'context': dict(CONTEXT, day_of_week='4')}]})
+    assert response.status_code == 200
@@ -0,0 +1,52 @@
+"""/rollout : séquences les plus probables, features last_recipe_* réinjectées jour après jour"""
+
+import math
+
+import numpy as np
+import pytest
+
+from meal_plan import day_context
+
+
+@pytest.fixture(scope='module')
+def rollout_request(service, trained):
+    recipe_ids = service.get_active_model().recipe_index.recipe_ids.tolist()
+    return {'start_date': '2026-10-19', 'horizon': 4, 'planned_portions': 20, 'last_recipes': recipe_ids[:2],
+            'beam_width': 4, 'num_sequences': 3}
+
+
+def test_rollout_sequences_triees(client, rollout_request):
+    response = client.post('/rollout', json=rollout_request)
+    assert response.status_code == 200, response.json
+    sequences = response.json['sequences']
+    assert len(sequences) == 3
+    assert [s['log_prob'] for s in sequences] == sorted((s['log_prob'] for s in sequences), reverse=True)
+    for sequence in sequences:
+        assert len(sequence['days']) == 4
+        assert sequence['log_prob'] == pytest.approx(sum(math.log(d['probability']) for d in sequence['days']),
+                                                     abs=1e-2)
+
+
+def test_rollout_glouton_comme_predictions_successives(client, service, rollout_request):
+    body = client.post('/rollout', json={**rollout_request, 'beam_width': 1, 'num_sequences': 1}).json
+    days = body['sequences'][0]['days']
+
+    current = service.get_active_model()
+    recipe_ids = current.recipe_index.recipe_ids.tolist()
+    last = rollout_request['last_recipes']
+    history = [last[1], last[0]]
+    for day in days:
+        context = day_context(np.datetime64(day['date']).astype(object), 20, (history[-1], history[-2]))
+        probas = service.habit_probas(current, service.context_matrix([context]))[0]
+        history.append(recipe_ids[int(np.argmax(probas))])
+        assert day['recipe_id'] == history[-1]
+
+
+def test_rollout_requete_invalide(client, rollout_request):
+    assert client.post('/rollout', json={**rollout_request, 'num_sequences': 9}).status_code == 400
+
+
+def test_rollout_corps_non_objet(client, rollout_request):
+    for body in ([rollout_request], 3, None):
+        response = client.post('/rollout', json=body)
+        assert response.status_code == 400, body
@@ -0,0 +1,67 @@
+"""Tableaux partagés entre workers (shared_arrays.py) : mmap lecture seule, sans copie"""
+
+import mmap
+
+import numpy as np
+import pytest
+
+import shared_arrays
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(0)
+    return {
+        'keys': np.sort(rng.integers(0, 2 ** 60, 1000, dtype=np.uint64)),
+        'probas': rng.random((1000, 7), dtype=np.float32),
+        'ids': np.arange(5, dtype=np.int32),
+        'empty': np.empty((0, 3), dtype=np.float64)
+    }
+
+
+@pytest.fixture
+def path(tmp_path, arrays):
+    path = str(tmp_path / 'model.arrays')
+    with open(path, 'wb') as f:
+        shared_arrays.save(f, arrays)
+    return path
+
+
+def test_chargements_mmap_sans_copie(path, arrays):
+    # Deux chargements = deux workers qui ouvrent la même version
+    for loaded in (shared_arrays.load(path), shared_arrays.load(path)):
+        assert loaded.keys() == arrays.keys()
+        for name, source in arrays.items():
+            values = loaded[name]
+            assert values.dtype == source.dtype and values.shape == source.shape
+            np.testing.assert_array_equal(values, source)
+            assert not values.flags.writeable
+            with pytest.raises(ValueError):
+                values[...] = 0
+            if source.size:
+                # Pages du fichier (cache disque du noyau), pas une copie dans le processus
+                assert isinstance(values, np.memmap) and isinstance(values.base, mmap.mmap)
+                assert values.ctypes.data % shared_arrays.ALIGN == 0
+
+
+def test_chargement_en_memoire(path, arrays):
+    loaded = shared_arrays.load(path, mmap=False)
+    assert not isinstance(loaded['probas'], np.memmap)
+    assert not loaded['probas'].flags.writeable
+    np.testing.assert_array_equal(loaded['probas'], arrays['probas'])
+
+
+def test_fichier_invalide(tmp_path):
+    path = tmp_path / 'other.arrays'
+    path.write_bytes(b'not an arrays file')
+    with pytest.raises(ValueError):
+        shared_arrays.load(str(path))
+
+
+def test_modele_servi_depuis_les_tableaux_mmap(service, trained):
+    # Ce que chaque worker relit après un /train : classes, table et forêt en mmap
+    loaded = service.load_version(service.get_active_model().version, warm=False)
+    assert isinstance(loaded.recipe_index.recipe_ids.base, mmap.mmap)
+    assert isinstance(loaded.table.keys.base, mmap.mmap)
+    forest = service.read_forest(loaded.version)
+    assert isinstance(forest.leaf_value.base, mmap.mmap)
@@ -0,0 +1,65 @@
+"""/train : corps JSON, CSV à taille connue et NDJSON en flux (chunked), RSS du job"""
+
+import csv
+import io
+import json
+import time
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='session')
+def ndjson(training_csv):
+    rows = csv.DictReader(io.StringIO(training_csv.decode('utf-8')))
+    return ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+
+
+def train(client, wait_job, **kwargs):
+    response = client.post('/train', **kwargs)
+    assert response.status_code == 202, response.json
+    return wait_job(f"/train/{response.json['job_id']}")
+
+
+def test_train_csv_taille_connue(client, wait_job, training_csv):
+    job = train(client, wait_job, data=training_csv, content_type='text/csv')
+    assert job['status'] == 'succeeded', job.get('error')
+    assert client.get('/status').json['model_version'] == job['metrics']['model_version']
+
+
+def test_train_ndjson_chunked(client, wait_job, ndjson):
+    # Sans Content-Length, comme trainModel côté Node (duplex: 'half') ; gunicorn
+    # signale la fin du corps par wsgi.input_terminated
+    job = train(client, wait_job, input_stream=io.BytesIO(ndjson), content_type='application/x-ndjson',
+                headers={'Transfer-Encoding': 'chunked'}, environ_overrides={'wsgi.input_terminated': True})
+    assert job['status'] == 'succeeded', job.get('error')
+    assert job['params']['num_samples'] > 0
+
+
+def test_train_json(client, wait_job, ndjson):
+    records = [json.loads(line) for line in ndjson.splitlines()]
+    job = train(client, wait_job, json={'training_data': records})
+    assert job['status'] == 'succeeded', job.get('error')
+
+
+def test_train_sans_donnees(client):
+    response = client.post('/train', data=b'', content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert client.post('/train?mode=autre', json={'training_data': []}).status_code == 400
+
+
+def test_pic_de_rss_propre_au_job(service):
+    sampler = service.RssSampler(interval=0.01)
+    block = np.ones(64 * 2 ** 20 // 8)  # 64 Mo écrits, donc résidents
+    time.sleep(0.05)
+    usage = sampler.stop()
+    del block
+    assert usage['peak'] - usage['start'] > 50
+    # Un job suivant, plus léger, ne reprend pas le pic du précédent (contrairement à ru_maxrss)
+    assert service.RssSampler().stop()['peak'] < usage['peak'] - 50
+
+
+def test_rss_dans_les_metriques(client, wait_job, training_csv):
+    job = train(client, wait_job, data=training_csv, content_type='text/csv')
+    rss = job['metrics']['rss_mb']
+    assert 0 < rss['start'] <= rss['peak']
@@ -0,0 +1,27 @@
+"""Matrices d'entraînement (training_config.py) : memory, quantile, external"""
+
+import os
+import warnings
+
+import numpy as np
+import pytest
+
+from training_config import parse_training_config, train_booster
+
+PARAMS = {'objective': 'multi:softprob', 'num_class': 3, 'tree_method': 'hist'}
+
+
+@pytest.mark.parametrize('data', ['memory', 'quantile', 'external'])
+def test_train_booster(tmp_path, data):
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 20, size=(500, 6)).astype(np.float32)
+    y = (X[:, 0] % 3).astype(np.int32)
+    config = parse_training_config({'data': data})
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        booster = train_booster(PARAMS, X, y, list('abcdef'), config, str(tmp_path), num_boost_round=5)
+    assert booster.num_boosted_rounds() == 5
+    # external : pages de cache effacées par XGBoost avant la suppression du dossier
+    assert not [w for w in caught if 'cache file' in str(w.message)]
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,45 @@
+"""Progression des jobs d'entraînement (TrainingProgress, training_jobs.py)"""
+
+import numpy as np
+import xgboost as xgb
+
+from training_jobs import TrainingJob
+
+
+class RecordingJob:
+    def __init__(self):
+        self.values = []
+
+    def report_progress(self, progress, stage=None):
+        self.values.append(progress)
+
+
+def fit(service, rounds, xgb_model=None):
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 20, size=(200, 6)).astype(np.float32)
+    dtrain = xgb.DMatrix(X, label=X[:, 0] % 3)
+    job = RecordingJob()
+    booster = xgb.train({'objective': 'multi:softprob', 'num_class': 3}, dtrain, num_boost_round=rounds,
+                        xgb_model=xgb_model, callbacks=[service.TrainingProgress(job, rounds)])
+    return booster, job.values
+
+
+def test_progression_complete_et_incrementale(service):
+    booster, full = fit(service, 10)
+    _, incremental = fit(service, 4, xgb_model=booster)
+    for values in (full, incremental):
+        assert values[-1] == 1.0
+        assert all(0 < v <= 1 for v in values)
+        assert values == sorted(values)
+
+
+def test_progression_bornee():
+    class Store:
+        def write(self, state):
+            pass
+
+    job = TrainingJob(Store(), 'job')
+    job.report_progress(-9.9)
+    assert job.state['progress'] == 0.0
+    job.report_progress(1.5)
+    assert job.state['progress'] == 1.0
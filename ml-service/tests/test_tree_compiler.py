@@ -0,0 +1,68 @@
+"""Parité du prédicteur compilé (tree_compiler.py) avec le booster XGBoost"""
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from tree_compiler import CompiledForest, PARITY_TOLERANCE
+
+
+def train_booster(num_class, seed=0):
+    """Petit booster sur 6 features entières, avec des valeurs manquantes et des zéros"""
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 50, size=(600, 6)).astype(np.float32)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    X[rng.random(X.shape) < 0.1] = 0
+    y = (np.nan_to_num(X[:, 0]) + np.nan_to_num(X[:, 4])).astype(int) % num_class
+    params = {'max_depth': 4, 'learning_rate': 0.3, 'tree_method': 'hist', 'seed': seed}
+    if num_class == 2:
+        params['objective'] = 'binary:logistic'
+    else:
+        params.update(objective='multi:softprob', num_class=num_class)
+    return xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=20)
+
+
+def booster_probas(booster, X):
+    probas = booster.inplace_predict(X, validate_features=False)
+    return np.column_stack([1 - probas, probas]) if probas.ndim == 1 else probas
+
+
+def sample_rows(n, seed=1):
+    """Lignes aléatoires, plus des lignes entièrement manquantes et entièrement nulles"""
+    rng = np.random.default_rng(seed)
+    X = rng.integers(-5, 60, size=(n, 6)).astype(np.float32)
+    X[rng.random(X.shape) < 0.2] = np.nan
+    X[rng.random(X.shape) < 0.2] = 0
+    return np.vstack([X, np.full((1, 6), np.nan, dtype=np.float32), np.zeros((1, 6), dtype=np.float32)])
+
+
+@pytest.mark.parametrize('num_class', [2, 5])
+def test_parite_avec_le_booster(num_class):
+    booster = train_booster(num_class)
+    forest = CompiledForest.from_booster(booster)
+    X = sample_rows(1000)
+    diff = np.abs(forest.predict_proba(X) - booster_probas(booster, X)).max()
+    assert diff < PARITY_TOLERANCE
+
+
+def test_parite_apres_save_load(tmp_path):
+    booster = train_booster(5)
+    path = tmp_path / 'forest.arrays'
+    with open(path, 'wb') as f:
+        CompiledForest.from_booster(booster).save(f)
+    forest = CompiledForest.load(str(path))
+    X = sample_rows(200, seed=2)
+    assert np.abs(forest.predict_proba(X) - booster_probas(booster, X)).max() < PARITY_TOLERANCE
+
+
+def test_grands_lots_via_le_booster(service, monkeypatch):
+    booster = train_booster(5)
+    forest = CompiledForest.from_booster(booster)
+    model = service.ActiveModel(booster, service.HABIT_FEATURES, np.arange(5), 'v', compiled=forest)
+    calls = []
+    monkeypatch.setattr(forest, 'predict_proba', lambda X: calls.append(len(X)) or np.zeros((len(X), 5)))
+    monkeypatch.setattr(service, 'COMPILED_MAX_BATCH', 16)
+
+    model.predict_proba(sample_rows(14))
+    model.predict_proba(sample_rows(100))
+    assert calls == [16]
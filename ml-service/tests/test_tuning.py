@@ -0,0 +1,122 @@
+"""
+/tune : découpage chronologique, recherche réelle (pool de processus spawn) et
+publication de best_params.json seulement si le holdout n'est pas dégradé
+"""
+
+import io
+import os
+
+import numpy as np
+import pytest
+
+import tuning
+from training_config import parse_training_config
+from training_data import read_csv
+
+
+def fake_search(tuned, baseline):
+    def search(X, y, dates, base_params, config, options, cache_dir, progress=None):
+        return {
+            'best_params': {'n_estimators': 40, 'max_depth': 3, 'learning_rate': 0.1},
+            'cv': [],
+            'holdout': {'tuned': {'top1': 0.1, 'top5': tuned, 'n_estimators': 40},
+                        'baseline': {'top1': 0.1, 'top5': baseline, 'n_estimators': 100}},
+            'folds': [],
+            'holdout_rows': 10,
+            'workers': 1
+        }
+    return search
+
+
+@pytest.fixture
+def best_params_path(service, tmp_path, monkeypatch):
+    path = str(tmp_path / 'best_params.json')
+    monkeypatch.setattr(service, 'BEST_PARAMS_PATH', path)
+    return path
+
+
+@pytest.mark.parametrize('tuned, baseline, adopted', [(0.30, 0.35, False), (0.35, 0.35, True), (0.40, 0.35, True)])
+def test_configuration_retenue_si_pas_moins_bonne(client, wait_job, training_csv, best_params_path, monkeypatch,
+                                                  tuned, baseline, adopted):
+    monkeypatch.setattr(tuning, 'search', fake_search(tuned, baseline))
+    response = client.post('/tune?top_k=5', data=training_csv, content_type='text/csv')
+    assert response.status_code == 202, response.json
+    job = wait_job(f"/tune/{response.json['job_id']}")
+    assert job['status'] == 'succeeded', job.get('error')
+
+    assert job['metrics']['adopted'] is adopted
+    assert job['metrics']['holdout_score'] == {'metric': 'top5', 'tuned': tuned, 'baseline': baseline}
+    assert os.path.exists(best_params_path) is adopted
+
+
+def days(*counts):
+    """Dates triées : counts[i] exemples le jour i"""
+    return np.repeat(np.arange('2026-01-01', len(counts), dtype='datetime64[D]')[:len(counts)], counts)
+
+
+def test_plis_aux_frontieres_de_journees():
+    dates = days(3, 1, 4, 2, 5, 1, 3, 2, 4, 1)
+    dev_end, folds = tuning.plan_folds(dates, n_splits=2, holdout=0.2)
+    bounds = [folds[0][0]] + [end for _, end in folds]
+    assert bounds[-1] == dev_end < len(dates)
+    assert all(a < b for a, b in zip(bounds, bounds[1:]))
+    # Chaque borne (et le début du holdout) tombe sur le premier exemple d'une journée
+    for b in bounds:
+        assert dates[b - 1] < dates[b]
+    assert [(a, b) for a, b in zip(bounds, bounds[1:])] == folds
+
+
+def test_pas_assez_de_dates_distinctes():
+    with pytest.raises(ValueError, match='Pas assez de dates distinctes'):
+        tuning.plan_folds(days(10, 10), n_splits=3, holdout=0.2)
+    with pytest.raises(ValueError, match='date'):
+        tuning.plan_folds(np.array(['2026-01-01', 'NaT'], dtype='datetime64[D]'), n_splits=2, holdout=0.2)
+
+
+def test_fit_and_score(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 20, size=(400, 6)).astype(np.float32)
+    y = (X[:, 0] % 3).astype(np.int32)
+    np.save(tmp_path / 'X.npy', X)
+    np.save(tmp_path / 'y.npy', y)
+    task = {'X_path': str(tmp_path / 'X.npy'), 'y_path': str(tmp_path / 'y.npy'), 'train_end': 300,
+            'valid_end': 400, 'rounds': 30, 'top_k': 2,
+            'params': {'objective': 'multi:softprob', 'num_class': 3, 'eval_metric': 'mlogloss'}}
+
+    fixed = tuning.fit_and_score({**task, 'early_stopping_rounds': None})
+    assert fixed['n_estimators'] == 30
+    assert fixed['top1'] == 1.0 and fixed['topk'] == 1.0  # y se lit sur la première feature
+    stopped = tuning.fit_and_score({**task, 'early_stopping_rounds': 2, 'params': {**task['params'], 'eta': 1.0}})
+    assert stopped['n_estimators'] < 30
+    assert stopped['mlogloss'] > 0
+
+
+def test_coeurs_disponibles_selon_l_affinite(monkeypatch):
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: {0, 1}, raising=False)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 64)
+    assert tuning.available_cpus() == 2
+
+
+def test_recherche_reelle(service, training_csv, tmp_path):
+    training_set = read_csv(io.BytesIO(training_csv), service.HABIT_FEATURES).keep_recurring()
+    order = np.argsort(training_set.dates, kind='stable')
+    _, y = np.unique(training_set.recipe_ids, return_inverse=True)
+    X, y, dates = training_set.X[order], y[order].astype(np.int32), training_set.dates[order]
+    options = tuning.parse_tune_options({'n_splits': 2, 'max_rounds': 15, 'early_stopping_rounds': 3,
+                                         'search_space': {'max_depth': [2, 3], 'learning_rate': [0.3]}})
+    progress = []
+
+    result = tuning.search(X, y, dates, {**service.XGB_PARAMS, 'n_estimators': 10}, parse_training_config({}),
+                           options, str(tmp_path), progress=progress.append)
+
+    assert len(result['folds']) == 2 and result['holdout_rows'] > 0
+    # Successive halving : une seule des deux configurations passe au second pli
+    assert [entry['folds'] for entry in result['cv']] == [2, 1]
+    assert result['best_params']['max_depth'] == result['cv'][0]['max_depth']
+    assert 1 <= result['best_params']['n_estimators'] <= 15
+    assert result['holdout']['baseline']['n_estimators'] == 10
+    for scores in result['holdout'].values():
+        assert 0 <= scores['top1'] <= scores['top5'] <= 1
+    assert progress == sorted(progress) and progress[-1] == 1.0
+    assert result['workers'] == min(tuning.available_cpus(), 2)
+    assert os.listdir(tmp_path) == []  # .npy partagés avec le pool supprimés
@@ -0,0 +1,182 @@
+"""
+Mont-Vert ML Service - Réglages du moteur d'entraînement XGBoost
+Valeurs par défaut lues dans l'environnement, surchargeables par requête
+(/train?tree_method=hist&nthread=4&max_bin=128&data=external).
+
+data :
+  - memory   : DMatrix classique, tout en RAM ;
+  - quantile : QuantileDMatrix, les features sont directement quantifiées en
+               max_bin classes (pas de copie flottante côté XGBoost) ;
+  - external : DMatrix en mémoire externe ; les colonnes sont écrites en .npy
+               puis relues par paquets (mmap), XGBoost garde ses pages en cache disque.
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import xgboost as xgb
+
+TREE_METHODS = ('hist', 'approx', 'exact')
+DATA_MODES = ('memory', 'quantile', 'external')
+
+# Lignes par paquet lu par l'itérateur de mémoire externe
+EXTERNAL_CHUNK_ROWS = 100_000
+
+# Hyperparamètres d'un entraînement complet (surchargés par le dernier /tune)
+XGB_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 5,
+    'learning_rate': 0.05, # Learning rate plus doux pour généraliser
+    'random_state': 42,
+    'objective': 'multi:softprob', # On garde multi:softprob pour avoir les probabilités de chaque plat
+    'eval_metric': 'mlogloss'
+}
+
+DEFAULT_TRAINING_CONFIG = {
+    'tree_method': os.environ.get('TRAIN_TREE_METHOD', 'hist'),
+    'nthread': int(os.environ.get('TRAIN_NTHREAD', 0)),  # 0 = tous les coeurs
+    'max_bin': int(os.environ.get('TRAIN_MAX_BIN', 256)),
+    'data': os.environ.get('TRAIN_DATA_MODE', 'memory')
+}
+
+
+def parse_training_config(values, defaults=None):
+    """
+    Réglages validés à partir de 'values' (query string ou dict JSON),
+    complétés par 'defaults' (DEFAULT_TRAINING_CONFIG par défaut).
+    Lève ValueError avec un message utilisateur.
+    """
+    config = dict(defaults or DEFAULT_TRAINING_CONFIG)
+    values = values or {}
+
+    if values.get('tree_method') is not None:
+        config['tree_method'] = str(values['tree_method'])
+    if values.get('data') is not None:
+        config['data'] = str(values['data'])
+    for name in ('nthread', 'max_bin'):
+        if values.get(name) is not None:
+            try:
+                config[name] = int(values[name])
+            except (TypeError, ValueError):
+                raise ValueError(f'{name} doit être un entier')
+
+    if config['tree_method'] not in TREE_METHODS:
+        raise ValueError(f'tree_method doit être parmi {list(TREE_METHODS)}')
+    if config['data'] not in DATA_MODES:
+        raise ValueError(f'data doit être parmi {list(DATA_MODES)}')
+    if config['nthread'] < 0:
+        raise ValueError('nthread doit être >= 0 (0 = tous les coeurs)')
+    if not 2 <= config['max_bin'] <= 65535:
+        raise ValueError('max_bin doit être entre 2 et 65535')
+    if config['data'] != 'memory' and config['tree_method'] != 'hist':
+        raise ValueError(f"data={config['data']} nécessite tree_method=hist")
+    return config
+
+
+def tuned_hyperparams(best):
+    """(hyperparamètres, source) : XGB_PARAMS surchargés par 'best' (best_params.json de /tune, ou None)"""
+    if best is None:
+        return dict(XGB_PARAMS), 'default'
+    return {**XGB_PARAMS, **best['params']}, 'tuned'
+
+
+def booster_params(config, hyperparams, num_class):
+    """Paramètres de l'API native (xgb.train) : hyperparamètres du modèle + réglages moteur"""
+    params = {
+        'objective': hyperparams['objective'],
+        'num_class': int(num_class),
+        'max_depth': hyperparams['max_depth'],
+        'eta': hyperparams['learning_rate'],
+        'seed': hyperparams['random_state'],
+        'eval_metric': hyperparams['eval_metric'],
+        'tree_method': config['tree_method'],
+        'max_bin': config['max_bin']
+    }
+    if config['nthread'] > 0:
+        params['nthread'] = config['nthread']
+    return params
+
+
+class ArrayChunks(xgb.DataIter):
+    """Itérateur de mémoire externe : (X, y) relus par paquets depuis des .npy en mmap"""
+
+    def __init__(self, X_path, y_path, feature_names, cache_prefix, chunk_rows=EXTERNAL_CHUNK_ROWS):
+        self.X = np.load(X_path, mmap_mode='r')
+        self.y = np.load(y_path, mmap_mode='r')
+        self.feature_names = feature_names
+        self.chunk_rows = chunk_rows
+        self._start = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._start >= len(self.y):
+            return 0
+        end = self._start + self.chunk_rows
+        input_data(data=np.ascontiguousarray(self.X[self._start:end]), label=np.asarray(self.y[self._start:end]),
+                   feature_names=self.feature_names)
+        self._start = end
+        return 1
+
+    def reset(self):
+        self._start = 0
+
+
+@contextmanager
+def matrix_dir(config, cache_dir):
+    """
+    Dossier temporaire de la matrice en mode external (colonnes .npy + pages
+    de cache XGBoost), créé dans cache_dir et supprimé à la sortie du bloc ;
+    None dans les autres modes.
+    """
+    if config['data'] != 'external':
+        yield None
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='dmatrix-', dir=cache_dir)
+    try:
+        yield tmp_dir
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def training_matrix(X, y, feature_names, config, tmp_dir=None):
+    """Matrice d'entraînement XGBoost selon config['data'] (tmp_dir : voir matrix_dir)"""
+    if config['data'] == 'memory':
+        return xgb.DMatrix(X, label=y, feature_names=feature_names, nthread=config['nthread'] or None)
+    if config['data'] == 'quantile':
+        return xgb.QuantileDMatrix(X, label=y, feature_names=feature_names, max_bin=config['max_bin'],
+                                   nthread=config['nthread'] or None)
+
+    X_path = os.path.join(tmp_dir, 'X.npy')
+    y_path = os.path.join(tmp_dir, 'y.npy')
+    np.save(X_path, X)
+    np.save(y_path, y)
+    chunks = ArrayChunks(X_path, y_path, feature_names, cache_prefix=os.path.join(tmp_dir, 'cache'))
+    return xgb.DMatrix(chunks)
+
+
+def train_booster(params, X, y, feature_names, config, cache_dir, **train_kwargs):
+    """
+    xgb.train(params, matrice, **train_kwargs) sur la matrice de config['data'].
+    La matrice est libérée avant la suppression de son dossier : XGBoost
+    efface alors lui-même ses pages de cache.
+    """
+    with matrix_dir(config, cache_dir) as tmp_dir:
+        dtrain = training_matrix(X, y, feature_names, config, tmp_dir)
+        booster = xgb.train(params, dtrain, **train_kwargs)
+        del dtrain
+    return booster
+
+
+def fit_full(X, y, feature_names, config, hyperparams, cache_dir, callbacks=None):
+    """
+    Entraînement complet de /train : hyperparams['n_estimators'] arbres depuis
+    zéro, classes 0..y.max(). API native (xgb.train) : mêmes hyperparamètres
+    que XGBClassifier, sur la matrice de config['data'].
+    """
+    params = booster_params(config, hyperparams, num_class=int(y.max()) + 1)
+    return train_booster(params, X, y, feature_names, config, cache_dir,
+                         num_boost_round=hyperparams['n_estimators'], callbacks=callbacks)
@@ -0,0 +1,192 @@
+"""
+Mont-Vert ML Service - Lecture des données d'entraînement
+/train accepte un tableau JSON, du NDJSON (un exemple JSON par ligne) ou du CSV
+(schéma de training_data.csv). NDJSON et CSV sont lus ligne à ligne depuis le
+flux de la requête et convertis par paquets en colonnes NumPy typées : le corps
+complet n'est jamais en mémoire, seules les colonnes utiles le sont.
+Chaque feature est validée et stockée au type compact de feature_schema.py
+(uint8 / uint16 / uint32) ; la matrice float32 pour XGBoost n'est construite
+qu'une fois, à la demande.
+"""
+
+import csv
+import json
+
+import numpy as np
+
+from feature_schema import cast_column, feature_matrix
+
+# Lignes accumulées avant conversion en colonnes typées
+CHUNK_ROWS = 8192
+
+
+class TrainingSet:
+    """
+    Exemples d'entraînement en colonnes : recipe_id (int64), une colonne
+    compacte par feature (voir FEATURE_SCHEMA) et date (datetime64[D]).
+    X (float32 n x nb_features, C-contiguë) est construite au premier accès.
+    """
+
+    def __init__(self, recipe_ids, columns, dates, feature_names):
+        self.recipe_ids = recipe_ids
+        self.columns = columns
+        self.dates = dates
+        self.feature_names = list(feature_names)
+        self._X = None
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    @property
+    def X(self):
+        if self._X is None:
+            self._X = feature_matrix(self.columns, self.feature_names)
+        return self._X
+
+    @property
+    def nbytes(self):
+        """Taille des colonnes compactes (hors matrice X)"""
+        return self.recipe_ids.nbytes + self.dates.nbytes + sum(col.nbytes for col in self.columns.values())
+
+    def keep_recurring(self, min_count=2):
+        """Ne garde que les recettes vues au moins min_count fois (classes uniques inutilisables)"""
+        _, inverse, counts = np.unique(self.recipe_ids, return_inverse=True, return_counts=True)
+        mask = counts[inverse] >= min_count
+        columns = {name: col[mask] for name, col in self.columns.items()}
+        return TrainingSet(self.recipe_ids[mask], columns, self.dates[mask], self.feature_names)
+
+
+class ColumnBuilder:
+    """Accumule des exemples et les range par paquets de CHUNK_ROWS dans des colonnes typées"""
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self.columns_seen = set()
+        self._pending = []  # (recipe_id, [features], date, ligne) du paquet en cours
+        self._chunks = []   # paquets convertis : (recipe_ids, {feature: colonne}, dates)
+
+    def add_record(self, record, line=None):
+        """Ajoute un exemple sous forme de dict (JSON / NDJSON)"""
+        self.columns_seen.update(record.keys())
+        try:
+            recipe_id = int(record['recipe_id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{_where(line)}recipe_id manquant ou invalide")
+        features = [_to_float(record.get(name), name, line) for name in self.feature_names]
+        self._append(recipe_id, features, record.get('date'), line)
+
+    def add_row(self, recipe_id, features, date, line=None):
+        """Ajoute un exemple déjà découpé (CSV : valeurs texte)"""
+        try:
+            recipe_id = int(recipe_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"{_where(line)}recipe_id manquant ou invalide")
+        self._append(recipe_id, [_to_float(v, name, line) for v, name in zip(features, self.feature_names)], date, line)
+
+    def _append(self, recipe_id, features, date, line):
+        self._pending.append((recipe_id, features, date, line))
+        if len(self._pending) >= CHUNK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        rows = self._pending
+        self._pending = []
+        recipe_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        # float64 le temps du paquet seulement, puis type compact validé (NaN -> 0)
+        raw = np.array([row[1] for row in rows], dtype=np.float64).reshape(len(rows), len(self.feature_names))
+        lines = [row[3] for row in rows]
+        columns = {name: cast_column(name, raw[:, j], lines) for j, name in enumerate(self.feature_names)}
+        # 'AAAA-MM-JJ' (ou ISO complet, tronqué au jour) ; absente -> NaT
+        dates = np.array([str(row[2])[:10] if row[2] else 'NaT' for row in rows], dtype='datetime64[D]')
+        self._chunks.append((recipe_ids, columns, dates))
+
+    def finish(self):
+        """TrainingSet final ; ValueError si aucune donnée ou si une feature n'apparaît jamais"""
+        self._flush()
+        if not self._chunks:
+            raise ValueError('Aucune donnée fournie')
+        missing = [name for name in self.feature_names if name not in self.columns_seen]
+        if missing:
+            raise ValueError(f'Colonnes manquantes : {missing}')
+
+        recipe_ids = np.concatenate([chunk[0] for chunk in self._chunks])
+        columns = {name: np.concatenate([chunk[1][name] for chunk in self._chunks]) for name in self.feature_names}
+        dates = np.concatenate([chunk[2] for chunk in self._chunks])
+        self._chunks = []
+        return TrainingSet(recipe_ids, columns, dates, self.feature_names)
+
+
+def _where(line):
+    return f"Ligne {line} : " if line is not None else ""
+
+
+def _to_float(value, name, line):
+    if value is None or value == '':
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{_where(line)}valeur invalide pour {name} : {value!r}")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# FORMATS D'ENTRÉE
+# ═══════════════════════════════════════════════════════════════════════════
+
+def from_records(records, feature_names):
+    """Tableau JSON déjà décodé (ancien format : {"training_data": [...]})"""
+    builder = ColumnBuilder(feature_names)
+    for i, record in enumerate(records, start=1):
+        builder.add_record(record, line=i)
+    return builder.finish()
+
+
+def _lines(stream):
+    """Lignes (bytes) d'un flux binaire, lues au fil de l'eau"""
+    return iter(stream.readline, b'')
+
+
+def read_ndjson(stream, feature_names):
+    """NDJSON : un objet JSON par ligne, lignes vides ignorées"""
+    builder = ColumnBuilder(feature_names)
+    for i, line in enumerate(_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Ligne {i} : JSON invalide")
+        builder.add_record(record, line=i)
+    return builder.finish()
+
+
+def read_csv(stream, feature_names):
+    """CSV avec en-tête, au schéma de training_data.csv (colonnes en trop ignorées)"""
+    builder = ColumnBuilder(feature_names)
+    reader = csv.reader(line.decode('utf-8') for line in _lines(stream))
+    header = next(reader, None)
+    if header is None:
+        raise ValueError('Aucune donnée fournie')
+    header = [name.strip() for name in header]
+    builder.columns_seen.update(header)
+    missing = [name for name in ['recipe_id'] + builder.feature_names if name not in header]
+    if missing:
+        raise ValueError(f'Colonnes manquantes : {missing}')
+
+    recipe_col = header.index('recipe_id')
+    feature_cols = [header.index(name) for name in builder.feature_names]
+    date_col = header.index('date') if 'date' in header else None
+    for i, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        if len(row) < len(header):
+            raise ValueError(f"Ligne {i} : {len(row)} colonnes au lieu de {len(header)}")
+        builder.add_row(
+            row[recipe_col],
+            [row[col] for col in feature_cols],
+            row[date_col] if date_col is not None else None,
+            line=i
+        )
+    return builder.finish()
@@ -0,0 +1,131 @@
+"""
+Mont-Vert ML Service - Jobs d'entraînement en arrière-plan
+L'état de chaque job est écrit en JSON dans un dossier partagé : n'importe quel
+worker gunicorn peut répondre à GET /train/<job_id>.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# Nombre de fichiers de jobs conservés sur disque
+MAX_KEPT_JOBS = 50
+
+# Intervalle minimal entre deux écritures de progression (secondes)
+PROGRESS_WRITE_INTERVAL = 0.5
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class TrainingJob:
+    """Un entraînement en cours : état + progression, persistés à chaque étape"""
+
+    def __init__(self, store, job_id, params=None):
+        self._store = store
+        self._last_write = 0.0
+        self.state = {
+            'job_id': job_id,
+            'status': 'queued',
+            'stage': 'queued',
+            'progress': 0.0,
+            'params': params or {},
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'metrics': None,
+            'error': None
+        }
+
+    @property
+    def job_id(self):
+        return self.state['job_id']
+
+    def update(self, **fields):
+        self.state.update(fields)
+        self._last_write = time.monotonic()
+        self._store.write(self.state)
+
+    def report_progress(self, progress, stage=None):
+        """Progression (0..1) ; écrite sur disque au plus toutes les PROGRESS_WRITE_INTERVAL s"""
+        self.state['progress'] = round(min(max(float(progress), 0.0), 1.0), 4)
+        if stage:
+            self.state['stage'] = stage
+        if time.monotonic() - self._last_write >= PROGRESS_WRITE_INTERVAL:
+            self.update()
+
+
+class TrainingJobStore:
+    """
+    File d'entraînements : un seul fit à la fois (max_workers=1) pour ne pas
+    priver les prédictions de CPU. L'exécuteur est créé au premier job.
+    """
+
+    def __init__(self, jobs_dir, max_workers=1):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f'{job_id}.json')
+
+    def write(self, state):
+        """Écriture atomique (fichier temporaire + rename) : jamais de JSON à moitié écrit"""
+        path = self._path(state['job_id'])
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def get(self, job_id):
+        """État d'un job (dict) ou None s'il est inconnu"""
+        if not job_id or not all(c.isalnum() or c == '-' for c in job_id):
+            return None
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def submit(self, fn, *args, params=None):
+        """
+        Lance fn(job, *args) en arrière-plan et retourne le job.
+        La valeur retournée par fn devient 'metrics' du job.
+        """
+        job = TrainingJob(self, uuid.uuid4().hex[:12], params)
+        job.update()
+        self._prune()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='train')
+            self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        job.update(status='running', stage='starting', started_at=_now())
+        try:
+            metrics = fn(job, *args)
+            job.update(status='succeeded', stage='done', progress=1.0, metrics=metrics, finished_at=_now())
+        except Exception as e:
+            log.exception(f"Erreur d'entraînement (job {job.job_id})")
+            job.update(status='failed', stage='failed', error=str(e), finished_at=_now())
+
+    def _prune(self):
+        """Supprime les plus vieux fichiers de jobs au-delà de MAX_KEPT_JOBS"""
+        try:
+            files = [os.path.join(self.jobs_dir, name) for name in os.listdir(self.jobs_dir) if name.endswith('.json')]
+            files.sort(key=os.path.getmtime)
+            for path in files[:-MAX_KEPT_JOBS]:
+                os.remove(path)
+        except OSError:
+            pass
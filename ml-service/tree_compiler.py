@@ -0,0 +1,275 @@
+"""
+Mont-Vert ML Service - Prédicteur compilé
+Les arbres du booster XGBoost sont exportés en tableaux plats (un par attribut
+de noeud) et parcourus en NumPy vectorisé, sans le wrapper Python XGBoost.
+Le fichier exporté (.arrays, voir shared_arrays.py) contient aussi les tableaux
+dérivés : ouvert en mmap, il est partagé tel quel par tous les workers.
+"""
+
+import json
+
+import numpy as np
+
+import shared_arrays
+
+# Tolérance de parité acceptée face à predict_proba
+PARITY_TOLERANCE = 1e-5
+
+# Au-delà, la représentation en arbres complets devient trop volumineuse
+MAX_COMPILED_DEPTH = 12
+
+
+class CompiledForest:
+    """
+    Forêt "à plat" : chaque arbre est complété en arbre binaire complet de
+    profondeur 'depth' et rangé en tas (enfants de h : 2h+1 et 2h+2).
+    Une descente se fait donc sans table d'enfants : à chaque niveau,
+    toutes les lignes descendent tous les arbres en une opération NumPy.
+    Une feuille moins profonde est recopiée sur toutes les feuilles de son sous-arbre.
+    """
+
+    def __init__(self, feature, threshold, default_left, leaf_value,
+                 tree_class, num_class, base_margin, objective, depth, derived=None, parity=None):
+        self.feature = feature              # int32   (n_trees x 2^depth - 1), noeuds internes
+        self.threshold = threshold          # float32 (n_trees x 2^depth - 1)
+        self.default_left = default_left    # bool    (n_trees x 2^depth - 1)
+        self.leaf_value = leaf_value        # float32 (n_trees x 2^depth)
+        self.tree_class = tree_class        # int32   (n_trees,), classe de chaque arbre
+        self.num_class = int(num_class)
+        self.base_margin = float(base_margin)
+        self.objective = objective
+        self.depth = int(depth)
+        # Écart max avec XGBoost mesuré à l'export (None si inconnu)
+        self.parity = parity
+
+        n_trees = leaf_value.shape[0]
+        self._node_offsets = np.arange(n_trees, dtype=np.int32) * feature.shape[1]
+        self._leaf_offsets = np.arange(n_trees, dtype=np.int32) * leaf_value.shape[1]
+        if derived is None:
+            derived = self._derive(feature, threshold, tree_class, n_trees)
+        self._split_feature = derived['split_feature']
+        self._split_threshold = derived['split_threshold']
+        self._split_id = derived['split_id']
+        self._class_matrix = derived['class_matrix']
+
+    def _derive(self, feature, threshold, tree_class, n_trees):
+        """Tableaux dérivés de la forêt, enregistrés avec elle"""
+        # Les features sont de petits entiers : peu de couples (feature, seuil) distincts.
+        # Chaque noeud pointe sur son couple, évalué une seule fois par ligne.
+        pairs = np.rec.fromarrays([feature.ravel(), threshold.ravel()])
+        unique_pairs, split_id = np.unique(pairs, return_inverse=True)
+        # Matrice arbre -> classe : la somme des feuilles par classe devient un produit matriciel
+        class_matrix = np.zeros((n_trees, self.num_class), dtype=np.float32)
+        class_matrix[np.arange(n_trees), tree_class] = 1.0
+        return {
+            'split_feature': np.ascontiguousarray(unique_pairs.f0, dtype=np.int32),
+            'split_threshold': np.ascontiguousarray(unique_pairs.f1, dtype=np.float32),
+            'split_id': split_id.astype(np.int32).ravel(),
+            'class_matrix': class_matrix
+        }
+
+    @property
+    def num_trees(self):
+        return self.leaf_value.shape[0]
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Construction
+    # ───────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def from_booster(cls, booster):
+        """Compile un xgboost.Booster (ou le booster d'un XGBClassifier)"""
+        raw = booster.save_raw(raw_format='json')
+        return cls.from_json(json.loads(bytes(raw).decode('utf-8')))
+
+    @classmethod
+    def from_json(cls, model_json):
+        """Compile le dump JSON complet d'un modèle XGBoost (save_raw('json'))"""
+        learner = model_json['learner']
+        objective = learner['objective']['name']
+        if objective not in ('multi:softprob', 'multi:softmax', 'binary:logistic'):
+            raise ValueError(f"Objectif non supporté par le prédicteur compilé : {objective}")
+
+        booster = learner['gradient_booster']
+        if booster['name'] != 'gbtree':
+            raise ValueError(f"Booster non supporté par le prédicteur compilé : {booster['name']}")
+
+        params = learner['learner_model_param']
+        num_class = max(int(params.get('num_class', 0)), 1)
+        base_score = float(params['base_score'])
+        if objective == 'binary:logistic':
+            # base_score est stocké en probabilité : on le ramène en marge (logit)
+            base_margin = float(np.log(base_score / (1.0 - base_score)))
+        else:
+            base_margin = base_score
+
+        trees = booster['model']['trees']
+        tree_info = booster['model']['tree_info']
+        depth = max(_tree_depth(tree['left_children'], tree['right_children']) for tree in trees)
+        if depth > MAX_COMPILED_DEPTH:
+            raise ValueError(f"Arbres trop profonds pour le prédicteur compilé : {depth} > {MAX_COMPILED_DEPTH}")
+
+        n_trees = len(trees)
+        n_internal = 2 ** depth - 1
+        feature = np.zeros((n_trees, n_internal), dtype=np.int32)
+        threshold = np.zeros((n_trees, n_internal), dtype=np.float32)
+        default_left = np.zeros((n_trees, n_internal), dtype=bool)
+        leaf_value = np.zeros((n_trees, n_internal + 1), dtype=np.float32)
+
+        for t, tree in enumerate(trees):
+            lc = tree['left_children']
+            rc = tree['right_children']
+            split_indices = tree['split_indices']
+            # Pour une feuille, XGBoost range la valeur (déjà x learning_rate) dans split_conditions
+            split_conditions = tree['split_conditions']
+            tree_default_left = tree['default_left']
+
+            stack = [(0, 0, 0)]  # (noeud XGBoost, position dans le tas, profondeur)
+            while stack:
+                node, heap, level = stack.pop()
+                if lc[node] == -1:
+                    # Feuille : recopiée sur les 2^(depth - level) feuilles de son sous-arbre
+                    first = heap
+                    for _ in range(depth - level):
+                        first = 2 * first + 1
+                    span = 2 ** (depth - level)
+                    leaf_value[t, first - n_internal:first - n_internal + span] = split_conditions[node]
+                else:
+                    feature[t, heap] = split_indices[node]
+                    threshold[t, heap] = split_conditions[node]
+                    default_left[t, heap] = bool(tree_default_left[node])
+                    stack.append((lc[node], 2 * heap + 1, level + 1))
+                    stack.append((rc[node], 2 * heap + 2, level + 1))
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            default_left=default_left,
+            leaf_value=leaf_value,
+            tree_class=np.asarray(tree_info, dtype=np.int32),
+            num_class=num_class,
+            base_margin=base_margin,
+            objective=objective,
+            depth=depth
+        )
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Export / import (tableaux plats .arrays, ou .npz des anciennes versions)
+    # ───────────────────────────────────────────────────────────────────────
+
+    def save(self, file):
+        """'file' : fichier binaire déjà ouvert"""
+        parity = np.nan if self.parity is None else self.parity
+        shared_arrays.save(file, {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'default_left': self.default_left,
+            'leaf_value': self.leaf_value,
+            'tree_class': self.tree_class,
+            'meta': np.array([self.num_class, self.base_margin, self.depth, parity], dtype=np.float64),
+            'objective': np.frombuffer(self.objective.encode('utf-8'), dtype=np.uint8),
+            'split_feature': self._split_feature,
+            'split_threshold': self._split_threshold,
+            'split_id': self._split_id,
+            'class_matrix': self._class_matrix
+        })
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Forêt exportée ; mmap=True : tableaux lus en place dans le fichier (partagés entre processus)"""
+        if path.endswith('.npz'):
+            return cls._load_npz(path)
+        data = shared_arrays.load(path, mmap=mmap)
+        num_class, base_margin, depth, parity = data['meta']
+        return cls(
+            feature=data['feature'],
+            threshold=data['threshold'],
+            default_left=data['default_left'],
+            leaf_value=data['leaf_value'],
+            tree_class=data['tree_class'],
+            num_class=int(num_class),
+            base_margin=float(base_margin),
+            objective=bytes(data['objective']).decode('utf-8'),
+            depth=int(depth),
+            derived={name: data[name] for name in ('split_feature', 'split_threshold', 'split_id', 'class_matrix')},
+            parity=None if np.isnan(parity) else float(parity)
+        )
+
+    @classmethod
+    def _load_npz(cls, path):
+        """Ancien export .npz (sans tableaux dérivés ni parité)"""
+        with np.load(path) as data:
+            num_class, base_margin, depth = data['meta']
+            return cls(
+                feature=data['feature'],
+                threshold=data['threshold'],
+                default_left=data['default_left'],
+                leaf_value=data['leaf_value'],
+                tree_class=data['tree_class'],
+                num_class=int(num_class),
+                base_margin=float(base_margin),
+                objective=str(data['objective']),
+                depth=int(depth)
+            )
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Inférence
+    # ───────────────────────────────────────────────────────────────────────
+
+    def leaf_values(self, X):
+        """Valeur de la feuille atteinte par chaque ligne dans chaque arbre (n x n_trees)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        has_missing = bool(np.isnan(X).any())
+
+        # Même règle que XGBoost : gauche si x < seuil, droite sinon.
+        # Résultat de chaque couple (feature, seuil) distinct, pour chaque ligne.
+        n_splits = len(self._split_feature)
+        go_right_by_split = (X[:, self._split_feature] >= self._split_threshold).ravel()
+        row_offsets = (np.arange(X.shape[0], dtype=np.int32) * n_splits)[:, None]
+
+        heap = np.zeros((X.shape[0], self.num_trees), dtype=np.int32)
+        for _ in range(self.depth):
+            flat = heap + self._node_offsets
+            split = np.take(self._split_id, flat)
+            go_right = np.take(go_right_by_split, split + row_offsets)
+            if has_missing:
+                # Valeur manquante -> branche par défaut du noeud
+                x = np.take_along_axis(X, np.take(self._split_feature, split), axis=1)
+                go_right = np.where(np.isnan(x), ~np.take(self.default_left.ravel(), flat), go_right)
+            heap = 2 * heap + 1 + go_right
+
+        leaf = heap - self.feature.shape[1] + self._leaf_offsets
+        return np.take(self.leaf_value.ravel(), leaf)
+
+    def predict_margin(self, X):
+        """Marges brutes (n x num_class), équivalent de output_margin=True"""
+        margins = self.leaf_values(X) @ self._class_matrix
+        return margins.astype(np.float64) + self.base_margin
+
+    def predict_proba(self, X):
+        """Probabilités (n x nb_classes) au même format que XGBClassifier.predict_proba"""
+        margins = self.predict_margin(X)
+        if self.objective == 'binary:logistic':
+            p = 1.0 / (1.0 + np.exp(-margins[:, 0]))
+            return np.column_stack([1.0 - p, p]).astype(np.float32)
+        margins -= margins.max(axis=1, keepdims=True)
+        expo = np.exp(margins)
+        return (expo / expo.sum(axis=1, keepdims=True)).astype(np.float32)
+
+    def max_abs_diff(self, X, reference_probas):
+        """Écart maximal avec des probabilités de référence (contrôle de parité)"""
+        return float(np.max(np.abs(self.predict_proba(X) - np.asarray(reference_probas, dtype=np.float32))))
+
+
+def _tree_depth(left_children, right_children):
+    """Profondeur maximale d'un arbre (nombre de décisions jusqu'à la feuille la plus basse)"""
+    depth = 0
+    level = [0]
+    while level:
+        nxt = [child for node in level for child in (left_children[node], right_children[node]) if child != -1]
+        if nxt:
+            depth += 1
+        level = nxt
+    return depth
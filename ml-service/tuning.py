@@ -0,0 +1,247 @@
+"""
+Mont-Vert ML Service - Recherche d'hyperparamètres (/tune)
+Validation croisée chronologique (fenêtre d'entraînement croissante) : les
+exemples sont triés par date, le dernier bloc est gardé de côté (holdout) et le
+reste découpé en n_splits + 1 blocs ; le pli i apprend sur les blocs 0..i-1 et
+est évalué sur le bloc i. Une journée n'est jamais coupée entre deux blocs.
+
+Les fits tournent dans un pool de processus (un par coeur disponible) qui relit
+X / y en mmap depuis des .npy : les données ne sont pas copiées par tâche.
+Deux niveaux d'arrêt précoce :
+  - par fit : early_stopping_rounds sur la mlogloss du bloc de validation,
+    ce qui fixe aussi n_estimators ;
+  - par configuration (successive halving) : après chaque pli, seule la
+    meilleure moitié des configurations passe au pli suivant.
+"""
+
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import xgboost as xgb
+
+from training_config import booster_params
+
+# Grille par défaut (n_estimators est fixé par l'arrêt précoce)
+SEARCH_SPACE = {
+    'max_depth': [3, 4, 5, 6, 8],
+    'learning_rate': [0.03, 0.05, 0.1, 0.2]
+}
+
+DEFAULT_TUNE_OPTIONS = {
+    'n_splits': 4,
+    'holdout': 0.2,               # fraction la plus récente, jamais vue pendant la recherche
+    'top_k': 5,
+    'max_rounds': 200,
+    'early_stopping_rounds': 20,
+    'search_space': SEARCH_SPACE
+}
+
+
+def parse_tune_options(values, defaults=None):
+    """
+    Options validées à partir de 'values' (query string ou "tune_config" du corps
+    JSON), complétées par 'defaults'. Lève ValueError avec un message utilisateur.
+    """
+    options = dict(defaults or DEFAULT_TUNE_OPTIONS)
+    values = values or {}
+
+    for name, cast in (('n_splits', int), ('top_k', int), ('max_rounds', int),
+                       ('early_stopping_rounds', int), ('holdout', float)):
+        if values.get(name) is not None:
+            try:
+                options[name] = cast(values[name])
+            except (TypeError, ValueError):
+                raise ValueError(f'{name} doit être un nombre')
+
+    if not 2 <= options['n_splits'] <= 10:
+        raise ValueError('n_splits doit être entre 2 et 10')
+    if not 0.05 <= options['holdout'] <= 0.5:
+        raise ValueError('holdout doit être entre 0.05 et 0.5')
+    if not 1 <= options['top_k'] <= 50:
+        raise ValueError('top_k doit être entre 1 et 50')
+    if not 1 <= options['max_rounds'] <= 1000:
+        raise ValueError('max_rounds doit être entre 1 et 1000')
+    if options['early_stopping_rounds'] < 1:
+        raise ValueError('early_stopping_rounds doit être >= 1')
+
+    space = values.get('search_space')
+    if space is not None:
+        if not isinstance(space, dict) or not space:
+            raise ValueError('search_space doit être un objet {paramètre: [valeurs]}')
+        unknown = [name for name in space if name not in SEARCH_SPACE]
+        if unknown:
+            raise ValueError(f'Paramètres non réglables : {unknown} (parmi {list(SEARCH_SPACE)})')
+        for name, grid in space.items():
+            if not isinstance(grid, list) or not grid:
+                raise ValueError(f'search_space.{name} doit être une liste non vide')
+        if not all(isinstance(v, int) and 1 <= v <= 16 for v in space.get('max_depth', [1])):
+            raise ValueError('max_depth doit être un entier entre 1 et 16')
+        if not all(isinstance(v, (int, float)) and 0 < v <= 1 for v in space.get('learning_rate', [0.1])):
+            raise ValueError('learning_rate doit être dans ]0, 1]')
+        options['search_space'] = {**SEARCH_SPACE, **space}
+    return options
+
+
+def available_cpus():
+    """Coeurs utilisables par ce processus (affinité, cpuset du conteneur), au moins 1"""
+    if hasattr(os, 'sched_getaffinity'):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def candidates(search_space):
+    """Produit cartésien de la grille : liste de dicts {paramètre: valeur}"""
+    grid = [{}]
+    for name, values in search_space.items():
+        grid = [{**combo, name: value} for combo in grid for value in values]
+    return grid
+
+
+def plan_folds(dates, n_splits, holdout):
+    """
+    Découpage chronologique d'exemples triés par date.
+    Retourne (dev_end, [(train_end, valid_end), ...]) en positions de lignes :
+    holdout = lignes [dev_end, n), pli i = apprentissage [0, train_end), validation [train_end, valid_end).
+    """
+    if np.isnat(dates).any():
+        raise ValueError('Chaque exemple doit avoir une date pour la validation chronologique')
+
+    def day_start(position):
+        # Recule au premier exemple de la même journée
+        return int(np.searchsorted(dates, dates[min(position, len(dates) - 1)], side='left'))
+
+    dev_end = day_start(int(len(dates) * (1 - holdout)))
+    bounds = [day_start(dev_end * i // (n_splits + 1)) for i in range(1, n_splits + 1)] + [dev_end]
+    if dev_end == 0 or bounds[0] == 0 or any(b <= a for a, b in zip(bounds, bounds[1:])):
+        raise ValueError(f'Pas assez de dates distinctes pour {n_splits} plis et un holdout de {holdout:g}')
+    return dev_end, list(zip(bounds[:-1], bounds[1:]))
+
+
+def hit_rates(probas, y, top_k):
+    """(top-1, top-k) : part des exemples dont la vraie recette est dans les k premières"""
+    top = np.argsort(-probas, axis=1)[:, :top_k]
+    hits = top == y[:, None]
+    return float(hits[:, 0].mean()), float(hits.any(axis=1).mean())
+
+
+def fit_and_score(task):
+    """
+    Un fit (exécuté dans un processus du pool) : apprentissage sur [0, train_end),
+    évaluation sur [train_end, valid_end). Avec early_stopping_rounds, le nombre
+    d'arbres est celui de la meilleure itération sur la validation.
+    """
+    X = np.load(task['X_path'], mmap_mode='r')
+    y = np.load(task['y_path'], mmap_mode='r')
+    train_end, valid_end = task['train_end'], task['valid_end']
+    dtrain = xgb.DMatrix(np.ascontiguousarray(X[:train_end]), label=np.asarray(y[:train_end]))
+    dvalid = xgb.DMatrix(np.ascontiguousarray(X[train_end:valid_end]), label=np.asarray(y[train_end:valid_end]))
+
+    evals_result = {}
+    booster = xgb.train(task['params'], dtrain, num_boost_round=task['rounds'], evals=[(dvalid, 'valid')],
+                        early_stopping_rounds=task['early_stopping_rounds'], evals_result=evals_result,
+                        verbose_eval=False)
+    n_trees = booster.best_iteration + 1 if task['early_stopping_rounds'] else task['rounds']
+    probas = booster.predict(dvalid, iteration_range=(0, n_trees))
+    top1, topk = hit_rates(probas, np.asarray(y[train_end:valid_end]), task['top_k'])
+    return {
+        'n_estimators': int(n_trees),
+        'mlogloss': float(evals_result['valid']['mlogloss'][n_trees - 1]),
+        'top1': top1,
+        'topk': topk
+    }
+
+
+def search(X, y, dates, base_params, config, options, cache_dir, progress=None):
+    """
+    Recherche complète : CV chronologique avec successive halving, puis
+    évaluation sur le holdout de la meilleure configuration et de base_params.
+    X, y, dates doivent être triés par date. 'progress(fraction)' est appelé
+    après chaque fit.
+    """
+    dev_end, folds = plan_folds(dates, options['n_splits'], options['holdout'])
+    num_class = int(y.max()) + 1
+    pending = [{**base_params, **combo} for combo in candidates(options['search_space'])]
+
+    # Fits prévus : chaque pli garde la meilleure moitié, + 2 fits sur le holdout
+    planned, remaining = 2, len(pending)
+    for _ in folds:
+        planned += remaining
+        remaining = math.ceil(remaining / 2)
+    done = 0
+
+    cpus = available_cpus()
+    workers = max(1, min(cpus, len(pending)))
+    threads = max(1, cpus // workers)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='tune-', dir=cache_dir)
+    try:
+        X_path = os.path.join(tmp_dir, 'X.npy')
+        y_path = os.path.join(tmp_dir, 'y.npy')
+        np.save(X_path, X)
+        np.save(y_path, y)
+
+        def task(hyperparams, train_end, valid_end, rounds, early_stopping_rounds):
+            params = booster_params({**config, 'nthread': threads}, hyperparams, num_class)
+            return {'X_path': X_path, 'y_path': y_path, 'params': params, 'train_end': train_end,
+                    'valid_end': valid_end, 'rounds': rounds, 'early_stopping_rounds': early_stopping_rounds,
+                    'top_k': options['top_k']}
+
+        # 'spawn' : un worker gunicorn a déjà des threads (OpenMP), fork n'est pas sûr
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            scores = {i: [] for i in range(len(pending))}
+            alive = list(range(len(pending)))
+            for fold_index, (train_end, valid_end) in enumerate(folds):
+                futures = {i: pool.submit(fit_and_score, task(pending[i], train_end, valid_end,
+                                                              options['max_rounds'], options['early_stopping_rounds']))
+                           for i in alive}
+                for i, future in futures.items():
+                    scores[i].append(future.result())
+                    done += 1
+                    if progress:
+                        progress(done / planned)
+                # Successive halving : la moitié la moins bonne (mlogloss moyenne) s'arrête là
+                alive.sort(key=lambda i: np.mean([s['mlogloss'] for s in scores[i]]))
+                if fold_index < len(folds) - 1:
+                    alive = alive[:math.ceil(len(alive) / 2)]
+
+            best = alive[0]
+            n_estimators = int(round(np.mean([s['n_estimators'] for s in scores[best]])))
+            best_params = {**pending[best], 'n_estimators': n_estimators}
+
+            # Holdout : réentraînement sur toute la période de recherche, évalué sur la plus récente
+            holdout = {
+                'tuned': pool.submit(fit_and_score, task(best_params, dev_end, len(y), n_estimators, None)),
+                'baseline': pool.submit(fit_and_score, task(base_params, dev_end, len(y),
+                                                            base_params['n_estimators'], None))
+            }
+            holdout = {name: future.result() for name, future in holdout.items()}
+            if progress:
+                progress(1.0)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def summary(i):
+        return {
+            **{name: pending[i][name] for name in options['search_space']},
+            'folds': len(scores[i]),
+            'mlogloss': round(float(np.mean([s['mlogloss'] for s in scores[i]])), 5),
+            'top1': round(float(np.mean([s['top1'] for s in scores[i]])), 4),
+            'topk': round(float(np.mean([s['topk'] for s in scores[i]])), 4),
+            'n_estimators': int(round(np.mean([s['n_estimators'] for s in scores[i]])))
+        }
+
+    ranking = sorted(range(len(pending)), key=lambda i: (-len(scores[i]), summary(i)['mlogloss']))
+    return {
+        'best_params': {name: best_params[name] for name in ('n_estimators', *options['search_space'])},
+        'cv': [summary(i) for i in ranking],
+        'holdout': {name: {'top1': round(s['top1'], 4), f"top{options['top_k']}": round(s['topk'], 4),
+                           'n_estimators': s['n_estimators']} for name, s in holdout.items()},
+        'folds': [{'train_rows': a, 'valid_rows': b - a} for a, b in folds],
+        'holdout_rows': int(len(y) - dev_end),
+        'workers': workers
+    }
@@ -8,6 +8,8 @@ import { a as asyncHandler } from '../utils/async.js'
 import {
     trainModel,
     predictRecipes,
+    planMeals,
+    forecastHabits,
     checkMLServiceHealth,
     getModelInfo,
     getFeatureImportance,
@@ -46,28 +48,68 @@ router.get('/feature-importance', requireAuth(), asyncHandler(async (req, res) =
 /**
  * POST /ml/train
  * Entraîne le modèle avec les données historiques
+ * Body: { mode?: 'full' | 'incremental' }
  */
 router.post('/train', requireAuth('ADMIN'), asyncHandler(async (req, res) => {
-    const result = await trainModel()
+    const result = await trainModel({ mode: req.body?.mode })
     res.json(result)
 }))
 
 /**
  * POST /ml/predict
  * Prédit les meilleures recettes pour une date donnée
- * Body: { date?: string, planned_portions?: number }
+ * Body: { date?: string, planned_portions?: number, profile?: string }
  */
 router.post('/predict', requireAuth(), asyncHandler(async (req, res) => {
-    const { date, planned_portions } = req.body
+    const { date, planned_portions, profile } = req.body
 
     const result = await predictRecipes(
         date || new Date().toISOString().split('T')[0],
-        planned_portions || 50
+        planned_portions || 50,
+        profile
     )
 
     res.json(result)
 }))
 
+/**
+ * POST /ml/plan
+ * Une recette par jour sur une période, sans compter deux fois sur le même lot
+ * Body: { start_date: string, end_date: string, planned_portions?: number | number[], profile?: string, beam_width?: number }
+ */
+router.post('/plan', requireAuth(), asyncHandler(async (req, res) => {
+    const { start_date, end_date, planned_portions, profile, beam_width } = req.body
+
+    const result = await planMeals({
+        startDate: start_date,
+        endDate: end_date || start_date,
+        plannedPortions: planned_portions || 50,
+        profile,
+        beamWidth: beam_width
+    })
+
+    res.json(result)
+}))
+
+/**
+ * POST /ml/rollout
+ * Séquences de recettes les plus probables (habitudes seules) sur plusieurs jours
+ * Body: { start_date: string, horizon?: number, planned_portions?: number | number[], beam_width?: number, num_sequences?: number }
+ */
+router.post('/rollout', requireAuth(), asyncHandler(async (req, res) => {
+    const { start_date, horizon, planned_portions, beam_width, num_sequences } = req.body
+
+    const result = await forecastHabits({
+        startDate: start_date || new Date().toISOString().split('T')[0],
+        horizon,
+        plannedPortions: planned_portions || 50,
+        beamWidth: beam_width,
+        numSequences: num_sequences
+    })
+
+    res.json(result)
+}))
+
 /**
  * GET /ml/training-data
  * Exporte les données d'entraînement (pour debug/analyse)
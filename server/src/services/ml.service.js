@@ -5,9 +5,12 @@
  * TOTAL : 11 features
  */
 
+import { randomUUID } from 'node:crypto'
 import { pool } from '../db.js'
 
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5000'
+// Profil de pondération du score hybride de ce site (score_profiles.json côté ML), sinon profil par défaut
+const ML_SCORE_PROFILE = process.env.ML_SCORE_PROFILE || undefined
 
 // ═══════════════════════════════════════════════════════════════════════════
 // EXPORT DES DONNÉES D'ENTRAÎNEMENT
@@ -248,7 +251,11 @@ function calculateRecipeStockFeatures(ingredients, stockMap, plannedPortions = 1
 // ENTRAÎNEMENT DU MODÈLE
 // ═══════════════════════════════════════════════════════════════════════════
 
-export async function trainModel() {
+/**
+ * mode 'incremental' : Python continue le modèle publié avec les seuls repas
+ * postérieurs au dernier entraînement (entraînement complet si impossible)
+ */
+export async function trainModel({ mode = 'full' } = {}) {
     console.log("\n [ML Service] Démarrage de l'entraînement...")
     const start = Date.now()
 
@@ -261,10 +268,12 @@ export async function trainModel() {
 
         console.log(`\n [ML Service] Envoi de ${trainingData.length} exemples à Python...`)
 
-        const response = await fetch(`${ML_SERVICE_URL}/train`, {
+        // NDJSON envoyé par paquets : ni Node ni Python ne construisent le corps complet
+        const response = await fetch(`${ML_SERVICE_URL}/train?mode=${encodeURIComponent(mode)}`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ training_data: trainingData })
+            headers: { 'Content-Type': 'application/x-ndjson' },
+            body: toNdjsonChunks(trainingData),
+            duplex: 'half'
         })
 
         if (!response.ok) {
@@ -272,12 +281,19 @@ export async function trainModel() {
             throw new Error(`Erreur Python: ${response.status} - ${errorText}`)
         }
 
-        const result = await response.json()
+        // Python répond tout de suite (202) avec un job_id : le fit tourne en arrière-plan
+        const { job_id } = await response.json()
+        console.log(`    Job d'entraînement ${job_id} lancé`)
+
+        const job = await waitForTrainingJob(job_id)
+        if (job.status !== 'succeeded') {
+            throw new Error(job.error || `Entraînement ${job.status}`)
+        }
 
         const elapsed = ((Date.now() - start) / 1000).toFixed(2)
         console.log(`\n [ML Service] Entraînement terminé en ${elapsed}s`)
 
-        return result
+        return { success: true, job_id, metrics: job.metrics }
 
     } catch (error) {
         console.error("\n [ML Service] Erreur:", error.message)
@@ -285,6 +301,51 @@ export async function trainModel() {
     }
 }
 
+const TRAINING_CHUNK_ROWS = 1000
+
+/**
+ * Sérialise les exemples en NDJSON (un objet JSON par ligne), par paquets
+ */
+async function* toNdjsonChunks(rows) {
+    for (let i = 0; i < rows.length; i += TRAINING_CHUNK_ROWS) {
+        const lines = rows.slice(i, i + TRAINING_CHUNK_ROWS).map(row => JSON.stringify(row))
+        yield Buffer.from(lines.join('\n') + '\n')
+    }
+}
+
+const TRAINING_POLL_INTERVAL_MS = 2000
+const TRAINING_TIMEOUT_MS = 30 * 60 * 1000
+
+/**
+ * Attend la fin d'un job d'entraînement Python (GET /train/:job_id)
+ */
+async function waitForTrainingJob(jobId) {
+    const deadline = Date.now() + TRAINING_TIMEOUT_MS
+    let lastProgress = -1
+
+    while (Date.now() < deadline) {
+        const response = await fetch(`${ML_SERVICE_URL}/train/${jobId}`)
+        if (!response.ok) {
+            throw new Error(`Erreur Python: ${response.status} - job ${jobId}`)
+        }
+
+        const job = await response.json()
+        if (job.status === 'succeeded' || job.status === 'failed') {
+            return job
+        }
+
+        const progress = Math.round((job.progress || 0) * 100)
+        if (progress !== lastProgress) {
+            console.log(`    Job ${jobId} : ${job.stage} (${progress}%)`)
+            lastProgress = progress
+        }
+
+        await new Promise(resolve => setTimeout(resolve, TRAINING_POLL_INTERVAL_MS))
+    }
+
+    throw new Error(`Entraînement trop long (job ${jobId} toujours en cours)`)
+}
+
 // ═══════════════════════════════════════════════════════════════════════════
 // PRÉDICTION
 // ═══════════════════════════════════════════════════════════════════════════
@@ -344,20 +405,39 @@ function getConfidence(probability) {
     return 'low'
 }
 
-export async function predict({ date, planned_portions, num_predictions = 5 }) {
-    console.log(`\n🔮 [ML Service] Prédiction pour ${date}...`)
+export async function predict({ date, planned_portions, num_predictions = 5, profile = ML_SCORE_PROFILE }) {
+    // Identifiant repris dans les logs JSON du service ML (en-tête X-Request-ID)
+    const requestId = randomUUID()
+    console.log(`\n🔮 [ML Service] Prédiction pour ${date} (requête ${requestId})...`)
 
     try {
         const predictionContext = await buildPredictionContext(date, planned_portions)
 
-        const response = await fetch(`${ML_SERVICE_URL}/predict`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                context: predictionContext,
-                num_predictions: num_predictions * 2  // Demander plus pour avoir du choix après filtrage
-            })
-        })
+        // Instantané du stock : Python calcule disponibilité / urgence de TOUTES les recettes
+        let stock = null
+        let recipeIndexVersion = null
+        try {
+            stock = await fetchStockSnapshot()
+            recipeIndexVersion = await syncRecipeIndex()
+        } catch (error) {
+            console.warn(` [ML Service] Features de stock calculées côté Node : ${error.message}`)
+            stock = null
+        }
+
+        const body = {
+            context: predictionContext,
+            num_predictions: num_predictions * 2,  // Demander plus pour avoir du choix après filtrage
+            profile,
+            stock: stock || undefined,
+            recipe_index_version: recipeIndexVersion || undefined
+        }
+        let response = await postPrediction(body, requestId)
+
+        // 409 : le service ML n'a pas l'index recettes x ingrédients, ou pas cette version
+        if (response.status === 409 && stock) {
+            body.recipe_index_version = await syncRecipeIndex({ force: true })
+            response = await postPrediction(body, requestId)
+        }
 
         if (!response.ok) {
             throw new Error(`Erreur Python: ${response.status}`)
@@ -380,12 +460,10 @@ export async function predict({ date, planned_portions, num_predictions = 5 }) {
             }))
 
             // ÉTAPE CRITIQUE : Enrichir avec les vraies features de stock
-            result.predictions = await enrichPredictionsWithFeasibility(result.predictions, planned_portions)
-
-            console.log('\n [ML Service] Prédictions AVANT réordonnancement :')
-            result.predictions.forEach((p, i) => {
-                console.log(`   ${i + 1}. ${p.recipe_name}: prob=${(p.probability * 100).toFixed(1)}%, feasible=${p.recipe_feasible}, urgency=${(p.urgency_score || 0).toFixed(2)}, missing=${p.nb_missing_ingredients || 0}`)
-            })
+            // (déjà présentes si Python les a calculées à partir de l'instantané)
+            if (!result.stock_features) {
+                result.predictions = await enrichPredictionsWithFeasibility(result.predictions, planned_portions)
+            }
 
             // RÉORDONNANCEMENT FEFO :
             // 1. Recettes faisables en premier
@@ -404,14 +482,15 @@ export async function predict({ date, planned_portions, num_predictions = 5 }) {
                 return b.probability - a.probability
             })
 
-            console.log('\n [ML Service] Prédictions APRÈS réordonnancement :')
+            // Limiter au nombre demandé
+            result.predictions = result.predictions.slice(0, num_predictions)
+
+            // Une seule ligne par prédiction, après réordonnancement (ce qui est réellement proposé)
+            console.log(`\n [ML Service] Prédictions (requête ${requestId}) :`)
             result.predictions.forEach((p, i) => {
                 console.log(`   ${i + 1}. ${p.recipe_name}: prob=${(p.probability * 100).toFixed(1)}%, feasible=${p.recipe_feasible}, urgency=${(p.urgency_score || 0).toFixed(2)}, missing=${p.nb_missing_ingredients || 0}`)
             })
 
-            // Limiter au nombre demandé
-            result.predictions = result.predictions.slice(0, num_predictions)
-
             const ctxDate = date; // param de predict()
             const nowPortions = planned_portions;
             
@@ -447,8 +526,99 @@ export async function predict({ date, planned_portions, num_predictions = 5 }) {
     }
 }
 
-export async function predictRecipes(date, planned_portions) {
-    return predict({ date, planned_portions, num_predictions: 5 })
+export async function predictRecipes(date, planned_portions, profile) {
+    return predict({ date, planned_portions, num_predictions: 5, profile })
+}
+
+/**
+ * Planning multi-jours : une recette par jour de startDate à endDate (incluse),
+ * le stock étant consommé FEFO d'un jour à l'autre par le service ML (/plan).
+ */
+export async function planMeals({ startDate, endDate, plannedPortions, profile = ML_SCORE_PROFILE, beamWidth }) {
+    const requestId = randomUUID()
+    console.log(`\n🗓️ [ML Service] Planning du ${startDate} au ${endDate} (requête ${requestId})...`)
+
+    const [recentRecipes] = await pool.query(`
+        SELECT mpi.recipe_id
+        FROM meal_plan_item mpi
+        JOIN meal_plan mp ON mp.id = mpi.meal_plan_id
+        WHERE mp.status = 'EXECUTED' AND mpi.execution_date < ?
+        ORDER BY mpi.execution_date DESC
+        LIMIT 2
+    `, [startDate])
+
+    const body = {
+        start_date: startDate,
+        end_date: endDate,
+        planned_portions: plannedPortions,
+        last_recipes: recentRecipes.map(r => r.recipe_id),
+        stock: await fetchLotSnapshot(),
+        recipe_index_version: await syncRecipeIndex(),
+        beam_width: beamWidth,
+        profile
+    }
+    const postPlan = () => fetch(`${ML_SERVICE_URL}/plan`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-Request-ID': requestId },
+        body: JSON.stringify(body)
+    })
+
+    let response = await postPlan()
+    if (response.status === 409) {
+        body.recipe_index_version = await syncRecipeIndex({ force: true })
+        response = await postPlan()
+    }
+    const result = await response.json()
+    if (!response.ok) {
+        throw new Error(result.error || `Erreur Python: ${response.status}`)
+    }
+
+    const recipeIds = result.plan.map(p => p.recipe_id)
+    if (recipeIds.length > 0) {
+        const [recipes] = await pool.query(`SELECT id, name FROM recipe WHERE id IN (?)`, [recipeIds])
+        const recipeMap = new Map(recipes.map(r => [r.id, r.name]))
+        result.plan = result.plan.map(p => ({
+            ...p,
+            recipe_name: recipeMap.get(p.recipe_id) || `Recette #${p.recipe_id}`
+        }))
+    }
+
+    console.log(`   ${result.plan.length} jours planifiés en ${result.search.elapsed_ms} ms, ${result.expiring_unused.lots} lots périmés non utilisés`)
+    return result
+}
+
+/**
+ * Prévision des habitudes sur `horizon` jours en un appel (/rollout) : le
+ * service ML fait avancer `beamWidth` séquences candidates ensemble et renvoie
+ * les plus probables, au lieu d'un /predict par jour et par candidat.
+ */
+export async function forecastHabits({ startDate, horizon = 7, plannedPortions, beamWidth, numSequences }) {
+    const [recentRecipes] = await pool.query(`
+        SELECT mpi.recipe_id
+        FROM meal_plan_item mpi
+        JOIN meal_plan mp ON mp.id = mpi.meal_plan_id
+        WHERE mp.status = 'EXECUTED' AND mpi.execution_date < ?
+        ORDER BY mpi.execution_date DESC
+        LIMIT 2
+    `, [startDate])
+
+    const response = await fetch(`${ML_SERVICE_URL}/rollout`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-Request-ID': randomUUID() },
+        body: JSON.stringify({
+            start_date: startDate,
+            horizon,
+            planned_portions: plannedPortions,
+            last_recipes: recentRecipes.map(r => r.recipe_id),
+            beam_width: beamWidth,
+            num_sequences: numSequences
+        })
+    })
+    const result = await response.json()
+    if (!response.ok) {
+        throw new Error(result.error || `Erreur Python: ${response.status}`)
+    }
+    return result
 }
 
 async function buildPredictionContext(date, planned_portions) {
@@ -491,6 +661,115 @@ function getWeekNumber(date) {
     return Math.ceil((((d - yearStart) / 86400000) + 1) / 7)
 }
 
+function postPrediction(body, requestId) {
+    return fetch(`${ML_SERVICE_URL}/predict`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-Request-ID': requestId },
+        body: JSON.stringify(body)
+    })
+}
+
+// ═══════════════════════════════════════════════════════════════════════════
+// STOCK ET INDEX RECETTES x INGRÉDIENTS POUR LE SERVICE ML
+// ═══════════════════════════════════════════════════════════════════════════
+
+/**
+ * Instantané du stock courant, en colonnes (format compact attendu par /predict) :
+ * { product_id: [...], available_qty: [...], days_to_expiry: [...] }
+ */
+export async function fetchStockSnapshot() {
+    const [stockRows] = await pool.query(`
+        SELECT 
+            p.id as product_id,
+            COALESCE(SUM(l.quantity), 0) as available_qty,
+            MIN(DATEDIFF(l.expiry_date, CURDATE())) as days_to_expiry
+        FROM product p
+        LEFT JOIN lot l ON l.product_id = p.id 
+            AND l.archived = FALSE 
+            AND l.expiry_date >= CURDATE()
+        GROUP BY p.id
+    `)
+
+    return {
+        product_id: stockRows.map(s => s.product_id),
+        available_qty: stockRows.map(s => Number(s.available_qty) || 0),
+        days_to_expiry: stockRows.map(s => s.days_to_expiry !== null ? Number(s.days_to_expiry) : 999)
+    }
+}
+
+/**
+ * Stock lot par lot (même colonnes que fetchStockSnapshot, un produit peut se
+ * répéter) : /plan consomme les lots dans l'ordre de péremption.
+ */
+export async function fetchLotSnapshot() {
+    const [lotRows] = await pool.query(`
+        SELECT 
+            l.product_id,
+            l.quantity,
+            DATEDIFF(l.expiry_date, CURDATE()) as days_to_expiry
+        FROM lot l
+        WHERE l.archived = FALSE 
+            AND l.expiry_date >= CURDATE()
+            AND l.quantity > 0
+    `)
+
+    return {
+        product_id: lotRows.map(l => l.product_id),
+        available_qty: lotRows.map(l => Number(l.quantity) || 0),
+        days_to_expiry: lotRows.map(l => Number(l.days_to_expiry))
+    }
+}
+
+// Version de l'index déjà connue du service ML (évite de le renvoyer à chaque prédiction)
+let mlRecipeIndexVersion = null
+
+/**
+ * Pousse les lignes de recipe_item au service ML si elles ont changé.
+ * La version est une empreinte du contenu (nombre de lignes + somme des CRC32).
+ */
+export async function syncRecipeIndex({ force = false } = {}) {
+    const [[{ nb, checksum }]] = await pool.query(`
+        SELECT COUNT(*) as nb,
+               COALESCE(SUM(CRC32(CONCAT_WS(':', recipe_id, product_id, qty_per_portion))), 0) as checksum
+        FROM recipe_item
+    `)
+    const version = `${nb}-${checksum}`
+    if (!force && version === mlRecipeIndexVersion) return version
+
+    if (!force) {
+        // Un autre processus Node a peut-être déjà poussé cette version
+        const current = await fetch(`${ML_SERVICE_URL}/recipe-index`).then(r => r.json()).catch(() => null)
+        if (current?.version === version) {
+            mlRecipeIndexVersion = version
+            return version
+        }
+    }
+
+    const [rows] = await pool.query(`
+        SELECT recipe_id, product_id, qty_per_portion
+        FROM recipe_item
+        ORDER BY recipe_id, id
+    `)
+    const response = await fetch(`${ML_SERVICE_URL}/recipe-index`, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            version,
+            items: {
+                recipe_id: rows.map(r => r.recipe_id),
+                product_id: rows.map(r => r.product_id),
+                qty_per_portion: rows.map(r => Number(r.qty_per_portion))
+            }
+        })
+    })
+    if (!response.ok) {
+        throw new Error(`Index recettes refusé : ${response.status}`)
+    }
+    mlRecipeIndexVersion = version
+    console.log(` [ML Service] Index recettes x ingrédients ${version} envoyé (${rows.length} lignes)`)
+    return version
+}
+
 // ═══════════════════════════════════════════════════════════════════════════
 // VÉRIFICATION FAISABILITÉ POST-PRÉDICTION
 // ═══════════════════════════════════════════════════════════════════════════
@@ -562,6 +841,16 @@ export async function checkMLServiceHealth() {
             headers: { 'Content-Type': 'application/json' }
         })
 
+        // 503 : le service démarre (chargement du modèle + prédiction à blanc)
+        if (response.status === 503) {
+            return {
+                status: 'starting',
+                connected: false,
+                service_online: false,
+                error: 'Service en cours de démarrage'
+            }
+        }
+
         if (!response.ok) {
             return {
                 status: 'error',